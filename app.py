@@ -81,6 +81,7 @@ from routes.gpu_routes import gpu_bp
 from routes.test_routes import test_bp
 from routes.media_services_routes import media_services_bp
 from routes.media_processing_routes import media_processing_bp
+from routes.jobs_routes import jobs_bp
 
 # تسجيل مسارات المستخدم
 app.register_blueprint(user_bp)
@@ -95,6 +96,7 @@ app.register_blueprint(system_bp)  # إضافة بلوبرنت مراقبة ال
 app.register_blueprint(logs_bp)  # إضافة بلوبرنت السجلات
 app.register_blueprint(settings_bp)  # إضافة بلوبرنت الإعدادات
 app.register_blueprint(media_processing_bp)  # إضافة بلوبرنت معالجة الوسائط
+app.register_blueprint(jobs_bp)  # إضافة بلوبرنت مهام الترجمة وقياساتها
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -911,17 +913,14 @@ def action_stop():
         return jsonify({'error': translate_text('not_authenticated')}), 401
     
     try:
-        # Find and terminate background processes
-        terminated = False
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            cmdline = proc.info['cmdline']
-            if cmdline and any('background_tasks.py' in arg for arg in cmdline):
-                proc.terminate()
-                terminated = True
-        
-        if terminated:
-            log_to_db("INFO", "Background tasks stopped")
-            return jsonify({'success': True, 'message': translate_text('tasks_stopped')})
+        # Pause the queued translations instead of killing the worker: running files
+        # stop at their next stage or chunk boundary and keep their checkpoints
+        from services.job_queue import pause_queue
+        counts = pause_queue(db.session)
+        
+        if counts['paused'] or counts['pausing']:
+            log_to_db("INFO", f"Translations paused ({counts['paused']} queued, {counts['pausing']} running)")
+            return jsonify({'success': True, 'message': translate_text('translations_paused'), **counts})
         else:
             return jsonify({'error': translate_text('no_running_tasks')})
     except Exception as e:
@@ -983,9 +982,6 @@ def action_scan_translation_status():
     if not is_authenticated():
         return redirect(url_for('login'))
     
-    if is_task_running():
-        return jsonify({'error': translate_text('task_already_running')}), 400
-    
     success = run_background_task("scan_translation_status_task")
     
     if success:
@@ -1245,25 +1241,25 @@ def api_check_ollama_models():
         return jsonify({'error': 'غير مصرح'}), 401
     
     try:
-        import requests
-        ollama_url = get_setting('ollama_url', 'http://localhost:11434')
+        from services.ollama_client import get_ollama_client, OllamaError
+        client = get_ollama_client(get_setting('ollama_api_url') or get_setting('ollama_url', 'http://localhost:11434'))
         
-        # Check if Ollama is running
-        response = requests.get(f"{ollama_url}/api/tags", timeout=5)
-        if response.status_code == 200:
-            models_data = response.json()
-            available_models = [model['name'].split(':')[0] for model in models_data.get('models', [])]
-            return jsonify({
-                'success': True, 
-                'available_models': available_models,
-                'ollama_running': True
-            })
-        else:
+        # Check if Ollama is running (/api/tags is cached briefly by the shared client)
+        try:
+            models = client.list_models(force=request.args.get('refresh') == 'true')
+        except OllamaError:
             return jsonify({
                 'success': False, 
                 'error': 'Ollama غير متاح',
                 'ollama_running': False
             })
+        
+        available_models = [model['name'].split(':')[0] for model in models]
+        return jsonify({
+            'success': True, 
+            'available_models': available_models,
+            'ollama_running': True
+        })
     except Exception as e:
         return jsonify({
             'success': False, 
@@ -1324,6 +1320,10 @@ def api_install_ollama_model():
                 text=True
             )
         
+        # The model list changes once the pull finishes
+        from services.ollama_client import get_ollama_client
+        get_ollama_client(get_setting('ollama_api_url') or get_setting('ollama_url', 'http://localhost:11434')).invalidate_tags()
+        
         return jsonify({
             'success': True, 
             'message': f'بدأ تحميل النموذج {model_name}. يرجى الانتظار...',
@@ -4092,21 +4092,15 @@ def api_test_ollama():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        import requests
-        response = requests.get('http://localhost:11434/api/tags', timeout=5)
+        from services.ollama_client import get_ollama_client
+        client = get_ollama_client(get_setting('ollama_api_url') or get_setting('ollama_url', 'http://localhost:11434'))
+        models = client.list_models(force=True)
         
-        if response.status_code == 200:
-            models = response.json().get('models', [])
-            return jsonify({
-                'success': True,
-                'message': f'Ollama connection successful. Found {len(models)} models.',
-                'models': [model.get('name', 'unknown') for model in models]
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': f'Ollama connection failed. Status code: {response.status_code}'
-            })
+        return jsonify({
+            'success': True,
+            'message': f'Ollama connection successful. Found {len(models)} models.',
+            'models': [model.get('name', 'unknown') for model in models]
+        })
     except Exception as e:
         return jsonify({
             'success': False,
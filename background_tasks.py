@@ -57,10 +57,14 @@ def get_settings_from_db():
     conn.close()
     return settings
 
-def update_status(progress, current_file, total_files=0, files_done=0):
+def update_status(progress, current_file, total_files=0, files_done=0, stages=None):
+    status = {"progress": progress, "current_file": current_file, "total_files": total_files, "files_done": files_done}
+    if stages is not None:
+        # Per-stage workers, queue depth and counters of the processing pipeline
+        status["stages"] = stages
     try:
         with open(STATUS_FILE, 'w', encoding='utf-8') as f:
-            json.dump({"progress": progress, "current_file": current_file, "total_files": total_files, "files_done": files_done}, f, ensure_ascii=False)
+            json.dump(status, f, ensure_ascii=False)
     except Exception as e:
         print(f"WARN: Could not write status: {e}")
 
@@ -149,7 +153,7 @@ def sync_library_task():
     if not all_api_files:
         update_status(100, "Sync finished: Could not retrieve media paths.")
         log_to_file("Sync failed: No media paths retrieved.")
-        return
+        raise RuntimeError("Could not retrieve media paths from Sonarr/Radarr")
         
     try:
         from app import app, db
@@ -209,10 +213,54 @@ def sync_library_task():
     except Exception as e:
         log_to_db("ERROR", f"Sync library error: {str(e)}")
         log_to_file(f"Sync library error: {str(e)}")
+        raise
+    
+    # Fill duration/codec columns for new or changed files (unchanged files hit the probe cache)
+    if str(config.get('probe_after_sync', 'true')).lower() in ['true', '1', 'yes']:
+        update_status(95, "Probing new media files...")
+        run_media_probe(config)
     update_status(100, "Library sync complete!")
     log_to_db("INFO", "Library Sync task finished.")
     log_to_file("Library sync completed successfully.")
 
+def run_media_probe(config, progress_start=None):
+    """Probe the library with ffprobe and fill the MediaFile columns; returns the counters"""
+    try:
+        from utils.worker_db import session_scope
+        from services.media_probe import probe_media_library
+        
+        processes = config.get('media_probe_processes', 'auto')
+        processes = int(processes) if str(processes).isdigit() else None
+        
+        def on_progress(done, total):
+            if progress_start is not None and (done % 20 == 0 or done == total):
+                update_status(progress_start + int(done / total * (100 - progress_start)),
+                              f"Probing media files ({done}/{total})", total, done)
+        
+        with session_scope() as session:
+            stats = probe_media_library(session, processes=processes, on_progress=on_progress)
+        log_to_file(f"Media probe: {stats['probed']} probed, {stats['cached']} cached, "
+                    f"{stats['failed']} failed, {stats['updated']} records updated")
+        return stats
+    except Exception as e:
+        log_to_db("ERROR", f"Media probe error: {str(e)}")
+        log_to_file(f"Media probe error: {str(e)}")
+        return None
+
+def probe_media_task():
+    """Probe every media file with ffprobe (unchanged files come from the probe cache)"""
+    log_to_db("INFO", "Media probe task started.")
+    log_to_file("Starting media probe...")
+    update_status(0, "Probing media files...")
+    
+    stats = run_media_probe(get_settings_from_db(), progress_start=0)
+    if stats is None:
+        update_status(100, "Media probe failed")
+        raise RuntimeError("Media probe failed")
+    
+    update_status(100, f"Media probe complete: {stats['probed']} probed, {stats['cached']} cached")
+    log_to_db("INFO", "Media probe task finished.", json.dumps(stats))
+
 def corrections_task():
     log_to_db("INFO", "Corrections task started.")
     log_to_file("Starting subtitle corrections...")
@@ -305,77 +353,98 @@ def corrections_task():
     except Exception as e:
         log_to_db("ERROR", f"Corrections task error: {str(e)}")
         log_to_file(f"Corrections error: {str(e)}")
+        raise
 
 def batch_translate_task():
     log_to_db("INFO", "Batch translate task started.")
     log_to_file("Starting batch translation...")
     
     try:
-        from app import app, db
         from models import MediaFile
+        from utils.worker_db import session_scope, get_worker_settings
         
-        with app.app_context():
-            # Get untranslated files not in blacklist
-            blacklist = read_blacklist()
-            
+        # Workers use the lightweight DB layer; the Flask app is never imported here
+        # Get untranslated files not in blacklist
+        blacklist = read_blacklist()
+        
+        from services.scheduling import ensure_durations, get_policy, order_paths
+        policy = get_policy(get_worker_settings())
+        
+        with session_scope() as session:
             # Query untranslated files using SQLAlchemy
-            untranslated_files = MediaFile.query.filter_by(translated=False).order_by(MediaFile.path).all()
+            untranslated_paths = [row[0] for row in session.query(MediaFile.path).filter_by(translated=False).order_by(MediaFile.path).all()]
             
             # Filter out blacklisted files and check file existence
-            files_to_process = [file.path for file in untranslated_files 
-                               if file.path not in blacklist and os.path.exists(file.path)]
-            
-            total_files = len(files_to_process)
-            
-            if total_files == 0:
-                update_status(100, "No files to translate.")
-                log_to_file("No files found for translation.")
-                return
-            
-            log_to_file(f"Found {total_files} files to translate.")
-            
-            for i, file_path in enumerate(files_to_process, 1):
-                progress = int((i / total_files) * 100) if total_files > 0 else 0
-                current_file_name = os.path.basename(file_path)
-                update_status(progress, f"({i}/{total_files}) {current_file_name}", total_files, i-1)
-                
-                log_to_file(f"Processing file {i}/{total_files}: {current_file_name}")
-                
-                try:
-                    # Find media file in database
-                    media_file = MediaFile.query.filter_by(path=file_path).first()
-                    if media_file:
-                        # Update status to processing
-                        media_file.has_subtitles = False
-                        db.session.commit()
-                    
-                    # Process single file
-                    process_single_file_task(file_path)
-                    
-                    # Check if translation was created
-                    srt_path = f"{os.path.splitext(file_path)[0]}.ar.srt"
-                    if os.path.exists(srt_path):
-                        if media_file:
-                            media_file.translated = True
-                            media_file.has_subtitles = True
-                            from datetime import datetime
-                            media_file.translation_completed_at = datetime.utcnow()
-                            db.session.commit()
-                        log_to_file(f"Successfully translated: {current_file_name}")
-                    else:
-                        log_to_file(f"Translation failed: {current_file_name}")
-                        
-                except Exception as e:
-                    log_to_file(f"Error processing {current_file_name}: {str(e)}")
-                    log_to_db("ERROR", f"Error processing {current_file_name}", str(e))
-            
-            update_status(100, "Batch translation finished.", total_files, total_files)
-            log_to_db("INFO", "Batch translate task finished.")
-            log_to_file("Batch translation completed.")
-            
+            files_to_process = [path for path in untranslated_paths 
+                               if path not in blacklist and os.path.exists(path)]
+            if policy.name == 'shortest':
+                ensure_durations(session, files_to_process)
+            files_to_process = order_paths(session, files_to_process, policy)
+        
+        total_files = len(files_to_process)
+        
+        if total_files == 0:
+            update_status(100, "No files to translate.")
+            log_to_file("No files found for translation.")
+            return
+        
+        log_to_file(f"Found {total_files} files to translate.")
+        
+        from process_video import FileJob, build_pipeline, load_settings, record_job_metrics, warm_up_transcription
+        worker_settings = load_settings()
+        
+        # Start loading the Whisper model now; every file below reuses this worker
+        try:
+            if worker_settings.get('whisper_engine', 'auto') != 'cli':
+                warm_up_transcription(worker_settings)
+        except Exception as e:
+            log_to_file(f"Whisper worker warm-up skipped: {str(e)}")
+        
+        # Load the Ollama model while the first files are still being transcribed
+        try:
+            from services.ollama_client import get_ollama_pool
+            get_ollama_pool(worker_settings).warm_up_async(worker_settings.get('ollama_model', 'llama3'))
+        except Exception as e:
+            log_to_file(f"Ollama warm-up skipped: {str(e)}")
+        
+        def on_file_finished(job):
+            job.cleanup()
+            record_job_metrics(job)
+            current_file_name = os.path.basename(job.video_path)
+            if job.success and os.path.exists(job.arabic_srt_path):
+                log_to_file(f"Successfully translated: {current_file_name}")
+            else:
+                log_to_file(f"Translation failed: {current_file_name} ({job.error or 'no subtitle written'})")
+                if job.error:
+                    log_to_db("ERROR", f"Error processing {current_file_name}", job.error)
+        
+        def on_progress(pipeline):
+            status = pipeline.status()
+            active = [os.path.basename(job.video_path) for job in jobs
+                      if not job.done and job.current_stage not in (None, 'probe')]
+            progress = int((status['finished'] / total_files) * 100)
+            current = f"({status['finished']}/{total_files}) {', '.join(active[:3])}"
+            update_status(progress, current, total_files, status['finished'], stages=status['stages'])
+        
+        try:
+            from services.checkpoints import prune_checkpoints
+            prune_checkpoints(worker_settings.get('checkpoint_dir') or None)
+        except Exception as e:
+            log_to_file(f"Checkpoint pruning skipped: {str(e)}")
+        
+        # Stages overlap across files: file N+1 is extracted/transcribed while file N translates
+        jobs = [FileJob(file_path, worker_settings) for file_path in files_to_process]
+        pipeline = build_pipeline(worker_settings, on_finished=on_file_finished)
+        pipeline.run(jobs, on_progress=on_progress)
+        
+        update_status(100, "Batch translation finished.", total_files, total_files)
+        log_to_db("INFO", "Batch translate task finished.")
+        log_to_file("Batch translation completed.")
+        
     except Exception as e:
         log_to_db("ERROR", f"Batch translate task error: {str(e)}")
         log_to_file(f"Batch translation error: {str(e)}")
+        raise
 
 def single_file_translate_task(file_path):
     log_to_db("INFO", f"Single file translate task started for: {file_path}")
@@ -472,22 +541,63 @@ def scan_translation_status_task():
         error_msg = f"Translation status scan error: {str(e)}"
         log_to_db("ERROR", error_msg)
         log_to_file(error_msg)
+        raise
     finally:
         conn.close()
 
+def export_translation_memory_task(output_path=None):
+    """Export the translation memory to a JSON Lines file"""
+    output_path = output_path or os.path.join(PROJECT_DIR, "translation_memory.jsonl")
+    try:
+        from utils.worker_db import session_scope
+        from services.translation_memory import export_to_file
+        
+        with session_scope() as session:
+            count = export_to_file(session, output_path)
+        log_to_db("INFO", f"Exported {count} translation memory entries to {output_path}")
+        log_to_file(f"Exported {count} translation memory entries to {output_path}")
+    except Exception as e:
+        log_to_db("ERROR", f"Translation memory export error: {str(e)}")
+        log_to_file(f"Translation memory export error: {str(e)}")
+        raise
+
+def import_translation_memory_task(input_path=None, overwrite='false'):
+    """Import a translation memory file written by export_translation_memory_task"""
+    input_path = input_path or os.path.join(PROJECT_DIR, "translation_memory.jsonl")
+    try:
+        from utils.worker_db import session_scope
+        from services.translation_memory import import_from_file
+        
+        with session_scope() as session:
+            result = import_from_file(session, input_path, overwrite=overwrite.lower() == 'true')
+        log_to_db("INFO", f"Imported translation memory from {input_path}", json.dumps(result))
+        log_to_file(f"Imported translation memory from {input_path}: {result}")
+    except Exception as e:
+        log_to_db("ERROR", f"Translation memory import error: {str(e)}")
+        log_to_file(f"Translation memory import error: {str(e)}")
+        raise
+
 # --- نقطة الدخول الرئيسية ---
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         task_name = sys.argv[1]
         args = sys.argv[2:]
         
-        if task_name == "single_file_translate_task":
+        if task_name == "worker":
+            # عامل دائم لقائمة انتظار المهام، يمكن تشغيله على أجهزة إضافية تشارك قاعدة البيانات
+            from job_worker import main as run_worker
+            run_worker(args)
+        elif task_name == "single_file_translate_task":
             if args:
                 single_file_translate_task(args[0])
             else:
                 log_to_db("ERROR", "No file path provided for single file translation.")
         elif task_name in globals() and callable(globals()[task_name]):
-            globals()[task_name](*args)
+            try:
+                globals()[task_name](*args)
+            except Exception:
+                # Already logged by the task
+                sys.exit(1)
         else:
             log_to_db("ERROR", f"Background task '{task_name}' not found.")
     else:
@@ -6,6 +6,7 @@ Database Setup for AI Translator
 
 import os
 import sys
+from sqlalchemy import inspect, text
 from models import db, Settings
 
 def create_default_settings():
@@ -24,19 +25,67 @@ def create_default_settings():
         {'key': 'sonarr_api_key', 'value': '', 'section': 'API', 'type': 'string', 'description': 'Sonarr API key'},
         {'key': 'radarr_url', 'value': 'http://localhost:7878', 'section': 'API', 'type': 'string', 'description': 'Radarr server URL'},
         {'key': 'radarr_api_key', 'value': '', 'section': 'API', 'type': 'string', 'description': 'Radarr API key'},
-        {'key': 'ollama_url', 'value': 'http://localhost:11434', 'section': 'API', 'type': 'string', 'description': 'Ollama server URL'},
+        {'key': 'ollama_url', 'value': 'http://localhost:11434', 'section': 'API', 'type': 'string', 'description': 'Ollama server URL (several servers may be listed, separated by commas)'},
         
         # PATHS section
         {'key': 'remote_movies_path', 'value': '/volume1/movies', 'section': 'PATHS', 'type': 'string', 'description': 'Remote movies directory path'},
         {'key': 'remote_series_path', 'value': '/volume1/tv', 'section': 'PATHS', 'type': 'string', 'description': 'Remote TV series directory path'},
         {'key': 'local_movies_mount', 'value': '/mnt/movies', 'section': 'PATHS', 'type': 'string', 'description': 'Local movies mount point'},
         {'key': 'local_series_mount', 'value': '/mnt/series', 'section': 'PATHS', 'type': 'string', 'description': 'Local TV series mount point'},
+        {'key': 'probe_after_sync', 'value': 'true', 'section': 'PATHS', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Read duration, codecs and resolution of new or changed files with ffprobe after each library sync'},
+        {'key': 'media_probe_processes', 'value': 'auto', 'section': 'PATHS', 'type': 'string', 'description': 'Parallel ffprobe processes used when probing the library'},
         
         # MODELS section
         {'key': 'whisper_model', 'value': 'medium.en', 'section': 'MODELS', 'type': 'select', 'options': 'tiny.en:Tiny,base.en:Base,small.en:Small,medium.en:Medium,large-v2:Large', 'description': 'Whisper speech-to-text model'},
         {'key': 'ollama_model', 'value': 'llama3', 'section': 'MODELS', 'type': 'select', 'options': 'llama3:Llama 3,llama2:Llama 2,codellama:Code Llama,mistral:Mistral', 'description': 'Ollama translation model'},
         {'key': 'whisper_model_gpu', 'value': 'auto', 'section': 'MODELS', 'type': 'select', 'options': 'auto:تلقائي,cpu:المعالج فقط', 'description': 'GPU allocation for Whisper'},
         {'key': 'ollama_model_gpu', 'value': 'auto', 'section': 'MODELS', 'type': 'select', 'options': 'auto:تلقائي,cpu:المعالج فقط', 'description': 'GPU allocation for Ollama'},
+        {'key': 'whisper_engine', 'value': 'auto', 'section': 'MODELS', 'type': 'select', 'options': 'auto:تلقائي,faster_whisper:Faster-Whisper,cli:Whisper CLI,stub:Stub (testing)', 'description': 'Whisper engine: warm in-process faster-whisper, the whisper CLI, or a stub for CPU-only testing'},
+        {'key': 'audio_streaming', 'value': 'true', 'section': 'MODELS', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Stream audio from ffmpeg directly into Whisper instead of writing a temporary WAV file (disable for debugging)'},
+        {'key': 'whisper_vad', 'value': 'true', 'section': 'MODELS', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Skip silent stretches (credits, pauses) before Whisper using a voice activity pre-pass'},
+        {'key': 'audio_language_detection', 'value': 'true', 'section': 'MODELS', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Identify the spoken language of untagged audio tracks from short samples before transcribing'},
+        {'key': 'audio_language_id_model', 'value': 'tiny', 'section': 'MODELS', 'type': 'select', 'options': 'tiny:Tiny,base:Base,small:Small', 'description': 'Multilingual Whisper model used for audio language identification'},
+        {'key': 'audio_non_english_action', 'value': 'skip', 'section': 'MODELS', 'type': 'select', 'options': 'skip:تخطي,flag:تعليم للمراجعة,transcribe:تفريغ على أي حال', 'description': 'What to do with files whose audio is neither English nor Arabic (Arabic audio is always skipped)'},
+        {'key': 'whisper_segmented', 'value': 'auto', 'section': 'MODELS', 'type': 'select', 'options': 'auto:تلقائي,true:نعم,false:لا', 'description': 'Split long files into segments transcribed by parallel processes (auto: only when Whisper runs on the CPU)'},
+        {'key': 'whisper_segment_processes', 'value': 'auto', 'section': 'MODELS', 'type': 'string', 'description': 'Processes used for segmented transcription (auto: one per four CPU cores)'},
+        {'key': 'whisper_segment_seconds', 'value': '300', 'section': 'MODELS', 'type': 'string', 'description': 'Target length of each transcription segment in seconds'},
+        {'key': 'whisper_device_scheduler', 'value': 'true', 'section': 'MODELS', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Place each transcription on a GPU with enough free memory, falling back to the CPU when every GPU is busy'},
+        {'key': 'whisper_gpu_slots', 'value': '1', 'section': 'MODELS', 'type': 'select', 'options': '1:1,2:2,3:3,4:4', 'description': 'Transcriptions that may run at the same time on one GPU'},
+        {'key': 'whisper_cpu_slots', 'value': '1', 'section': 'MODELS', 'type': 'select', 'options': '1:1,2:2,3:3,4:4', 'description': 'Transcriptions that may run at the same time on the CPU'},
+        {'key': 'gpu_memory_headroom_mb', 'value': '512', 'section': 'MODELS', 'type': 'string', 'description': 'GPU memory (MiB) kept free when deciding whether a Whisper model fits'},
+        {'key': 'whisper_model_memory_mb', 'value': '0', 'section': 'MODELS', 'type': 'string', 'description': 'Memory (MiB) a Whisper model needs on its device (0: estimate from the model size)'},
+        {'key': 'ollama_keep_alive', 'value': '30m', 'section': 'MODELS', 'type': 'string', 'description': 'How long Ollama keeps the translation model loaded between requests (e.g. 30m, 24h, -1 for always)'},
+        {'key': 'ollama_parallel_requests', 'value': '2', 'section': 'MODELS', 'type': 'select', 'options': '1:1,2:2,4:4,8:8', 'description': 'Number of subtitle chunks translated by Ollama at the same time'},
+        {'key': 'ollama_streaming', 'value': 'true', 'section': 'MODELS', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Stream Ollama output and write translated cues to the subtitle as they arrive'},
+        {'key': 'ollama_inactivity_timeout', 'value': '120', 'section': 'MODELS', 'type': 'string', 'description': 'Seconds without any streamed output before an Ollama request is abandoned'},
+        {'key': 'ollama_use_chat', 'value': 'true', 'section': 'MODELS', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Send translations through /api/chat with a fixed system prompt so Ollama can reuse its prompt cache'},
+        {'key': 'ollama_max_context', 'value': '8192', 'section': 'MODELS', 'type': 'string', 'description': 'Upper limit for the context window requested from Ollama (the model limit from /api/show applies below it)'},
+        
+        # TRANSLATION section
+        {'key': 'translation_memory_enabled', 'value': 'true', 'section': 'TRANSLATION', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Reuse stored translations of repeated subtitle lines'},
+        {'key': 'translation_checkpoints', 'value': 'true', 'section': 'TRANSLATION', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Keep transcripts and translated chunks on disk so interrupted jobs resume where they stopped'},
+        {'key': 'reuse_source_subtitles', 'value': 'true', 'section': 'TRANSLATION', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Translate existing English subtitles (movie.en.srt or embedded text tracks) instead of transcribing with Whisper'},
+        {'key': 'skip_embedded_arabic', 'value': 'true', 'section': 'TRANSLATION', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Skip videos that already contain an embedded Arabic subtitle track'},
+        {'key': 'translation_memory_max_entries', 'value': '200000', 'section': 'TRANSLATION', 'type': 'string', 'description': 'Maximum number of lines kept in translation memory'},
+        {'key': 'translation_target_chunk_seconds', 'value': '60', 'section': 'TRANSLATION', 'type': 'string', 'description': 'Target time per translation chunk; chunk sizes adapt to stay under it'},
+        {'key': 'translation_hedging', 'value': 'false', 'section': 'TRANSLATION', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Send a duplicate request for chunks that run much longer than usual; the first answer wins'},
+        {'key': 'translation_hedge_percentile', 'value': '95', 'section': 'TRANSLATION', 'type': 'select', 'options': '90:90,95:95,99:99', 'description': 'Latency percentile of recent chunks after which a chunk is hedged'},
+        
+        # PIPELINE section
+        {'key': 'pipeline_extract_audio_workers', 'value': '1', 'section': 'PIPELINE', 'type': 'string', 'description': 'Worker threads for the audio extraction stage of translation'},
+        {'key': 'pipeline_extract_audio_queue', 'value': '1', 'section': 'PIPELINE', 'type': 'string', 'description': 'Files allowed to wait for audio extraction'},
+        {'key': 'pipeline_transcribe_workers', 'value': '1', 'section': 'PIPELINE', 'type': 'string', 'description': 'Worker threads for the transcription stage'},
+        {'key': 'pipeline_transcribe_queue', 'value': '1', 'section': 'PIPELINE', 'type': 'string', 'description': 'Files allowed to wait for transcription'},
+        {'key': 'pipeline_translate_workers', 'value': '1', 'section': 'PIPELINE', 'type': 'string', 'description': 'Files translated by Ollama at the same time'},
+        {'key': 'pipeline_translate_queue', 'value': '2', 'section': 'PIPELINE', 'type': 'string', 'description': 'Transcribed files allowed to wait for translation'},
+        {'key': 'worker_autostart', 'value': 'true', 'section': 'PIPELINE', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Start the job worker daemon (job_worker.py) automatically when a task is queued'},
+        {'key': 'worker_translate_slots', 'value': '2', 'section': 'PIPELINE', 'type': 'string', 'description': 'Files the job worker keeps in the translation pipeline at the same time (each stage is limited by its pipeline_* settings)'},
+        {'key': 'worker_sync_slots', 'value': '1', 'section': 'PIPELINE', 'type': 'string', 'description': 'Library sync and media probe tasks the job worker runs at the same time'},
+        {'key': 'worker_scan_slots', 'value': '1', 'section': 'PIPELINE', 'type': 'string', 'description': 'Scan, correction and batch queueing tasks the job worker runs at the same time'},
+        {'key': 'job_lease_seconds', 'value': '120', 'section': 'PIPELINE', 'type': 'string', 'description': 'Lease of a claimed job; jobs of a worker that stops renewing return to the queue after this time'},
+        {'key': 'job_max_attempts', 'value': '3', 'section': 'PIPELINE', 'type': 'string', 'description': 'Times a job is retried after its worker died before it is marked failed'},
+        {'key': 'queue_policy', 'value': 'priority', 'section': 'PIPELINE', 'type': 'select', 'options': 'priority:الأولوية ثم الأقدم,newest:الأحدث إضافة أولاً,shortest:الأقصر مدة أولاً', 'description': 'Order in which queued files are translated (explicit priority always comes first)'},
+        {'key': 'queue_aging_hours', 'value': '24', 'section': 'PIPELINE', 'type': 'string', 'description': 'Hours of waiting that raise a queued file by one priority level, so low-priority files still finish (0 disables aging)'},
         
         # CORRECTIONS section
         {'key': 'auto_correct_filenames', 'value': 'true', 'section': 'CORRECTIONS', 'type': 'select', 'options': 'true:نعم,false:لا', 'description': 'Automatically correct subtitle filenames'},
@@ -93,10 +142,39 @@ def create_default_settings():
         print(f"✗ Error creating default settings: {str(e)}")
         return False
 
+def add_missing_columns():
+    """إضافة الأعمدة الجديدة إلى الجداول الموجودة
+    
+    create_all only creates missing tables, so columns added to existing models
+    are added here with ALTER TABLE (nullable, without defaults). Columns that
+    became optional in the model lose their NOT NULL constraint where the
+    database supports it.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name']: column for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"✓ Added column {table.name}.{column.name}")
+            elif column.nullable and not column.primary_key and not existing[column.name]['nullable']:
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {column.name} DROP NOT NULL'))
+                    print(f"✓ Column {table.name}.{column.name} is now optional")
+                except Exception as e:
+                    print(f"✗ Could not make {table.name}.{column.name} optional: {e}")
+
 def setup_database():
     try:
         # إنشاء الجداول إذا لم تكن موجودة
         db.create_all()
+        add_missing_columns()
         
         # Create default settings
         create_default_settings()
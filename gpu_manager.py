@@ -79,6 +79,10 @@ class GPUManager:
                             'cuda_version': self.get_cuda_version()
                         }
                         
+                        # nvidia-smi reports MiB; allocation and the GPU page work in GB
+                        gpu_info['memory_total_gb'] = round(gpu_info['memory_total'] / 1024, 1)
+                        gpu_info['memory_free_gb'] = round(gpu_info['memory_free'] / 1024, 1)
+
                         # Calculate memory usage percentage
                         if gpu_info['memory_total'] > 0:
                             gpu_info['memory_usage_percent'] = (gpu_info['memory_used'] / gpu_info['memory_total']) * 100
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+عامل المهام الدائم - AI Translator
+Long-running worker daemon that serves the translation_jobs queue
+
+Each task class (translate, sync, scan) has its own number of worker slots, so
+a library sync runs next to translations instead of waiting for them. Claimed
+jobs are held under a lease that a background thread keeps renewing; jobs of
+a worker that died return to the queue when their lease expires.
+
+Workers on other machines share the library database (DATABASE_URL) and
+claim from the same queue. Each worker records a heartbeat in worker_nodes
+and maps library paths to its own mount points (--path-map or
+WORKER_PATH_MAP); subtitles are written next to the video on the shared
+storage and the status goes back to the shared database. Library sync and
+scan tasks use the library paths as they are, so a worker with a path map
+runs translations only.
+
+Translate slots feed one shared staged pipeline (services.pipeline), so the
+next file is extracted and transcribed while the previous one translates. The
+number of translate slots is the number of files in flight; the per-stage
+worker and queue settings bound each stage.
+
+A cancel or pause request for a running file (the job's control column) is
+picked up within a few seconds and stops that job alone; the slot moves on
+to the next job.
+
+Usage: python job_worker.py [--name NAME] [--path-map LIBRARY=LOCAL ...] [--slots CLASS=N ...]
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+from functools import partial
+
+from services import job_queue, worker_nodes
+from services.scheduling import ensure_durations, get_policy
+from utils.path_mapping import parse_path_map, path_map_from_env, to_local_path
+from utils.worker_db import get_worker_settings, session_scope
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+POLL_INTERVAL = 2.0
+
+# Slots per task class when the worker_<class>_slots setting is missing
+DEFAULT_SLOTS = {
+    'translate': 2,
+    'sync': 1,
+    'scan': 1,
+}
+# Task classes whose tasks walk the whole library by its own paths (sync, corrections,
+# status scans); a worker that maps paths to other mount points must not run them
+LIBRARY_WIDE_CLASSES = ('sync', 'scan')
+
+def _int_setting(settings, key, default):
+    try:
+        return max(0, int(settings.get(key, default)))
+    except (TypeError, ValueError):
+        return default
+
+class JobWorker:
+    """Runs worker slot threads for every task class and keeps their leases alive"""
+
+    def __init__(self, settings=None, owner=None, path_map=None, slots=None):
+        self.settings = settings if settings is not None else get_worker_settings()
+        self.hostname = socket.gethostname()
+        self.owner = owner or f"{self.hostname}:{os.getpid()}"
+        self.path_map = path_map if path_map is not None else path_map_from_env()
+        self.lease_seconds = _int_setting(self.settings, 'job_lease_seconds', job_queue.DEFAULT_LEASE_SECONDS) or \
+            job_queue.DEFAULT_LEASE_SECONDS
+        self.max_attempts = _int_setting(self.settings, 'job_max_attempts', job_queue.DEFAULT_MAX_ATTEMPTS)
+        self.slots = {
+            task_class: _int_setting(self.settings, f'worker_{task_class}_slots', default)
+            for task_class, default in DEFAULT_SLOTS.items()
+        }
+        self.slots.update(slots or {})
+        if self.path_map:
+            if any((slots or {}).get(task_class) for task_class in LIBRARY_WIDE_CLASSES):
+                logger.warning("Workers with a path map only translate files; ignoring the sync and scan slots")
+            self.slots.update(dict.fromkeys(LIBRARY_WIDE_CLASSES, 0))
+        self.stop_event = threading.Event()
+        self.held = {}  # job id -> what it is doing (reported with the heartbeat)
+        self.held_lock = threading.Lock()
+        self.tokens = {}  # job id -> CancelToken of a running file job
+        self.pipeline = None  # shared PipelineEngine, built by the first translate job
+        self.pipeline_lock = threading.Lock()
+        self.left_pipeline = {}  # job id -> Event set when the file leaves the pipeline
+        self.counts = {'completed': 0, 'failed': 0}
+        self.threads = []
+
+    def start(self):
+        try:
+            with session_scope() as session:
+                worker_nodes.register_worker(session, self.owner, self.hostname, os.getpid(), self.slots,
+                                             self.path_map)
+        except Exception as e:
+            logger.error(f"Could not register worker {self.owner}: {e}")
+        for task_class, count in self.slots.items():
+            for number in range(count):
+                thread = threading.Thread(target=self._slot, args=(task_class,),
+                                          name=f"worker-{task_class}-{number}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        thread = threading.Thread(target=self._maintain, name="worker-leases", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        logger.info(f"Job worker {self.owner} started with slots {self.slots}")
+
+    def stop(self):
+        """Stop claiming and hand the jobs still running back to the queue"""
+        self.stop_event.set()
+        with self.held_lock:
+            held = list(self.held)
+        if held:
+            try:
+                with session_scope() as session:
+                    for job_id in held:
+                        job_queue.release_job(session, job_id, self.owner)
+                logger.info(f"Released {len(held)} running jobs back to the queue")
+            except Exception as e:
+                logger.error(f"Could not release jobs: {e}")
+        try:
+            with session_scope() as session:
+                worker_nodes.mark_stopped(session, self.owner)
+        except Exception as e:
+            logger.error(f"Could not mark worker {self.owner} stopped: {e}")
+        if self.pipeline:
+            self.pipeline.stop()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self.stop_event.wait(1):
+                pass
+        finally:
+            self.stop()
+
+    def current_jobs(self):
+        with self.held_lock:
+            return [dict(info) for info in self.held.values()]
+
+    def _lease_lost(self, job_id):
+        """Stop a job whose lease expired: another worker may already be running it"""
+        with self.held_lock:
+            token = self.tokens.get(job_id)
+        if token is not None and token.request('cancel'):
+            logger.warning(f"Lost the lease of job {job_id}; stopping it, another worker may run it again")
+        elif token is None:
+            logger.warning(f"Lost the lease of job {job_id}; another worker may run it again")
+
+    def _owns(self, job_id):
+        """Renew the lease of job_id; False when this worker no longer holds it"""
+        try:
+            with session_scope() as session:
+                owned = bool(job_queue.renew_leases(session, self.owner, [job_id], self.lease_seconds))
+        except Exception as e:
+            logger.error(f"Could not confirm the lease of job {job_id}: {e}")
+            return False
+        if not owned:
+            self._lease_lost(job_id)
+        return owned
+
+    def _apply_controls(self):
+        """Hand cancel and pause requests from the database to the running jobs"""
+        with self.held_lock:
+            tokens = dict(self.tokens)
+        if not tokens:
+            return
+        try:
+            with session_scope() as session:
+                controls = job_queue.pending_controls(session, self.owner, tokens)
+        except Exception as e:
+            logger.error(f"Could not read job controls: {e}")
+            return
+        for job_id, action in controls.items():
+            if tokens[job_id].request(action):
+                logger.info(f"{'Pausing' if action == 'pause' else 'Cancelling'} job {job_id}")
+
+    def _maintain(self):
+        """Apply job controls, send the heartbeat; renew leases and requeue jobs of dead workers"""
+        interval = max(1.0, self.lease_seconds / 3)
+        next_renewal = time.monotonic() + interval
+        # The heartbeat has its own interval, so long leases do not make the worker look offline
+        next_heartbeat = time.monotonic() + worker_nodes.HEARTBEAT_SECONDS
+        while not self.stop_event.wait(min(POLL_INTERVAL, interval)):
+            self._apply_controls()
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                next_heartbeat = now + worker_nodes.HEARTBEAT_SECONDS
+                try:
+                    with session_scope() as session:
+                        if not worker_nodes.heartbeat(session, self.owner, self.current_jobs(), self.counts):
+                            worker_nodes.register_worker(session, self.owner, self.hostname, os.getpid(),
+                                                         self.slots, self.path_map)
+                except Exception as e:
+                    logger.error(f"Heartbeat failed: {e}")
+            if now < next_renewal:
+                continue
+            next_renewal = now + interval
+            try:
+                with self.held_lock:
+                    held = list(self.held)
+                with session_scope() as session:
+                    if held:
+                        renewed = set(job_queue.renew_leases(session, self.owner, held, self.lease_seconds))
+                        for job_id in set(held) - renewed:
+                            self._lease_lost(job_id)
+                    stats = job_queue.recover_expired(session, self.max_attempts)
+                    worker_nodes.prune_workers(session)
+                if stats['requeued'] or stats['failed']:
+                    logger.info(f"Expired leases: {stats['requeued']} requeued, {stats['failed']} failed")
+            except Exception as e:
+                logger.error(f"Lease maintenance failed: {e}")
+
+    def _slot(self, task_class):
+        task_types = job_queue.task_types_for(task_class)
+        while not self.stop_event.is_set():
+            try:
+                # Settings are re-read per claim, so a policy change applies from the next file
+                policy = get_policy(get_worker_settings()) if task_class == 'translate' else None
+                with session_scope() as session:
+                    job = job_queue.claim_next(session, task_types, self.owner, self.lease_seconds, policy)
+                    claimed = (job.id, job.task_type, job_queue.job_payload(job)) if job else None
+            except Exception as e:
+                logger.error(f"Could not claim a {task_class} job: {e}")
+                claimed = None
+            if not claimed:
+                self.stop_event.wait(POLL_INTERVAL)
+                continue
+
+            job_id, task_type, payload = claimed
+            with self.held_lock:
+                self.held[job_id] = {
+                    'id': job_id,
+                    'task_type': task_type,
+                    'args': payload.get('args', []),
+                    'stage': None,
+                    'slot': threading.current_thread().name,
+                    'started_at': datetime.utcnow().isoformat()
+                }
+            try:
+                status, error = self.run_job(job_id, task_type, payload.get('args', []))
+            except Exception as e:
+                logger.error(f"Job {job_id} ({task_type}) failed: {e}")
+                status, error = 'failed', str(e)
+            with self.held_lock:
+                self.held.pop(job_id, None)
+            if status in self.counts:
+                self.counts[status] += 1
+            # A job released by stop() is no longer ours, so finish_job leaves it queued
+            try:
+                with session_scope() as session:
+                    job_queue.finish_job(session, job_id, self.owner, status, error)
+            except Exception as e:
+                logger.error(f"Could not record the result of job {job_id}: {e}")
+
+    def run_job(self, job_id, task_type, args):
+        """Run one claimed job; returns (status, error)"""
+        logger.info(f"Running job {job_id}: {task_type} {' '.join(args)}")
+        if task_type == 'translate_file':
+            return self.translate_file(job_id, args[0])
+        if task_type == 'batch_translate':
+            return self.queue_untranslated()
+
+        import background_tasks
+        task = getattr(background_tasks, f"{task_type}_task")
+        # Tasks log their own errors and re-raise them, so a failure is recorded as failed
+        task(*args)
+        return 'completed', None
+
+    def _get_pipeline(self):
+        with self.pipeline_lock:
+            if self.pipeline is None:
+                from process_video import build_pipeline, load_settings
+                # Stage workers and queue sizes are read once, when the worker starts translating
+                self.pipeline = build_pipeline(load_settings(), on_finished=self._pipeline_finished,
+                                               on_stage=self._pipeline_stage)
+                self.pipeline.start()
+            return self.pipeline
+
+    def _pipeline_stage(self, file_job, number, name):
+        from process_video import FILE_STAGES
+
+        job_id = file_job.queue_job_id
+        with self.held_lock:
+            if job_id in self.held:
+                self.held[job_id]['stage'] = name
+        try:
+            with session_scope() as session:
+                job_queue.update_progress(session, job_id, self.owner, round(100.0 * number / len(FILE_STAGES), 1))
+        except Exception as e:
+            logger.debug(f"Progress update failed for job {job_id}: {e}")
+
+    def _pipeline_finished(self, file_job):
+        from process_video import record_job_metrics
+
+        try:
+            file_job.cleanup()
+            record_job_metrics(file_job)
+        finally:
+            with self.held_lock:
+                done = self.left_pipeline.pop(file_job.queue_job_id, None)
+            if done:
+                done.set()
+
+    def translate_file(self, job_id, video_path):
+        from process_video import FileJob, load_settings
+
+        local_path = to_local_path(video_path, self.path_map)
+        if not os.path.exists(local_path):
+            return 'failed', f"{local_path} is not reachable on {self.hostname} (check the worker path map)"
+
+        job = FileJob(local_path, load_settings())
+        job.library_path = video_path
+        job.queue_job_id = job_id
+        job.queue_owner = self.owner
+        # The subtitle is only published while this worker still holds the lease
+        job.cancel_token.verify = partial(self._owns, job_id)
+        done = threading.Event()
+        with self.held_lock:
+            self.tokens[job_id] = job.cancel_token
+            self.left_pipeline[job_id] = done
+
+        try:
+            # The slot waits for its file while the stages overlap with the other slots' files
+            self._get_pipeline().submit(job)
+            done.wait()
+        finally:
+            with self.held_lock:
+                self.tokens.pop(job_id, None)
+                self.left_pipeline.pop(job_id, None)
+        if job.cancelled:
+            return ('paused' if job.cancelled == 'pause' else 'cancelled'), job.error
+        if job.success:
+            return ('skipped' if 'translate' not in job.stage_times else 'completed'), None
+        return 'failed', job.error
+
+    def queue_untranslated(self):
+        """batch_translate: queue one translate_file job per untranslated file"""
+        from background_tasks import read_blacklist, log_to_file
+        from models import MediaFile
+
+        blacklist = set(read_blacklist())
+        with session_scope() as session:
+            paths = [row[0] for row in session.query(MediaFile.path).filter(
+                MediaFile.translated == False, MediaFile.blacklisted.isnot(True)).order_by(MediaFile.path)]
+            # Library paths are queued, but whether a file exists is checked where this host mounts it
+            local_path = partial(to_local_path, mappings=self.path_map)
+            paths = [path for path in paths if path not in blacklist and os.path.exists(local_path(path))]
+            if get_policy(get_worker_settings()).name == 'shortest':
+                ensure_durations(session, paths, local_path=local_path)
+            added = job_queue.enqueue_files(session, paths)
+        log_to_file(f"Queued {added} files for translation ({len(paths) - added} already queued)")
+        return 'completed', None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the translation_jobs queue")
+    parser.add_argument('--name', help="Worker name shown on the dashboard (default host:pid)")
+    parser.add_argument('--path-map', action='append', default=[], metavar='LIBRARY=LOCAL',
+                        help="Where a library path prefix is mounted on this host (repeatable)")
+    parser.add_argument('--slots', action='append', default=[], metavar='CLASS=N',
+                        help="Worker slots of a task class, e.g. translate=1 sync=0 (repeatable)")
+    args = parser.parse_args(argv)
+
+    slots = {}
+    for item in args.slots:
+        task_class, _, count = item.partition('=')
+        if task_class not in DEFAULT_SLOTS or not count.isdigit():
+            parser.error(f"Invalid --slots value '{item}'")
+        slots[task_class] = int(count)
+    try:
+        path_map = parse_path_map(args.path_map) if args.path_map else None
+    except ValueError as e:
+        parser.error(str(e))
+    return args.name, path_map, slots
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    name, path_map, slots = parse_args(argv)
+    os.chdir(PROJECT_DIR)
+    worker = JobWorker(owner=name, path_map=path_map, slots=slots)
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping")
+        worker.stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    worker.run_forever()
+
+if __name__ == "__main__":
+    sys.path.insert(0, PROJECT_DIR)
+    main()
@@ -51,6 +51,7 @@ class MediaFile(db.Model):
     audio_codec = db.Column(db.String(50))
     resolution = db.Column(db.String(20))
     subtitle_language = db.Column(db.String(10), default='ar')  # Target translation language
+    audio_language = db.Column(db.String(10))  # Spoken language identified for untagged audio
     translation_completed_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -69,20 +70,46 @@ class TranslationJob(db.Model):
     __tablename__ = 'translation_jobs'
     
     id = db.Column(db.Integer, Sequence('translation_jobs_id_seq'), primary_key=True)
-    media_file_id = db.Column(db.Integer, db.ForeignKey('media_files.id'), nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
+    media_file_id = db.Column(db.Integer, db.ForeignKey('media_files.id'))  # Empty for library-wide tasks
+    task_type = db.Column(db.String(50), default='translate_file')  # see services.job_queue.TASK_CLASSES
+    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed, skipped, paused, cancelled
+    priority = db.Column(db.Integer, default=0)
+    payload = db.Column(db.Text)  # JSON task arguments
+    lease_owner = db.Column(db.String(100))  # host:pid of the worker holding the job
+    worker = db.Column(db.String(100))  # worker that ran the job last (kept after the lease ends)
+    lease_expires_at = db.Column(db.DateTime)
+    control = db.Column(db.String(20))  # cancel or pause requested for the running job (read by its worker)
+    attempts = db.Column(db.Integer, default=0)
     progress = db.Column(db.Float, default=0.0)  # 0.0 to 100.0
     error_message = db.Column(db.Text)
     whisper_model = db.Column(db.String(50))
     ollama_model = db.Column(db.String(50))
     audio_duration = db.Column(db.Float)
     processing_time = db.Column(db.Float)
+    metrics = db.Column(db.Text)  # JSON: stage times, counters and per-chunk records
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     
     media_file = db.relationship('MediaFile', backref='translation_jobs')
 
+class WorkerNode(db.Model):
+    __tablename__ = 'worker_nodes'
+    
+    id = db.Column(db.Integer, Sequence('worker_nodes_id_seq'), primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)  # lease owner used for claimed jobs
+    hostname = db.Column(db.String(255))
+    pid = db.Column(db.Integer)
+    status = db.Column(db.String(20), default='running')  # running, stopped
+    slots = db.Column(db.Text)  # JSON: worker slots per task class
+    path_map = db.Column(db.Text)  # JSON: [[library prefix, local prefix], ...] for this host's mounts
+    current_jobs = db.Column(db.Text)  # JSON: jobs running at the last heartbeat
+    jobs_completed = db.Column(db.Integer, default=0)
+    jobs_failed = db.Column(db.Integer, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_heartbeat = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
     
@@ -136,6 +163,34 @@ class TranslationHistory(db.Model):
     
     media_file = db.relationship('MediaFile', backref='translation_history')
 
+class TranslationMemory(db.Model):
+    __tablename__ = 'translation_memory'
+    
+    id = db.Column(db.Integer, Sequence('translation_memory_id_seq'), primary_key=True)
+    source_hash = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of normalized text + model + language
+    source_text = db.Column(db.Text, nullable=False)  # Normalized English text
+    translated_text = db.Column(db.Text, nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    target_language = db.Column(db.String(10), default='ar')
+    hit_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class MediaProbeCache(db.Model):
+    __tablename__ = 'media_probe_cache'
+    
+    id = db.Column(db.Integer, Sequence('media_probe_cache_id_seq'), primary_key=True)
+    file_key = db.Column(db.String(100), unique=True, nullable=False)  # device:inode:size:mtime_ns
+    path = db.Column(db.Text, nullable=False)
+    duration = db.Column(db.Integer)  # in seconds
+    video_codec = db.Column(db.String(50))
+    audio_codec = db.Column(db.String(50))
+    resolution = db.Column(db.String(20))
+    file_size = db.Column(db.BigInteger)
+    streams = db.Column(db.Text)  # JSON summary of audio/subtitle streams
+    error = db.Column(db.Text)
+    probed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class TranslationLog(db.Model):
     __tablename__ = 'translation_logs'
     
@@ -4,10 +4,21 @@ import sys
 import subprocess
 import time
 import tempfile
+import shutil
 import json
-import requests
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
+from contextlib import contextmanager
 from datetime import datetime
+from functools import partial
 from pathlib import Path
+from services.cancellation import JobCancelled, run_child
+from services.pipeline import PipelineJob, PipelineStage, PipelineEngine
+from utils.srt import (parse_srt, compose_srt, read_srt_file, build_text_batch, apply_text_batch,
+                       parse_text_batch, BatchLineAssembler, PartialSubtitleWriter, LINE_BREAK_MARKER,
+                       partial_path_for)
 
 def log_message(message):
     """Log message to console and process log file"""
@@ -34,26 +45,19 @@ except ImportError as e:
     log_message("Falling back to original implementation")
 
 def get_settings():
-    """Get settings from PostgreSQL database using Flask app context"""
+    """Get settings from the database through the lightweight worker layer"""
     try:
-        # Import Flask app and models
         sys.path.append(os.path.dirname(__file__))
-        from app import app, db
-        from models import Settings
-        
-        with app.app_context():
-            settings = {}
-            all_settings = Settings.query.all()
-            for setting in all_settings:
-                settings[setting.key] = setting.value
-            return settings
+        from utils.worker_db import get_worker_settings
+        return get_worker_settings()
     except Exception as e:
-        log_message(f"Error reading settings from PostgreSQL: {e}")
+        log_message(f"Error reading settings from database: {e}")
         # Fallback to environment variables
         return {
             'ollama_api_url': os.environ.get('OLLAMA_API_URL', 'http://localhost:11434/api/generate'),
             'ollama_model': os.environ.get('OLLAMA_MODEL', 'llama3'),
-            'whisper_model': os.environ.get('WHISPER_MODEL', 'medium.en')
+            'whisper_model': os.environ.get('WHISPER_MODEL', 'medium.en'),
+            'ollama_parallel_requests': os.environ.get('OLLAMA_PARALLEL_REQUESTS', '2')
         }
 
 def check_existing_translation(video_path):
@@ -66,39 +70,33 @@ def check_existing_translation(video_path):
     return os.path.exists(arabic_srt_path)
 
 def update_translation_status(video_path, translated=True):
-    """Update translation status in PostgreSQL database"""
+    """Update translation status in the database without loading the web app"""
     try:
-        # Import Flask app and models
         sys.path.append(os.path.dirname(__file__))
-        from app import app, db
-        from models import MediaFile
-        from datetime import datetime
+        from utils.worker_db import update_media_translation_status
         
-        with app.app_context():
-            # Find media file by path
-            media_file = MediaFile.query.filter_by(path=video_path).first()
-            
-            if media_file:
-                media_file.translated = translated
-                if translated:
-                    media_file.translation_completed_at = datetime.utcnow()
-                db.session.commit()
-                log_message(f"Updated translation status for: {os.path.basename(video_path)}")
-                return True
-            else:
-                log_message(f"Warning: No database record found for: {os.path.basename(video_path)}")
-                return False
+        if update_media_translation_status(video_path, translated):
+            log_message(f"Updated translation status for: {os.path.basename(video_path)}")
+            return True
+        else:
+            log_message(f"Warning: No database record found for: {os.path.basename(video_path)}")
+            return False
                 
     except Exception as e:
         log_message(f"Failed to update translation status: {str(e)}")
         return False
 
-def extract_audio(video_path, audio_path):
-    """Extract audio from video file using ffmpeg"""
+def extract_audio(video_path, audio_path, audio_stream=None, cancel_token=None):
+    """Extract audio from video file using ffmpeg (audio_stream: ffprobe stream to use instead of the default)
+    
+    ffmpeg is terminated when cancel_token is set, and JobCancelled is raised.
+    """
+    from utils.audio_tracks import audio_map_args
     log_message(f"Extracting audio from: {os.path.basename(video_path)}")
     
     cmd = [
         'ffmpeg', '-i', video_path,
+        *audio_map_args(audio_stream),
         '-vn',  # No video
         '-acodec', 'pcm_s16le',  # PCM 16-bit little-endian
         '-ar', '16000',  # 16 kHz sample rate for Whisper
@@ -108,7 +106,7 @@ def extract_audio(video_path, audio_path):
     ]
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
+        result = run_child(cmd, cancel_token, timeout=3600)
         if result.returncode != 0:
             raise Exception(f"ffmpeg error: {result.stderr}")
         log_message("Audio extraction completed successfully")
@@ -120,8 +118,145 @@ def extract_audio(video_path, audio_path):
         log_message(f"Audio extraction failed: {str(e)}")
         return False
 
-def transcribe_with_whisper(audio_path, settings):
-    """Transcribe audio using Whisper"""
+def create_speech_gate(settings):
+    """SpeechGate for the VAD pre-pass, or None when whisper_vad is off"""
+    if not is_setting_enabled(settings, 'whisper_vad'):
+        return None
+    from utils.vad import SpeechGate
+    return SpeechGate()
+
+def report_speech_gate(gate, metrics):
+    skipped = gate.skipped_fraction
+    log_message(f"VAD skipped {skipped:.0%} of the audio ({gate.total_samples / 16000:.0f}s total)")
+    if metrics is not None:
+        metrics['vad_skipped_fraction'] = round(skipped, 4)
+
+def write_transcript(cues, audio_path):
+    """Write cues as <audio name>.srt next to the audio and return the path"""
+    audio_name = os.path.splitext(os.path.basename(audio_path))[0]
+    srt_path = os.path.join(os.path.dirname(audio_path), f"{audio_name}.srt")
+    with open(srt_path, 'w', encoding='utf-8') as f:
+        f.write(compose_srt(cues))
+    
+    log_message("Whisper transcription completed successfully")
+    return srt_path
+
+def wait_for_cues(future, cancel_token=None, timeout=7200):
+    """Result of a transcription future (2 hour limit); raises JobCancelled once cancel_token is set
+    
+    A cancelled job stops waiting; the warm worker drops the rest of a guarded
+    stream, but a whole file it has already started is finished and discarded.
+    """
+    if cancel_token is None:
+        return future.result(timeout=timeout)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            cues = future.result(timeout=1)
+            break
+        except FutureTimeout:
+            cancel_token.check()
+            if time.time() > deadline:
+                raise
+    cancel_token.check()
+    return cues
+
+def transcribe_with_whisper(audio_path, settings, metrics=None, segmented=False, cancel_token=None):
+    """Transcribe audio with the warm in-process engine, falling back to the whisper CLI
+    
+    With whisper_vad on, only the speech regions of the memory-mapped WAV are
+    recognised and cue timings are mapped back to the full audio. segmented
+    spreads a long file over a process pool (see services.segmented_transcription).
+    Setting cancel_token stops the transcription and raises JobCancelled.
+    """
+    engine_name = settings.get('whisper_engine', 'auto')
+    
+    if engine_name != 'cli' and segmented:
+        try:
+            from services.segmented_transcription import transcribe_segmented
+            log_message("Starting segmented Whisper transcription...")
+            cues, skipped = transcribe_segmented(audio_path, settings, cancel_token=cancel_token)
+            if metrics is not None and is_setting_enabled(settings, 'whisper_vad'):
+                metrics['vad_skipped_fraction'] = round(skipped, 4)
+            return write_transcript(cues, audio_path)
+        except Exception as e:
+            if cancel_token:
+                # The pool was terminated by the cancellation, not by a failure
+                cancel_token.check()
+            log_message(f"Segmented transcription failed ({str(e)}), using a single worker")
+    
+    if engine_name != 'cli':
+        try:
+            from services.whisper_engine import get_transcription_worker
+            worker = get_transcription_worker(settings)
+            log_message(f"Starting Whisper transcription ({worker.engine.name}, warm worker)...")
+            gate = create_speech_gate(settings)
+            if gate:
+                from utils.vad import load_wav_memmap, iter_memmap_blocks
+                blocks = gate.filter(iter_memmap_blocks(load_wav_memmap(audio_path)))
+                if cancel_token:
+                    blocks = cancel_token.guard(blocks)
+                cues = gate.remap_cues(wait_for_cues(worker.submit_stream(blocks), cancel_token))
+                report_speech_gate(gate, metrics)
+            else:
+                cues = wait_for_cues(worker.submit(audio_path), cancel_token)
+            return write_transcript(cues, audio_path)
+        except Exception as e:
+            if engine_name not in ('auto', ''):
+                log_message(f"Whisper transcription failed: {str(e)}")
+                return None
+            log_message(f"In-process Whisper not available ({str(e)}), falling back to whisper CLI")
+    
+    return transcribe_with_whisper_cli(audio_path, settings, cancel_token)
+
+def transcribe_video_stream(video_path, output_dir, settings, metrics=None, audio_stream=None, cancel_token=None):
+    """Pipe ffmpeg PCM straight into the warm Whisper worker, without a temporary WAV
+    
+    Extraction and recognition overlap: the worker transcribes one window while
+    ffmpeg keeps decoding into a bounded buffer. Returns None on failure so the
+    caller can fall back to the WAV-on-disk path. Setting cancel_token stops
+    ffmpeg and raises JobCancelled.
+    """
+    try:
+        from services.whisper_engine import get_transcription_worker
+        from utils.audio_stream import PcmStream
+        from utils.audio_tracks import audio_map_args
+    except ImportError as e:
+        log_message(f"Audio streaming not available: {str(e)}")
+        return None
+    
+    log_message(f"Streaming audio from: {os.path.basename(video_path)}")
+    stream = None
+    try:
+        worker = get_transcription_worker(settings)
+        stream = PcmStream(video_path, max_blocks=int(settings.get('audio_stream_buffer_blocks', 12)),
+                           input_args=audio_map_args(audio_stream))
+        blocks = stream
+        if cancel_token:
+            cancel_token.on_cancel(stream.close)
+            blocks = cancel_token.guard(stream)
+        gate = create_speech_gate(settings)
+        if gate:
+            cues = gate.remap_cues(wait_for_cues(worker.submit_stream(gate.filter(blocks)), cancel_token))
+            report_speech_gate(gate, metrics)
+        else:
+            cues = wait_for_cues(worker.submit_stream(blocks), cancel_token)
+        
+        srt_path = os.path.join(output_dir, "audio.srt")
+        with open(srt_path, 'w', encoding='utf-8') as f:
+            f.write(compose_srt(cues))
+        
+        log_message(f"Streamed transcription completed ({stream.seconds_read:.0f}s of audio)")
+        return srt_path
+    except Exception as e:
+        log_message(f"Streamed transcription failed: {str(e)}")
+        return None
+    finally:
+        if stream:
+            stream.close()
+
+def transcribe_with_whisper_cli(audio_path, settings, cancel_token=None):
+    """Transcribe audio by spawning the whisper CLI (reloads the model every call)"""
     log_message("Starting Whisper transcription...")
     
     model = settings.get('whisper_model', 'medium.en')
@@ -162,7 +297,7 @@ def transcribe_with_whisper(audio_path, settings):
         env['CUDA_VISIBLE_DEVICES'] = gpu_device
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=7200, env=env)  # 2 hours
+        result = run_child(cmd, cancel_token, timeout=7200, env=env)  # 2 hours
         if result.returncode != 0:
             raise Exception(f"Whisper error: {result.stderr}")
         
@@ -183,9 +318,31 @@ def transcribe_with_whisper(audio_path, settings):
         log_message(f"Whisper transcription failed: {str(e)}")
         return None
 
-def translate_with_ollama(text, settings):
-    """Translate text using Ollama API"""
-    api_url = settings.get('ollama_api_url', 'http://localhost:11434/api/generate')
+# Identical for every chunk, so the server evaluates this prefix once and reuses it from its KV cache
+TRANSLATION_SYSTEM_PROMPT = f"""You translate English subtitles to Arabic. The user sends numbered English subtitle lines.
+
+Important instructions:
+- Return exactly one line per input line, starting with the same number and a colon (for example "3: ...")
+- Do not merge, split, skip or reorder lines
+- Keep the {LINE_BREAK_MARKER} markers where they appear
+- Reply with the translated lines only, without any notes
+- Use natural, fluent Arabic
+- For proper nouns (names, places), use appropriate Arabic transliteration"""
+
+def build_translation_prompt(text):
+    """Per-chunk part of the request; everything stable lives in TRANSLATION_SYSTEM_PROMPT"""
+    return f"Translate the following numbered English subtitle lines to Arabic:\n\n{text}"
+
+def translate_with_ollama(text, settings, on_line=None, num_ctx=None, cancel_event=None, usage=None,
+                          avoid_urls=None):
+    """Translate text using Ollama API
+    
+    The request is a stable system message plus the numbered lines, sent to
+    /api/chat (or /api/generate with a system field when ollama_use_chat is
+    off). Ollama's prompt counters are copied into usage when given. Setting
+    cancel_event abandons the request, streaming or not. avoid_urls lists the
+    servers already working on the same text (see OllamaPool._call).
+    """
     model = settings.get('ollama_model', 'llama3')
     gpu_id = settings.get('ollama_gpu_id', 'auto')
     
@@ -201,167 +358,891 @@ def translate_with_ollama(text, settings):
         except ValueError:
             log_message(f"Invalid GPU ID: {gpu_id}, using auto selection")
     
-    prompt = f"""Please translate the following English subtitle text to Arabic. Keep the timing format intact and translate only the text content:
-
-{text}
-
-Important instructions:
-- Maintain all SRT formatting (timestamps, line numbers)
-- Translate only the dialogue text, not the timestamps
-- Keep the same structure and line breaks
-- Use natural, fluent Arabic
-- For proper nouns (names, places), use appropriate Arabic transliteration"""
+    prompt = build_translation_prompt(text)
+    messages = [
+        {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": 0.3,
-            "top_p": 0.9,
-            "max_tokens": 4000
-        }
+    options = {
+        "temperature": 0.3,
+        "top_p": 0.9,
+        "max_tokens": 4000
     }
+    if num_ctx:
+        options["num_ctx"] = num_ctx
     
     try:
-        response = requests.post(api_url, json=payload, timeout=300)
-        response.raise_for_status()
-        
-        result = response.json()
-        if 'response' in result:
-            return result['response'].strip()
+        from services.ollama_client import get_ollama_pool, OllamaError, OllamaCancelled
+        client = get_ollama_pool(settings)
+        use_chat = is_setting_enabled(settings, 'ollama_use_chat')
+        if not is_setting_enabled(settings, 'ollama_streaming'):
+            if use_chat:
+                result = client.chat(model, messages, options=options, timeout=300, cancel_event=cancel_event,
+                                     avoid=avoid_urls)
+            else:
+                result = client.generate(model, prompt, options=options, timeout=300, cancel_event=cancel_event,
+                                         avoid=avoid_urls, system=TRANSLATION_SYSTEM_PROMPT)
         else:
-            raise Exception("No response field in Ollama API result")
-            
-    except requests.exceptions.Timeout:
-        raise Exception("Ollama API request timed out")
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Ollama API request failed: {str(e)}")
+            # One numbered line per cue; completed lines are reported while the rest is still generating
+            assembler = BatchLineAssembler(text.count('\n') + 1, on_line) if on_line else None
+            stream_args = {
+                'options': options,
+                'inactivity_timeout': float(settings.get('ollama_inactivity_timeout', 120)),
+                'on_token': assembler.feed if assembler else None,
+                'cancel_event': cancel_event,
+                'avoid': avoid_urls
+            }
+            try:
+                if use_chat:
+                    result = client.chat_stream(model, messages, **stream_args)
+                else:
+                    result = client.generate_stream(model, prompt, system=TRANSLATION_SYSTEM_PROMPT, **stream_args)
+            except OllamaError as e:
+                if isinstance(e, OllamaCancelled) or not e.partial.strip():
+                    raise
+                # Keep the lines that made it; the missing ones fall back to English
+                log_message(f"Ollama stream ended early ({str(e)}), keeping partial output")
+                result = {'response': e.partial}
+            if assembler:
+                assembler.close()
+        
+        if usage is not None:
+            for key in ('prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration'):
+                if key in result:
+                    usage[key] = result[key]
+        return result['response'].strip()
     except Exception as e:
         raise Exception(f"Ollama translation error: {str(e)}")
 
-def process_srt_file(srt_path, settings):
-    """Process SRT file and translate it to Arabic"""
-    log_message("Starting SRT translation with Ollama...")
+class PromptCacheMeter:
+    """Prompt tokens Ollama served from its KV cache, measured against an uncached baseline
     
-    try:
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            original_content = f.read()
-    except UnicodeDecodeError:
-        # Try with different encodings
-        for encoding in ['latin1', 'cp1252', 'iso-8859-1']:
-            try:
-                with open(srt_path, 'r', encoding=encoding) as f:
-                    original_content = f.read()
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            raise Exception("Could not decode SRT file with any common encoding")
+    Ollama only counts the prompt tokens it actually evaluated. calibrate()
+    sends one request per model whose system prompt starts with a random
+    marker, so no server can have it cached (keep_alive keeps caches warm
+    across batches and processes); its prompt_eval_count over the estimated
+    prompt size calibrates the estimate to the model's tokenizer. A request
+    counts as a cache hit only when Ollama evaluated at least half of the
+    calibrated system prompt fewer tokens than expected (estimate noise stays
+    well below that); the calibrated system prompt is then what it reused.
+    Nothing is reported for a model until it is calibrated.
+    """
     
-    if not original_content.strip():
-        raise Exception("SRT file is empty")
+    CALIBRATION_TEXT = "1: Where are you going?\n2: I'll be right back."
     
-    # Split content into chunks if it's too long
-    max_chunk_size = 2000  # Characters
-    chunks = []
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ratios = {}
     
-    if len(original_content) <= max_chunk_size:
-        chunks = [original_content]
-    else:
-        # Split by subtitle blocks
-        blocks = original_content.split('\n\n')
-        current_chunk = ""
+    def calibrate(self, client, model, use_chat=True):
+        """Measure the tokenizer ratio of model with an uncacheable request (once per model)"""
+        from services.chunk_sizing import estimate_tokens
         
-        for block in blocks:
-            if len(current_chunk + block) <= max_chunk_size:
-                current_chunk += block + '\n\n'
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = block + '\n\n'
+        with self.lock:
+            if model in self.ratios:
+                return
+            system = f"[{uuid.uuid4().hex}]\n{TRANSLATION_SYSTEM_PROMPT}"
+            prompt = build_translation_prompt(self.CALIBRATION_TEXT)
+            options = {'num_predict': 1}
+            try:
+                if use_chat:
+                    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+                    result = client.chat(model, messages, options=options, timeout=120)
+                else:
+                    result = client.generate(model, prompt, options=options, timeout=120, system=system)
+            except Exception as e:
+                log_message(f"Prompt cache calibration skipped: {str(e)}")
+                return
+            evaluated = result.get('prompt_eval_count')
+            if evaluated:
+                self.ratios[model] = evaluated / (estimate_tokens(system) + estimate_tokens(prompt))
+    
+    def measure(self, model, usage, text):
+        """(cached_tokens, seconds_saved) of one request, priced at its own prompt-eval rate"""
+        from services.chunk_sizing import estimate_tokens
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        evaluated = usage.get('prompt_eval_count')
+        duration = usage.get('prompt_eval_duration')
+        ratio = self.ratios.get(model)
+        if not evaluated or not duration or ratio is None:
+            return 0, 0.0
+        system_tokens = estimate_tokens(TRANSLATION_SYSTEM_PROMPT)
+        expected = system_tokens + estimate_tokens(build_translation_prompt(text))
+        prefix = system_tokens * ratio
+        if ratio * expected - evaluated < prefix / 2:
+            return 0, 0.0
+        cached = int(round(prefix))
+        return cached, cached * (duration / 1e9) / evaluated
+
+_prompt_cache_meter = PromptCacheMeter()
+
+def prompt_cache_savings(usage, text, model=None):
+    """(cached_tokens, seconds_saved) for one request (see PromptCacheMeter)"""
+    return _prompt_cache_meter.measure(model, usage, text)
+
+def get_translation_parallelism(settings):
+    """Number of chunks allowed in flight against Ollama at the same time"""
+    try:
+        parallelism = int(settings.get('ollama_parallel_requests', 2))
+    except (TypeError, ValueError):
+        log_message("Invalid ollama_parallel_requests value, using 1")
+        parallelism = 1
+    return max(1, parallelism)
+
+def translate_cue_chunks(cues, settings, on_result=None, on_line=None, metrics=None, chunk_metrics=None,
+                         cancel_token=None):
+    """Translate cues in adaptively sized chunks with bounded concurrency, keeping chunk order
+    
+    Chunks are formed lazily from the token budget of the shared ChunkSizer,
+    so measurements from finished chunks shape the ones still to come.
+    on_result(chunk, translated) is called from the calling thread in chunk
+    order. When streaming, on_line(chunk, number, text) is called from worker
+    threads for every completed line. With translation_hedging enabled, slow
+    chunks are duplicated (see services.hedging). Counters are added to metrics
+    and one record per chunk (tokens, timings, Ollama counters) is appended to
+    chunk_metrics. Once cancel_token is set no new chunk starts, streams in
+    flight are abandoned and JobCancelled is raised; chunks already delivered
+    to on_result are kept.
+    """
+    from services.chunk_sizing import get_chunk_sizer, cue_tokens
+    from services.hedging import get_latency_tracker, run_hedged
+    from services.ollama_client import get_ollama_pool
+    
+    metrics = metrics if metrics is not None else {}
+    tracker = get_latency_tracker(settings) if is_setting_enabled(settings, 'translation_hedging', 'false') else None
+    sizer = get_chunk_sizer(settings, get_ollama_pool(settings))
+    num_ctx = sizer.num_ctx if sizer.explicit_context else None
+    _prompt_cache_meter.calibrate(get_ollama_pool(settings), settings.get('ollama_model', 'llama3'),
+                                  is_setting_enabled(settings, 'ollama_use_chat'))
+    remaining = deque(cues)
+    parallelism = get_translation_parallelism(settings)
+    log_message(f"Translating {len(cues)} lines, chunk budget {sizer.target_tokens} tokens "
+                f"(context {sizer.num_ctx}), {parallelism} parallel requests")
     
-    # Translate each chunk
-    translated_chunks = []
-    for i, chunk in enumerate(chunks):
-        log_message(f"Translating chunk {i+1}/{len(chunks)}...")
+    def translate_one(number, chunk):
+        batch = build_text_batch(chunk)
+        tokens = sum(cue_tokens(cue) for cue in chunk)
+        log_message(f"Translating chunk {number} ({len(chunk)} lines, ~{tokens} tokens)...")
+        
+        def attempt(cancel_event, report_line=None, servers=None):
+            if cancel_token:
+                cancel_event = cancel_token.link(cancel_event or threading.Event())
+            usage = {}
+            translated = translate_with_ollama(batch, settings, on_line=report_line, num_ctx=num_ctx,
+                                               cancel_event=cancel_event, usage=usage, avoid_urls=servers)
+            return translated, usage
+        
+        hedged = hedge_won = False
+        usage = {}
+        started = time.time()
         try:
-            translated_chunk = translate_with_ollama(chunk, settings)
-            translated_chunks.append(translated_chunk)
+            if tracker:
+                # Lines are held per attempt; only the winner's reach on_line, so the
+                # subtitle never mixes lines of two different answers
+                lines = {}
+                servers = []
+                
+                def hedged_attempt(cancel_event, name):
+                    lines[name] = []
+                    report_line = (lambda n, text: lines[name].append((n, text))) if on_line else None
+                    return attempt(cancel_event, report_line, servers)
+                
+                (translated, usage), hedged, hedge_won = run_hedged(hedged_attempt, tracker.hedge_delay(tokens))
+                for line_number, text in lines['hedge' if hedge_won else 'primary']:
+                    on_line(chunk, line_number, text)
+            else:
+                translated, usage = attempt(None, partial(on_line, chunk) if on_line else None)
+            # Truncated output (context overflow or a stalled stream) counts against the budget
+            complete = len(parse_text_batch(translated, len(chunk))) >= len(chunk) * 0.9
         except Exception as e:
-            log_message(f"Failed to translate chunk {i+1}: {str(e)}")
+            if cancel_token:
+                # An abandoned stream must not be kept as an English fallback
+                cancel_token.check()
+            log_message(f"Failed to translate chunk {number}: {str(e)}")
             # Use original chunk if translation fails
-            translated_chunks.append(chunk)
+            translated, complete = batch, False
+        elapsed = time.time() - started
+        sizer.record(tokens, elapsed, complete)
+        if tracker:
+            if complete:
+                tracker.record(tokens, elapsed)
+            if hedged:
+                tracker.note_hedge(hedge_won)
+                log_message(f"Chunk {number} was hedged; {'hedge' if hedge_won else 'original'} request won")
+        cached_tokens, seconds_saved = prompt_cache_savings(usage, batch, settings.get('ollama_model', 'llama3'))
+        counters = {
+            'hedges_fired': int(hedged),
+            'hedges_won': int(hedge_won),
+            'chunks_failed': int(not complete),
+            'prompt_eval_tokens': usage.get('prompt_eval_count', 0),
+            'prompt_eval_seconds': usage.get('prompt_eval_duration', 0) / 1e9,
+            'prompt_cached_tokens': cached_tokens,
+            'prompt_cache_seconds_saved': seconds_saved,
+            'eval_tokens': usage.get('eval_count', 0),
+            'eval_seconds': usage.get('eval_duration', 0) / 1e9
+        }
+        record = {
+            'chunk': number,
+            'lines': len(chunk),
+            'input_tokens': tokens,
+            'seconds': round(elapsed, 3),
+            'complete': complete,
+            'hedged': hedged,
+            'prompt_eval_count': usage.get('prompt_eval_count'),
+            'prompt_eval_duration': usage.get('prompt_eval_duration'),
+            'eval_count': usage.get('eval_count'),
+            'eval_duration': usage.get('eval_duration'),
+            'prompt_cached_tokens': cached_tokens
+        }
+        return translated, counters, record
+    
+    chunks = []
+    results = {}
+    in_flight = {}
+    delivered = 0
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        while remaining or in_flight:
+            if cancel_token and cancel_token.cancelled:
+                remaining.clear()
+            while remaining and len(in_flight) < parallelism:
+                chunk = sizer.take(remaining)
+                chunks.append(chunk)
+                in_flight[executor.submit(translate_one, len(chunks), chunk)] = len(chunks) - 1
+            
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                translated, counters, record = future.result()
+                results[in_flight.pop(future)] = translated
+                for key, value in counters.items():
+                    metrics[key] = metrics.get(key, 0) + value
+                if chunk_metrics is not None:
+                    chunk_metrics.append(record)
+            
+            while delivered in results:
+                if on_result:
+                    on_result(chunks[delivered], results[delivered])
+                del results[delivered]
+                delivered += 1
     
-    # Combine translated chunks
-    final_translation = '\n\n'.join(translated_chunks)
+    if cancel_token:
+        cancel_token.check()
     
-    return final_translation
+    metrics['chunks'] = metrics.get('chunks', 0) + len(chunks)
+    log_message(f"Translated {len(cues)} lines in {len(chunks)} chunks")
+    if metrics.get('prompt_cached_tokens'):
+        log_message(f"Prompt cache reused ~{metrics['prompt_cached_tokens']} tokens, "
+                    f"saving ~{metrics['prompt_cache_seconds_saved']:.1f}s of prompt evaluation")
+    if tracker and metrics.get('hedges_fired'):
+        log_message(f"Hedging fired for {metrics['hedges_fired']} chunks, hedge won {metrics.get('hedges_won', 0)}")
+    return len(chunks)
 
-def main(video_path):
-    """Main processing function"""
-    if not os.path.exists(video_path):
-        log_message(f"Error: Video file does not exist: {video_path}")
-        return False
+def is_setting_enabled(settings, key, default='true'):
+    """Interpret yes/true/1 style setting values"""
+    return str(settings.get(key, default)).lower() in ['true', '1', 'yes']
+
+@contextmanager
+def open_translation_memory(settings):
+    """Yield a TranslationMemory bound to the project database, or None when unavailable"""
+    if not is_setting_enabled(settings, 'translation_memory_enabled'):
+        yield None
+        return
     
-    log_message(f"Starting processing of: {os.path.basename(video_path)}")
+    try:
+        sys.path.append(os.path.dirname(__file__))
+        from utils.worker_db import session_scope
+        from services.translation_memory import TranslationMemory, DEFAULT_MAX_ENTRIES
+        session_context = session_scope()
+        session = session_context.__enter__()
+    except Exception as e:
+        log_message(f"Translation memory not available: {str(e)}")
+        yield None
+        return
     
-    # Get settings
-    settings = get_settings()
-    if not settings:
-        log_message("Warning: Could not load settings, using defaults")
-        settings = {
-            'whisper_model': 'medium.en',
-            'ollama_api_url': 'http://localhost:11434/api/generate',
-            'ollama_model': 'llama3'
-        }
+    memory = TranslationMemory(
+        session,
+        settings.get('ollama_model', 'llama3'),
+        target_language='ar',
+        max_entries=int(settings.get('translation_memory_max_entries', DEFAULT_MAX_ENTRIES))
+    )
+    try:
+        yield memory
+    finally:
+        stats = memory.stats()
+        log_message(f"Translation memory: {stats['hits']} hits, {stats['misses']} misses")
+        session_context.__exit__(None, None, None)
+
+def process_srt_file(srt_path, settings, checkpoint=None, output_path=None, metrics=None, chunk_metrics=None,
+                     cancel_token=None):
+    """Process SRT file and translate it to Arabic
     
-    # Check if Arabic subtitle already exists
-    base_path = os.path.splitext(video_path)[0]
-    arabic_srt_path = f"{base_path}.ar.srt"
+    With a checkpoint, cues translated by an earlier interrupted run are reused
+    and every newly translated chunk is recorded before moving on. With an
+    output_path, cues are appended to a .partial file next to it as they are
+    translated and the file is renamed into place at the end (after
+    cancel_token.confirm()). Translation
+    counters are added to the metrics dict and per-chunk records to the
+    chunk_metrics list when they are given. Setting cancel_token stops at the
+    next chunk boundary with the finished chunks checkpointed.
+    """
+    log_message("Starting SRT translation with Ollama...")
     
-    if os.path.exists(arabic_srt_path):
-        log_message("Arabic subtitle already exists, skipping...")
-        return True
+    original_content = read_srt_file(srt_path)
+    if not original_content.strip():
+        raise Exception("SRT file is empty")
+    
+    cues = parse_srt(original_content)
+    if not cues:
+        raise Exception("SRT file contains no subtitle cues")
     
-    # Create temporary directory for processing
-    with tempfile.TemporaryDirectory() as temp_dir:
-        audio_path = os.path.join(temp_dir, "audio.wav")
+    with open_translation_memory(settings) as memory:
+        # Repeated lines are answered from translation memory before any Ollama call
+        remembered = {}
+        if memory:
+            try:
+                remembered = memory.lookup_many(cue.text for cue in cues)
+            except Exception as e:
+                log_message(f"Translation memory lookup failed: {str(e)}")
         
-        # Step 1: Extract audio
-        if not extract_audio(video_path, audio_path):
-            log_message("Failed to extract audio")
-            return False
+        translated = {cue.index: remembered[cue.text] for cue in cues if cue.text in remembered}
+        if remembered:
+            log_message(f"Translation memory supplied {len(translated)}/{len(cues)} lines")
         
-        # Step 2: Transcribe with Whisper
-        srt_path = transcribe_with_whisper(audio_path, settings)
-        if not srt_path:
-            log_message("Failed to transcribe audio")
-            return False
+        model = settings.get('ollama_model', 'llama3')
+        if checkpoint:
+            resumed = checkpoint.resume_translations(cues, model)
+            if resumed:
+                log_message(f"Resuming from checkpoint: {len(resumed)}/{len(cues)} lines already translated")
+                translated.update(resumed)
+        
+        pending_cues = [cue for cue in cues if cue.index not in translated and cue.text.strip()]
+        if metrics is not None:
+            metrics['lines'] = len(cues)
+            metrics['memory_hits'] = sum(1 for cue in cues if cue.text in remembered)
+            metrics['checkpoint_lines'] = len(translated) - metrics['memory_hits']
+        
+        writer = PartialSubtitleWriter(output_path, cues) if output_path else None
+        if writer:
+            for cue in cues:
+                if cue.index in translated or not cue.text.strip():
+                    writer.resolve(cue.index, translated.get(cue.index, cue.text))
+        
+        streamed = {}
+        
+        def on_line_translated(chunk, number, text):
+            cue = chunk[number - 1]
+            streamed.setdefault(cue.index, text)
+            if writer:
+                writer.resolve(cue.index, text)
+        
+        def on_chunk_translated(chunk, translated_batch):
+            # A failed chunk comes back as its English batch, so it keeps the source text
+            done_cues = []
+            for source, result in zip(chunk, apply_text_batch(chunk, translated_batch)):
+                # Lines already written to the partial file are final
+                text = streamed.get(source.index, result.text)
+                translated[source.index] = text
+                if writer:
+                    writer.resolve(source.index, text)
+                if text != source.text:
+                    done_cues.append((source, text))
+            if checkpoint and done_cues:
+                try:
+                    checkpoint.record_chunk(model, done_cues)
+                except Exception as e:
+                    log_message(f"Checkpoint update failed: {str(e)}")
+            if memory and done_cues:
+                try:
+                    memory.store_many((source.text, text) for source, text in done_cues)
+                except Exception as e:
+                    log_message(f"Translation memory update failed: {str(e)}")
         
-        # Step 3: Translate SRT to Arabic
+        # Only dialogue text goes to the model; timings are rebuilt locally
         try:
-            arabic_content = process_srt_file(srt_path, settings)
-            
-            # Save Arabic subtitle
-            with open(arabic_srt_path, 'w', encoding='utf-8') as f:
-                f.write(arabic_content)
-            
-            log_message(f"Successfully created Arabic subtitle: {os.path.basename(arabic_srt_path)}")
-            
-            # Update translation status in database
-            update_translation_status(video_path, translated=True)
-            
-            return True
-            
+            if pending_cues:
+                translate_cue_chunks(pending_cues, settings, on_result=on_chunk_translated,
+                                     on_line=on_line_translated, metrics=metrics, chunk_metrics=chunk_metrics,
+                                     cancel_token=cancel_token)
+        except BaseException:
+            if writer:
+                writer.abort()
+            raise
+    
+    if writer:
+        try:
+            if cancel_token:
+                cancel_token.confirm()
+        except BaseException:
+            writer.abort()
+            raise
+        writer.finalize()
+        log_message(f"Subtitle written incrementally to {os.path.basename(output_path)}")
+    
+    return compose_srt([cue.copy(translated.get(cue.index, cue.text)) for cue in cues])
+
+# Language-ID results below this confidence are ignored (the file is treated as English)
+LANGUAGE_ID_MIN_CONFIDENCE = 0.6
+
+DEFAULT_SETTINGS = {
+    'whisper_model': 'medium.en',
+    'ollama_api_url': 'http://localhost:11434/api/generate',
+    'ollama_model': 'llama3'
+}
+
+class FileJob(PipelineJob):
+    """State of one video as it moves through the processing stages"""
+    
+    def __init__(self, video_path, settings):
+        super().__init__()
+        self.video_path = video_path
+        # Path of the video in the library database; differs from video_path on a
+        # worker host that mounts the library elsewhere (see utils.path_mapping)
+        self.library_path = video_path
+        self.settings = settings
+        self.arabic_srt_path = f"{os.path.splitext(video_path)[0]}.ar.srt"
+        self.media_info = {}
+        self.temp_dir = None
+        self.audio_path = None
+        self.srt_path = None
+        self.arabic_content = None
+        self.subtitle_written = False
+        self.checkpoint = None
+        # Where the English text came from: whisper, checkpoint, sidecar or embedded
+        self.source_kind = None
+        self.segmented = False
+        # Audio stream chosen for transcription (None: ffmpeg's default) and its language
+        self.audio_stream = None
+        self.audio_language = None
+        self.started_at = time.time()
+        # translation_jobs row when the job was claimed from the queue
+        self.queue_job_id = None
+        # Lease owner of that row (only the holder may write to it)
+        self.queue_owner = None
+        # One record per translated chunk (see translate_cue_chunks)
+        self.chunk_metrics = []
+    
+    def cleanup(self):
+        if self.temp_dir and os.path.isdir(self.temp_dir):
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+        self.temp_dir = None
+
+def probe_media(video_path):
+    """Read container/stream information with ffprobe (empty dict when unavailable)"""
+    cmd = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', video_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        if result.returncode != 0:
+            raise Exception(result.stderr.strip())
+        return json.loads(result.stdout or '{}')
+    except Exception as e:
+        log_message(f"ffprobe failed for {os.path.basename(video_path)}: {str(e)}")
+        return {}
+
+def stage_probe(job):
+    """Stage 1: validate the input and skip files that are already translated"""
+    if not os.path.exists(job.video_path):
+        log_message(f"Error: Video file does not exist: {job.video_path}")
+        job.fail("Video file does not exist")
+        return
+    
+    log_message(f"Starting processing of: {os.path.basename(job.video_path)}")
+    
+    if os.path.exists(job.arabic_srt_path):
+        log_message("Arabic subtitle already exists, skipping...")
+        job.finish(True)
+        return
+    
+    job.media_info = probe_media(job.video_path)
+    
+    if is_setting_enabled(job.settings, 'translation_checkpoints'):
+        try:
+            from services.checkpoints import TranslationCheckpoint
+            job.checkpoint = TranslationCheckpoint(job.video_path, job.settings.get('checkpoint_dir') or None)
         except Exception as e:
-            log_message(f"Failed to translate subtitles: {str(e)}")
-            # Update status to indicate failure
-            update_translation_status(video_path, translated=False)
-            return False
+            log_message(f"Checkpoints not available: {str(e)}")
+
+def stage_discover_source(job):
+    """Stage 2: reuse existing English subtitle text instead of transcribing"""
+    from utils import subtitle_sources
+    
+    if is_setting_enabled(job.settings, 'skip_embedded_arabic') and subtitle_sources.has_embedded_arabic(job.media_info):
+        log_message("Video already carries an embedded Arabic subtitle track, skipping...")
+        try:
+            from utils.worker_db import mark_media_has_subtitles
+            mark_media_has_subtitles(job.library_path)
+        except Exception as e:
+            log_message(f"Error updating database: {str(e)}")
+        job.finish(True)
+        return
+    
+    if job.checkpoint and job.checkpoint.has_source():
+        # The transcript of an interrupted run survives; no audio work needed
+        log_message("Reusing transcript from checkpoint")
+        job.srt_path = job.checkpoint.source_path
+        job.source_kind = 'checkpoint'
+        return
+    
+    if not is_setting_enabled(job.settings, 'reuse_source_subtitles'):
+        return
+    
+    sidecar = subtitle_sources.find_english_sidecar(job.video_path)
+    if sidecar:
+        log_message(f"Using English subtitle {os.path.basename(sidecar)} instead of transcribing")
+        job.srt_path = sidecar
+        job.source_kind = 'sidecar'
+        return
+    
+    stream = subtitle_sources.pick_english_text_stream(job.media_info)
+    if stream:
+        job.temp_dir = tempfile.mkdtemp(prefix="ai-translator-")
+        srt_path = os.path.join(job.temp_dir, "embedded.en.srt")
+        if subtitle_sources.extract_subtitle_stream(job.video_path, stream['index'], srt_path) and \
+                parse_srt(read_srt_file(srt_path)):
+            log_message(f"Using embedded English subtitle stream #{stream['index']} ({stream.get('codec_name')}) "
+                        "instead of transcribing")
+            job.srt_path = srt_path
+            job.source_kind = 'embedded'
+        else:
+            log_message(f"Could not extract embedded subtitle stream #{stream['index']}, transcribing instead")
+
+def stage_select_audio(job):
+    """Stage 3: pick the English audio track and skip files whose dialogue is not English
+    
+    Stream language tags decide first. Untagged audio is identified from short
+    samples (only when it is going to be transcribed); the result is stored on
+    the media file so the probe runs once per file.
+    """
+    from utils import audio_tracks
+    
+    job.audio_stream, language = audio_tracks.pick_audio_stream(job.media_info)
+    if job.media_info and job.audio_stream is None and not job.srt_path:
+        job.fail("Video has no audio stream")
+        return
+    
+    if language is None and not job.srt_path:
+        language = identify_audio_language(job)
+    job.audio_language = language
+    
+    if language in (None, 'en'):
+        if job.audio_stream and len(audio_tracks.audio_streams(job.media_info)) > 1:
+            log_message(f"Using audio stream #{job.audio_stream['index']} ({language or 'untagged'})")
+        return
+    
+    action = job.settings.get('audio_non_english_action', 'skip')
+    if language == 'ar':
+        log_message("Audio is already Arabic, skipping...")
+        job.finish(True)
+    elif action == 'transcribe':
+        log_message(f"Audio language is '{language}', transcribing anyway")
+    elif action == 'flag':
+        log_message(f"Audio language is '{language}', flagged for review")
+        job.fail(f"Audio language is '{language}' (flagged for review)")
+    else:
+        log_message(f"Audio language is '{language}', skipping...")
+        job.finish(True)
+
+def identify_audio_language(job):
+    """Language of the untagged audio stream from the media file record or a language-ID probe"""
+    if not is_setting_enabled(job.settings, 'audio_language_detection'):
+        return None
+    
+    from utils.worker_db import get_media_audio_language, set_media_audio_language
+    try:
+        language = get_media_audio_language(job.library_path)
+        if language:
+            return language
+    except Exception as e:
+        log_message(f"Error reading database: {str(e)}")
+    
+    try:
+        from services.whisper_engine import detect_spoken_language
+        from utils.audio_tracks import identify_language
+        
+        started = time.time()
+        duration = (job.media_info.get('format') or {}).get('duration')
+        language, confidence = identify_language(job.video_path, job.audio_stream, duration,
+                                                 lambda samples: detect_spoken_language(samples, job.settings))
+        job.metrics['language_id_seconds'] = round(time.time() - started, 2)
+    except Exception as e:
+        log_message(f"Audio language identification failed: {str(e)}")
+        return None
+    
+    if language is None or confidence < LANGUAGE_ID_MIN_CONFIDENCE:
+        log_message(f"Audio language unclear ({language or 'no speech'}, {confidence:.0%}), assuming English")
+        return None
+    
+    log_message(f"Identified audio language: {language} ({confidence:.0%})")
+    try:
+        set_media_audio_language(job.library_path, language)
+    except Exception as e:
+        log_message(f"Error updating database: {str(e)}")
+    return language
+
+def stage_extract_audio(job):
+    """Stage 4: extract audio to a WAV file, unless audio will be streamed into Whisper"""
+    if job.srt_path:
+        return
+    
+    job.source_kind = 'whisper'
+    job.temp_dir = job.temp_dir or tempfile.mkdtemp(prefix="ai-translator-")
+    
+    try:
+        from services.segmented_transcription import should_segment
+        duration = float((job.media_info.get('format') or {}).get('duration') or 0) or None
+        job.segmented = should_segment(job.settings, duration)
+    except Exception as e:
+        log_message(f"Segmented transcription not available: {str(e)}")
+    
+    # Segmented transcription works on a WAV file, so it never streams
+    if not job.segmented and is_setting_enabled(job.settings, 'audio_streaming') and \
+            job.settings.get('whisper_engine', 'auto') != 'cli':
+        # Extraction happens inside the transcribe stage, overlapped with recognition
+        return
+    
+    job.audio_path = os.path.join(job.temp_dir, "audio.wav")
+    if not extract_audio(job.video_path, job.audio_path, job.audio_stream, job.cancel_token):
+        log_message("Failed to extract audio")
+        job.fail("Failed to extract audio")
+
+@contextmanager
+def transcription_device(job):
+    """Hold a Whisper device for the job (services.device_scheduler); yields the settings to transcribe with
+    
+    The job waits until its model fits on a GPU, or on the CPU when every GPU
+    is saturated. Segmented jobs run their own process pool, so they take the
+    whole CPU device; when that pool does not fit, the job is transcribed
+    unsegmented. A model that fits on no device fails the stage.
+    """
+    if not is_setting_enabled(job.settings, 'whisper_device_scheduler'):
+        yield job.settings
+        return
+    
+    try:
+        from services.device_scheduler import (get_device_scheduler, allowed_devices, model_memory_mb,
+                                               DeviceUnavailable)
+        from services.segmented_transcription import resolve_process_count
+    except ImportError as e:
+        log_message(f"Device scheduling not available ({str(e)}), using whisper_gpu_id as configured")
+        yield job.settings
+        return
+    
+    scheduler = get_device_scheduler(job.settings)
+    model = job.settings.get('whisper_model', 'medium.en')
+    need_mb = model_memory_mb(model, job.settings)
+    placement = None
+    if job.segmented:
+        try:
+            placement = scheduler.acquire(model, need_mb * resolve_process_count(job.settings), allowed=['cpu'],
+                                          exclusive=True, cancel_event=job.cancel_token.event)
+        except DeviceUnavailable as e:
+            job.cancel_token.check()
+            log_message(f"Segmented transcription does not fit ({str(e)}), transcribing in one piece")
+            job.segmented = False
+    if placement is None:
+        try:
+            placement = scheduler.acquire(model, need_mb, allowed=allowed_devices(job.settings),
+                                          cancel_event=job.cancel_token.event)
+        except DeviceUnavailable:
+            job.cancel_token.check()
+            raise
+    
+    device = placement.device
+    log_message(f"Transcribing on {device.name}" +
+                (f" after waiting {placement.waited:.1f}s" if placement.waited >= 1 else ""))
+    job.metrics['transcribe_device'] = device.name
+    job.metrics['device_wait_seconds'] = round(placement.waited, 3)
+    try:
+        yield dict(job.settings, whisper_gpu_id=device.gpu_id)
+    finally:
+        scheduler.release(placement)
+
+def warm_up_transcription(settings):
+    """Start loading the Whisper model before the first file needs it
+    
+    With whisper_device_scheduler the model is loaded on the device the
+    scheduler picks, so it is counted there and the first job reuses it.
+    The warm-up is skipped when no device is free right now.
+    """
+    from services.whisper_engine import get_transcription_worker
+    if not is_setting_enabled(settings, 'whisper_device_scheduler'):
+        get_transcription_worker(settings)
+        return
+    
+    from services.device_scheduler import get_device_scheduler, allowed_devices, model_memory_mb, DeviceUnavailable
+    model = settings.get('whisper_model', 'medium.en')
+    try:
+        with get_device_scheduler(settings).reserve(model, need_mb=model_memory_mb(model, settings),
+                                                    allowed=allowed_devices(settings), timeout=0) as placement:
+            get_transcription_worker(dict(settings, whisper_gpu_id=placement.device.gpu_id))
+            log_message(f"Loading Whisper model {model} on {placement.device.name}")
+    except DeviceUnavailable as e:
+        log_message(f"Whisper warm-up skipped: {str(e)}")
+
+def stage_transcribe(job):
+    """Stage 5: produce the English SRT"""
+    if job.srt_path:
+        return
+    
+    with transcription_device(job) as settings:
+        transcribe_job(job, settings)
+    
+    if job.done:
+        return
+    if not job.srt_path:
+        log_message("Failed to transcribe audio")
+        job.fail("Failed to transcribe audio")
+    elif job.checkpoint:
+        try:
+            job.srt_path = job.checkpoint.save_source(job.srt_path)
+        except Exception as e:
+            log_message(f"Could not checkpoint transcript: {str(e)}")
+
+def transcribe_job(job, settings):
+    """Streamed transcription, falling back to a WAV on disk; sets job.srt_path on success"""
+    if not job.audio_path:
+        job.srt_path = transcribe_video_stream(job.video_path, job.temp_dir, settings, job.metrics,
+                                               job.audio_stream, job.cancel_token)
+        if not job.srt_path:
+            # Fall back to the WAV-on-disk path
+            job.audio_path = os.path.join(job.temp_dir, "audio.wav")
+            if not extract_audio(job.video_path, job.audio_path, job.audio_stream, job.cancel_token):
+                log_message("Failed to extract audio")
+                job.fail("Failed to extract audio")
+                return
+    
+    if not job.srt_path:
+        job.srt_path = transcribe_with_whisper(job.audio_path, settings, job.metrics, segmented=job.segmented,
+                                               cancel_token=job.cancel_token)
+
+def stage_translate(job):
+    """Stage 6: translate the English SRT to Arabic"""
+    # When streaming, the subtitle is built up in a .partial file next to <name>.ar.srt while translating
+    output_path = job.arabic_srt_path if is_setting_enabled(job.settings, 'ollama_streaming') else None
+    try:
+        job.arabic_content = process_srt_file(job.srt_path, job.settings, checkpoint=job.checkpoint,
+                                              output_path=output_path, metrics=job.metrics,
+                                              chunk_metrics=job.chunk_metrics, cancel_token=job.cancel_token)
+        job.subtitle_written = output_path is not None
+    except Exception as e:
+        log_message(f"Failed to translate subtitles: {str(e)}")
+        # Update status to indicate failure
+        update_translation_status(job.library_path, translated=False)
+        job.fail(e)
+
+def stage_write_subtitle(job):
+    """Stage 7: save the Arabic subtitle next to the video"""
+    if not job.subtitle_written:
+        # Only a job that is still ours may replace the subtitle
+        job.cancel_token.confirm()
+        temp_path = partial_path_for(job.arabic_srt_path)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(job.arabic_content)
+        os.replace(temp_path, job.arabic_srt_path)
+    log_message(f"Successfully created Arabic subtitle: {os.path.basename(job.arabic_srt_path)}")
+    if job.checkpoint:
+        job.checkpoint.clear()
+    job.cleanup()
+
+def stage_update_db(job):
+    """Stage 8: mark the media file as translated"""
+    update_translation_status(job.library_path, translated=True)
+
+FILE_STAGES = [
+    ('probe', stage_probe),
+    ('discover_source', stage_discover_source),
+    ('select_audio', stage_select_audio),
+    ('extract_audio', stage_extract_audio),
+    ('transcribe', stage_transcribe),
+    ('translate', stage_translate),
+    ('write_subtitle', stage_write_subtitle),
+    ('update_db', stage_update_db),
+]
+
+# Default (workers, queue depth) per stage; override with pipeline_<stage>_workers / pipeline_<stage>_queue
+STAGE_DEFAULTS = {
+    'probe': (1, 4),
+    'discover_source': (1, 4),
+    'select_audio': (1, 2),
+    'extract_audio': (1, 1),
+    'transcribe': (1, 1),
+    'translate': (1, 2),
+    'write_subtitle': (1, 4),
+    'update_db': (1, 8),
+}
+
+def build_pipeline(settings, on_finished=None, on_stage=None):
+    """Create a PipelineEngine over FILE_STAGES using the per-stage settings"""
+    stages = []
+    for name, handler in FILE_STAGES:
+        default_workers, default_queue = STAGE_DEFAULTS[name]
+        try:
+            workers = int(settings.get(f'pipeline_{name}_workers', default_workers))
+            queue_size = int(settings.get(f'pipeline_{name}_queue', default_queue))
+        except (TypeError, ValueError):
+            log_message(f"Invalid pipeline settings for stage {name}, using defaults")
+            workers, queue_size = default_workers, default_queue
+        stages.append(PipelineStage(name, handler, workers, queue_size))
+    return PipelineEngine(stages, on_finished=on_finished, on_stage=on_stage)
+
+def load_settings():
+    """Get settings, falling back to defaults when the database is unavailable"""
+    settings = get_settings()
+    if not settings:
+        log_message("Warning: Could not load settings, using defaults")
+        settings = dict(DEFAULT_SETTINGS)
+    return settings
+
+def record_job_metrics(job):
+    """Persist stage timings and translation counters of a finished job (TranslationJob/TranslationHistory)"""
+    try:
+        from services.job_metrics import build_job_report, save_job_report
+        from utils.worker_db import session_scope
+        
+        report = build_job_report(job)
+        with session_scope() as session:
+            job_id = save_job_report(session, report, job.settings, job.queue_job_id, job.queue_owner)
+        summary = ', '.join(f"{name} {seconds:.1f}s" for name, seconds in report['stage_times'].items())
+        log_message(f"Job metrics{f' #{job_id}' if job_id else ''}: {summary}")
+        return job_id
+    except Exception as e:
+        log_message(f"Could not record job metrics: {str(e)}")
+        return None
+
+def run_file_job(job, on_stage=None):
+    """Run one FileJob through every stage in order (no overlap)
+    
+    on_stage(job, number, name) is called before each stage. Setting
+    job.cancel_token stops the job at the next stage boundary (or sooner,
+    see services.cancellation).
+    """
+    try:
+        for number, (name, handler) in enumerate(FILE_STAGES):
+            if on_stage:
+                on_stage(job, number, name)
+            job.current_stage = name
+            started = time.time()
+            try:
+                job.cancel_token.check()
+                handler(job)
+            except JobCancelled as e:
+                log_message(f"{str(e)} during stage {name}; completed work is kept")
+                job.cancel(e.action)
+            except Exception as e:
+                log_message(f"Stage {name} failed: {str(e)}")
+                job.fail(e)
+            job.stage_times[name] = time.time() - started
+            if job.done:
+                break
+        else:
+            job.finish(True)
+        record_job_metrics(job)
+    finally:
+        job.cleanup()
+    return job.success
+
+def main(video_path):
+    """Main processing function"""
+    return run_file_job(FileJob(video_path, load_settings()))
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
@@ -1,4 +1,5 @@
-from flask import Blueprint, jsonify, request, redirect, url_for
+import json
+from flask import Blueprint, jsonify, request, redirect, url_for, Response
 from models import db, Log, Notification
 from utils.auth import is_authenticated, get_user_language
 from routes.notifications_routes import create_notification
@@ -253,6 +254,59 @@ def api_database_cleanup():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@database_bp.route('/api/translation-memory/stats')
+def api_translation_memory_stats():
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    try:
+        from services.translation_memory import get_memory_summary
+        return jsonify(get_memory_summary(db.session))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@database_bp.route('/api/translation-memory/export')
+def api_translation_memory_export():
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    try:
+        from services.translation_memory import export_entries
+        entries = export_entries(db.session, request.args.get('model'))
+        content = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+        filename = f"translation_memory_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        return Response(
+            content,
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@database_bp.route('/api/translation-memory/import', methods=['POST'])
+def api_translation_memory_import():
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    try:
+        from services.translation_memory import import_entries
+        
+        # Accept either an uploaded JSON Lines export or a JSON body with "entries"
+        if 'file' in request.files:
+            lines = request.files['file'].read().decode('utf-8').splitlines()
+            entries = [json.loads(line) for line in lines if line.strip()]
+            overwrite = request.form.get('overwrite', 'false').lower() == 'true'
+        else:
+            data = request.get_json() or {}
+            entries = data.get('entries', [])
+            overwrite = bool(data.get('overwrite', False))
+        
+        result = import_entries(db.session, entries, overwrite=overwrite)
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @database_bp.route('/action/scan_translation_status')
 def action_scan_translation_status():
     if not is_authenticated():
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+مسارات API لمهام الترجمة وقياسات أدائها
+Translation job and job metrics routes
+"""
+
+import logging
+from flask import Blueprint, jsonify, request
+from utils.auth import is_authenticated, get_user_language
+from models import TranslationJob, db
+from services.job_metrics import load_job_metrics, summarize_jobs
+from services.job_queue import job_payload, queue_status, request_control, set_priority
+from translations import get_translation
+from services.worker_nodes import DEFAULT_OFFLINE_SECONDS, list_workers
+
+logger = logging.getLogger(__name__)
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Message for the status a control request leads to ('processing': the worker stops it shortly)
+CONTROL_MESSAGES = {
+    'processing': 'job_cancel_requested',
+    'paused': 'job_paused',
+    'cancelled': 'job_cancelled',
+    'pending': 'job_resumed',
+}
+
+def job_to_dict(job, include_chunks=False):
+    data = load_job_metrics(job)
+    result = {
+        'id': job.id,
+        'media_file_id': job.media_file_id,
+        'path': job.media_file.path if job.media_file else None,
+        'title': job.media_file.title if job.media_file else None,
+        'task_type': job.task_type,
+        'args': job_payload(job).get('args', []),
+        'status': job.status,
+        'progress': job.progress,
+        'priority': job.priority,
+        'attempts': job.attempts,
+        'lease_owner': job.lease_owner,
+        'control': job.control,
+        'worker': job.worker,
+        'error_message': job.error_message,
+        'whisper_model': job.whisper_model,
+        'ollama_model': job.ollama_model,
+        'audio_duration': job.audio_duration,
+        'processing_time': job.processing_time,
+        'source_kind': data.get('source_kind'),
+        'stage_times': data.get('stage_times', {}),
+        'metrics': data.get('metrics', {}),
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'completed_at': job.completed_at.isoformat() if job.completed_at else None
+    }
+    if include_chunks:
+        result['chunks'] = data.get('chunks', [])
+    return result
+
+@jobs_bp.route('/api/jobs')
+def api_jobs():
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 50, type=int), 500)
+    status = request.args.get('status', 'all', type=str)
+    task_type = request.args.get('task_type', 'all', type=str)
+
+    query = TranslationJob.query
+    if status != 'all':
+        query = query.filter(TranslationJob.status == status)
+    if task_type != 'all':
+        query = query.filter(TranslationJob.task_type == task_type)
+    pagination = query.order_by(TranslationJob.created_at.desc()).paginate(page=page, per_page=per_page,
+                                                                           error_out=False)
+
+    return jsonify({
+        'jobs': [job_to_dict(job) for job in pagination.items],
+        'pagination': {
+            'page': pagination.page,
+            'pages': pagination.pages,
+            'total': pagination.total,
+            'per_page': pagination.per_page,
+            'has_prev': pagination.has_prev,
+            'has_next': pagination.has_next
+        }
+    })
+
+@jobs_bp.route('/api/jobs/queue')
+def api_jobs_queue():
+    """Queued and running jobs per task class"""
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+    return jsonify(queue_status(db.session))
+
+@jobs_bp.route('/api/jobs/<int:job_id>')
+def api_job_detail(job_id):
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+
+    job = db.session.get(TranslationJob, job_id)
+    if job is None:
+        return jsonify({'error': 'المهمة غير موجودة'}), 404
+    return jsonify(job_to_dict(job, include_chunks=True))
+
+@jobs_bp.route('/api/jobs/<int:job_id>/priority', methods=['POST'])
+def api_job_priority(job_id):
+    """Change the priority of a pending job (higher runs sooner)"""
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+
+    try:
+        priority = int((request.get_json(silent=True) or {}).get('priority'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'قيمة الأولوية غير صالحة'}), 400
+
+    if not set_priority(db.session, job_id, priority):
+        return jsonify({'error': 'المهمة غير موجودة أو بدأت بالفعل'}), 404
+    return jsonify({'success': True, 'id': job_id, 'priority': priority})
+
+@jobs_bp.route('/api/jobs/<int:job_id>/<any(cancel, pause, resume):action>', methods=['POST'])
+def api_job_control(job_id, action):
+    """Cancel, pause or resume one job; a running file stops at its next stage or chunk boundary"""
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+
+    lang = get_user_language()
+    status = request_control(db.session, job_id, action)
+    if status is None:
+        return jsonify({'error': get_translation('job_control_not_applicable', lang)}), 409
+    if status == 'pending':
+        from routes.media_processing_routes import ensure_worker_running
+        ensure_worker_running()
+    return jsonify({'success': True, 'id': job_id, 'action': action, 'status': status,
+                    'message': get_translation(CONTROL_MESSAGES[status], lang)})
+
+@jobs_bp.route('/api/jobs/metrics/summary')
+def api_jobs_metrics_summary():
+    """Where time goes across the most recent jobs (?limit=1000&status=completed)"""
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+
+    limit = min(request.args.get('limit', 1000, type=int), 20000)
+    status = request.args.get('status', 'all', type=str)
+
+    query = TranslationJob.query.filter(TranslationJob.metrics.isnot(None))
+    if status != 'all':
+        query = query.filter(TranslationJob.status == status)
+    jobs = query.order_by(TranslationJob.created_at.desc()).limit(limit).all()
+
+    return jsonify(summarize_jobs(jobs))
+
+@jobs_bp.route('/api/workers')
+def api_workers():
+    """Job workers on every host: state, current jobs and throughput (?window_hours=1)"""
+    if not is_authenticated():
+        return jsonify({'error': 'غير مصرح'}), 401
+
+    window_hours = min(max(request.args.get('window_hours', 1.0, type=float), 0.1), 168.0)
+    workers = list_workers(db.session, DEFAULT_OFFLINE_SECONDS, window_hours)
+    return jsonify({
+        'workers': workers,
+        'online': sum(1 for worker in workers if worker['status'] == 'running'),
+        'jobs_per_hour': round(sum(worker['throughput']['jobs_per_hour'] for worker in workers), 2)
+    })
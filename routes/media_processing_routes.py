@@ -122,29 +122,63 @@ def get_current_status():
         'task': ''
     }
 
+def is_worker_cmdline(cmdline):
+    """Whether a process command line is the job worker daemon (job_worker.py or background_tasks.py worker)"""
+    if any(arg.endswith('job_worker.py') for arg in cmdline):
+        return True
+    return 'worker' in cmdline and any(arg.endswith('background_tasks.py') for arg in cmdline)
+
 def is_task_running():
-    """Check if any background task is running"""
+    """Check if any background task is running (a queued job in progress or a legacy task process)"""
+    try:
+        from models import TranslationJob
+        if TranslationJob.query.filter_by(status='processing').first():
+            return True
+    except:
+        pass
     try:
         for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
             cmdline = proc.info['cmdline']
-            if cmdline and any('background_tasks.py' in arg for arg in cmdline):
+            # An idle worker daemon is not a running task
+            if cmdline and any('background_tasks.py' in arg for arg in cmdline) and not is_worker_cmdline(cmdline):
                 return True
     except:
         pass
     return False
 
-def run_background_task(task_name, *args):
-    """Run a background task"""
-    if is_task_running():
-        return False, "مهمة أخرى قيد التشغيل حالياً"
-    
+def is_worker_running():
+    """Check if the job worker daemon is running on this host"""
+    try:
+        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+            cmdline = proc.info['cmdline']
+            if cmdline and is_worker_cmdline(cmdline):
+                return True
+    except:
+        pass
+    return False
+
+def ensure_worker_running():
+    """Start the job worker daemon unless it is already running"""
+    from utils.settings import get_setting
+    if str(get_setting('worker_autostart', 'true')).lower() not in ['true', '1', 'yes'] or is_worker_running():
+        return
+    cmd = [sys.executable, 'job_worker.py']
+    subprocess.Popen(cmd, cwd=PROJECT_DIR, start_new_session=True)
+    log_to_db("INFO", "Started job worker daemon")
+
+def run_background_task(task_name, *args, priority=0):
+    """Queue a background task for the job worker (tasks of different classes run concurrently)"""
     try:
-        cmd = [sys.executable, 'background_tasks.py', task_name] + list(args)
-        subprocess.Popen(cmd, cwd=PROJECT_DIR)
-        log_to_db("INFO", f"Started background task: {task_name}")
-        return True, f"تم بدء المهمة: {task_name}"
+        from services.job_queue import enqueue_task
+        job, created = enqueue_task(db.session, task_name, list(args), priority=priority)
+        ensure_worker_running()
+        if not created:
+            return True, f"المهمة موجودة بالفعل في قائمة الانتظار: {task_name}"
+        log_to_db("INFO", f"Queued background task: {task_name} (job {job.id})")
+        return True, f"تمت إضافة المهمة إلى قائمة الانتظار: {task_name}"
     except Exception as e:
-        log_to_db("ERROR", f"Failed to start task: {task_name}", str(e))
+        db.session.rollback()
+        log_to_db("ERROR", f"Failed to queue task: {task_name}", str(e))
         return False, f"فشل في بدء المهمة: {str(e)}"
 
 # مسارات API المتعلقة بمعالجة الوسائط
@@ -462,10 +462,14 @@ def action_single_translate():
     if not path:
         return jsonify({"status": "error", "message": "No path provided"}), 400
     
-    # هنا يمكنك استدعاء الدالة المناسبة لبدء الترجمة
-    # على سبيل المثال: success = run_background_task("single_file_translate_task", path)
-    
-    return jsonify({"status": "success"})
+    # "Translate now" goes to the fast lane and starts at the next file boundary
+    from routes.media_processing_routes import run_background_task
+    from services.scheduling import FAST_LANE_PRIORITY
+    success, message = run_background_task("single_file_translate_task", path, priority=FAST_LANE_PRIORITY)
+    if not success:
+        return jsonify({"status": "error", "message": message}), 500
+    
+    return jsonify({"status": "success", "message": message})
 
 @media_bp.route('/action/single-delete', methods=['POST'])
 def action_single_delete():
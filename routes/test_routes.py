@@ -7,6 +7,7 @@ import logging
 import requests
 from flask import Blueprint, jsonify, request
 from utils.auth import is_authenticated, is_authenticated_with_token
+from utils.settings import get_setting
 
 logger = logging.getLogger(__name__)
 
@@ -19,21 +20,15 @@ def api_test_ollama():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        import requests
-        response = requests.get('http://localhost:11434/api/tags', timeout=5)
+        from services.ollama_client import get_ollama_client
+        client = get_ollama_client(get_setting('ollama_api_url') or get_setting('ollama_url', 'http://localhost:11434'))
+        models = client.list_models(force=True)
         
-        if response.status_code == 200:
-            models = response.json().get('models', [])
-            return jsonify({
-                'success': True,
-                'message': f'Ollama connection successful. Found {len(models)} models.',
-                'models': [model.get('name', 'unknown') for model in models]
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': f'Ollama connection failed. Status code: {response.status_code}'
-            })
+        return jsonify({
+            'success': True,
+            'message': f'Ollama connection successful. Found {len(models)} models.',
+            'models': [model.get('name', 'unknown') for model in models]
+        })
     except Exception as e:
         return jsonify({
             'success': False,
@@ -0,0 +1,146 @@
+"""
+Job Cancellation for AI Translator
+إلغاء وإيقاف مهمة واحدة دون إيقاف بقية المهام
+
+A CancelToken belongs to one job. Cancelling or pausing it sets the token;
+the job notices at its next stage or chunk boundary and raises JobCancelled.
+Child processes registered with the token (ffmpeg, the whisper CLI, the
+segmented transcription pool) are terminated right away, and events linked to
+it (in-flight Ollama streams) are set, so the job stops without waiting for
+a long step to end. Work that was already checkpointed is kept.
+"""
+
+import logging
+import subprocess
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds a terminated child gets before it is killed
+TERMINATE_GRACE_SECONDS = 5
+
+class JobCancelled(BaseException):
+    """The job was cancelled or paused (action is 'cancel' or 'pause')
+
+    A BaseException, like KeyboardInterrupt, so the broad "except Exception"
+    fallbacks inside the stages do not mistake it for a failure and retry
+    another way.
+    """
+
+    def __init__(self, action: str = 'cancel'):
+        super().__init__(f"Job {'paused' if action == 'pause' else 'cancelled'}")
+        self.action = action
+
+class CancelToken:
+    """Cooperative cancellation shared by a job's stages, threads and child processes
+
+    verify, when set, is asked before the job publishes its output (confirm)
+    and returns False when the job is no longer ours to finish, e.g. its
+    queue lease was lost to another worker.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.action = None
+        self.verify: Optional[Callable[[], bool]] = None
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def request(self, action: str = 'cancel') -> bool:
+        """Cancel or pause the job; False when it was already stopping"""
+        with self._lock:
+            if self.event.is_set():
+                return False
+            self.action = action
+            self.event.set()
+            processes = list(self._processes)
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancel callback failed: {e}")
+        for process in processes:
+            _terminate(process)
+        return True
+
+    def check(self):
+        """Raise JobCancelled once the token is set (call at stage and chunk boundaries)"""
+        if self.event.is_set():
+            raise JobCancelled(self.action)
+
+    def confirm(self):
+        """check(), then cancel the job unless verify still allows it to publish its output"""
+        self.check()
+        if self.verify is not None and not self.verify():
+            self.request('cancel')
+            self.check()
+
+    def on_cancel(self, callback: Callable):
+        """Run callback when the token is set (immediately if it already is)"""
+        with self._lock:
+            if not self.event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def link(self, event: threading.Event) -> threading.Event:
+        """Set event together with the token (for APIs that take a cancel_event)"""
+        self.on_cancel(event.set)
+        return event
+
+    def guard(self, blocks: Iterable) -> Iterable:
+        """Pass blocks through until the token is set, then end the stream"""
+        for block in blocks:
+            if self.event.is_set():
+                return
+            yield block
+
+    @contextmanager
+    def child(self, process: subprocess.Popen):
+        """Terminate process if the token is set while the with block runs"""
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self.event.is_set()
+        if cancelled:
+            _terminate(process)
+        try:
+            yield process
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+
+def _terminate(process):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=TERMINATE_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def run_child(cmd, cancel_token: Optional[CancelToken] = None, timeout: Optional[float] = None,
+              **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run with output captured as text, terminated when cancel_token is set
+
+    Raises JobCancelled when the child was stopped by the token, and
+    subprocess.TimeoutExpired like subprocess.run.
+    """
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **kwargs)
+    with cancel_token.child(process) if cancel_token else nullcontext():
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+    if cancel_token:
+        cancel_token.check()
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
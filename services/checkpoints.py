@@ -0,0 +1,136 @@
+"""
+Translation Checkpoints for AI Translator
+نقاط الاستئناف لمهام الترجمة
+
+Keeps the English transcript and every translated cue of a file on disk, keyed
+by the file's identity, so an interrupted job resumes from the first
+untranslated chunk instead of starting over.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CHECKPOINT_DIR = os.path.join(PROJECT_DIR, "checkpoints")
+
+def file_identity_key(video_path: str) -> str:
+    """Stable key for a video: resolved path plus size and modification time"""
+    stat = os.stat(video_path)
+    raw = f"{os.path.realpath(video_path)}\x00{stat.st_size}\x00{stat.st_mtime_ns}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+class TranslationCheckpoint:
+    """Durable per-file state: source transcript plus translated cues"""
+
+    SOURCE_FILE = "source.en.srt"
+    TRANSLATIONS_FILE = "translations.jsonl"
+    META_FILE = "meta.json"
+
+    def __init__(self, video_path: str, root: Optional[str] = None):
+        self.video_path = video_path
+        self.key = file_identity_key(video_path)
+        self.directory = os.path.join(root or DEFAULT_CHECKPOINT_DIR, self.key)
+        self.lock = threading.Lock()
+
+    @property
+    def source_path(self) -> str:
+        return os.path.join(self.directory, self.SOURCE_FILE)
+
+    @property
+    def translations_path(self) -> str:
+        return os.path.join(self.directory, self.TRANSLATIONS_FILE)
+
+    def _ensure_directory(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, self.META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'video_path': self.video_path, 'created_at': time.time()}, f, ensure_ascii=False)
+
+    def has_source(self) -> bool:
+        return os.path.exists(self.source_path) and os.path.getsize(self.source_path) > 0
+
+    def save_source(self, srt_path: str) -> str:
+        """Copy the English transcript into the checkpoint and return its new path"""
+        self._ensure_directory()
+        temp_path = self.source_path + ".tmp"
+        shutil.copyfile(srt_path, temp_path)
+        os.replace(temp_path, self.source_path)
+        return self.source_path
+
+    def load_translations(self, model: str) -> Dict[int, Tuple[str, str]]:
+        """Return {cue_index: (source_hash, translated_text)} recorded for this model"""
+        translations = {}
+        if not os.path.exists(self.translations_path):
+            return translations
+
+        with open(self.translations_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted write
+                    continue
+                if record.get('model') != model:
+                    continue
+                for index, source_hash, text in record.get('cues', []):
+                    translations[int(index)] = (source_hash, text)
+        return translations
+
+    def resume_translations(self, cues: Iterable, model: str) -> Dict[int, str]:
+        """Translated text for cues whose source text still matches the checkpoint"""
+        recorded = self.load_translations(model)
+        resumed = {}
+        for cue in cues:
+            entry = recorded.get(cue.index)
+            if entry and entry[0] == _text_hash(cue.text):
+                resumed[cue.index] = entry[1]
+        return resumed
+
+    def record_chunk(self, model: str, pairs: Iterable[Tuple[object, str]]):
+        """Append one translated chunk ((cue, translated_text) pairs) durably"""
+        cues = [[cue.index, _text_hash(cue.text), text] for cue, text in pairs]
+        if not cues:
+            return
+        line = json.dumps({'model': model, 'time': time.time(), 'cues': cues}, ensure_ascii=False)
+        with self.lock:
+            self._ensure_directory()
+            with open(self.translations_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        """Remove the checkpoint once the subtitle has been written"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def prune_checkpoints(root: Optional[str] = None, max_age_days: float = 30) -> int:
+    """Delete checkpoints that have not been touched for max_age_days"""
+    root = root or DEFAULT_CHECKPOINT_DIR
+    if not os.path.isdir(root):
+        return 0
+
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            newest = max(os.path.getmtime(os.path.join(path, entry)) for entry in os.listdir(path))
+        except (OSError, ValueError):
+            newest = 0
+        if newest < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"Pruned {removed} stale translation checkpoints")
+    return removed
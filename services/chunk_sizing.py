@@ -0,0 +1,138 @@
+"""
+Adaptive Chunk Sizing for AI Translator
+تحديد حجم مقاطع الترجمة تلقائياً
+
+Translation chunks are sized in estimated tokens against the model's context
+window (from Ollama's /api/show), then adjusted online: chunks shrink after
+failures or slow responses and grow again while the model keeps up.
+"""
+
+import logging
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Instructions and framing around the numbered lines
+PROMPT_OVERHEAD_TOKENS = 200
+# Arabic output costs noticeably more tokens than the English input
+OUTPUT_TOKEN_RATIO = 1.8
+# Tokens for the "n: " prefix and newline of every batch line
+LINE_OVERHEAD_TOKENS = 4
+# Context assumed when /api/show is unavailable (Ollama's default num_ctx)
+FALLBACK_CONTEXT = 2048
+DEFAULT_MAX_CONTEXT = 8192
+DEFAULT_TARGET_SECONDS = 60.0
+MIN_CHUNK_TOKENS = 64
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 characters per token for ASCII, ~1.5 for other scripts"""
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return max(1, math.ceil((len(text) - non_ascii) / 4 + non_ascii / 1.5))
+
+def cue_tokens(cue) -> int:
+    return estimate_tokens(cue.text) + LINE_OVERHEAD_TOKENS
+
+class ChunkSizer:
+    """Token budget for the next chunk, adapted from measured chunk outcomes
+
+    Additive increase while chunks finish complete and within target_seconds;
+    multiplicative decrease on failures, truncated output or slow chunks.
+    """
+
+    def __init__(self, num_ctx: int, target_seconds: float = DEFAULT_TARGET_SECONDS,
+                 explicit_context: bool = True):
+        self.num_ctx = int(num_ctx)
+        # False when the server default applies, so num_ctx should not be sent
+        self.explicit_context = explicit_context
+        self.target_seconds = float(target_seconds)
+        usable = (self.num_ctx - PROMPT_OVERHEAD_TOKENS) / (1 + OUTPUT_TOKEN_RATIO)
+        # 10% headroom for estimation error
+        self.max_tokens = max(MIN_CHUNK_TOKENS, int(usable * 0.9))
+        self.min_tokens = min(MIN_CHUNK_TOKENS, self.max_tokens)
+        self.target_tokens = max(self.min_tokens, self.max_tokens // 2)
+        self.step = max(16, self.max_tokens // 10)
+        self.chunks = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def take(self, remaining: deque) -> List:
+        """Pop the next chunk of cues from the front of remaining (at least one cue)"""
+        with self.lock:
+            budget = self.target_tokens
+        chunk = [remaining.popleft()]
+        used = cue_tokens(chunk[0])
+        while remaining and used + cue_tokens(remaining[0]) <= budget:
+            used += cue_tokens(remaining[0])
+            chunk.append(remaining.popleft())
+        return chunk
+
+    def record(self, tokens: int, seconds: float, complete: bool):
+        """Feed back one chunk: its input tokens, wall time and whether every line came back"""
+        with self.lock:
+            self.chunks += 1
+            previous = self.target_tokens
+            if not complete:
+                self.failures += 1
+                self.target_tokens = max(self.min_tokens, self.target_tokens // 2)
+            elif seconds > self.target_seconds and tokens:
+                # Resize to what the model can do within the target time
+                rate = tokens / max(seconds, 0.001)
+                self.target_tokens = max(self.min_tokens, min(self.target_tokens, int(rate * self.target_seconds)))
+            elif tokens >= self.target_tokens * 0.5:
+                # Only grow when chunks actually use the budget
+                self.target_tokens = min(self.max_tokens, self.target_tokens + self.step)
+            if self.target_tokens != previous:
+                logger.info(f"Chunk budget {previous} -> {self.target_tokens} tokens "
+                            f"({seconds:.1f}s, complete={complete})")
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'num_ctx': self.num_ctx,
+                'target_tokens': self.target_tokens,
+                'max_tokens': self.max_tokens,
+                'chunks': self.chunks,
+                'failures': self.failures
+            }
+
+_sizers: Dict[tuple, ChunkSizer] = {}
+_sizers_lock = threading.Lock()
+
+def resolve_num_ctx(settings: Dict, model: str, client=None) -> Optional[int]:
+    """Context window to request: the model's trained context capped by ollama_max_context"""
+    try:
+        cap = int(settings.get('ollama_max_context', DEFAULT_MAX_CONTEXT))
+    except (TypeError, ValueError):
+        cap = DEFAULT_MAX_CONTEXT
+
+    context = None
+    if client is not None:
+        try:
+            context = client.model_context_length(model)
+        except Exception as e:
+            logger.warning(f"Could not read context length of {model}: {e}")
+    if not context:
+        return None
+    return min(context, cap) if cap > 0 else context
+
+def get_chunk_sizer(settings: Dict, client=None) -> ChunkSizer:
+    """Process-wide sizer per model, so what one file learns carries over to the next"""
+    model = settings.get('ollama_model', 'llama3')
+    num_ctx = resolve_num_ctx(settings, model, client)
+    try:
+        target_seconds = float(settings.get('translation_target_chunk_seconds', DEFAULT_TARGET_SECONDS))
+    except (TypeError, ValueError):
+        target_seconds = DEFAULT_TARGET_SECONDS
+
+    key = (model, num_ctx, target_seconds)
+    with _sizers_lock:
+        sizer = _sizers.get(key)
+        if sizer is None:
+            sizer = ChunkSizer(num_ctx or FALLBACK_CONTEXT, target_seconds, explicit_context=num_ctx is not None)
+            _sizers[key] = sizer
+        return sizer
@@ -0,0 +1,290 @@
+"""
+Device Scheduler for AI Translator
+جدولة التفريغ الصوتي على كروت الشاشة والمعالج
+
+Every device Whisper can run on (each GPU and the CPU) is a resource with a
+memory capacity and a number of transcription slots. A transcription job is
+admitted only on a device where its model fits next to the models already
+loaded there; concurrent jobs are spread over the GPUs, and go to the CPU
+when every GPU is saturated. The device list is built from gpu_manager data
+but can be passed in directly (synthetic GPUs for testing on CPU-only hosts).
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Approximate resident memory (MiB) of a loaded faster-whisper model, by size
+WHISPER_MODEL_MEMORY_MB = {
+    'tiny': 1000,
+    'base': 1000,
+    'small': 2000,
+    'medium': 5000,
+    'turbo': 6000,
+    'large': 10000,
+}
+DEFAULT_MODEL_MEMORY_MB = WHISPER_MODEL_MEMORY_MB['medium']
+DEFAULT_GPU_HEADROOM_MB = 512
+# RAM left to the OS, ffmpeg and the web app when sizing the CPU device
+CPU_HEADROOM_MB = 2048
+
+class DeviceUnavailable(Exception):
+    """No device can take the job (the model fits nowhere, or the wait timed out)"""
+
+class Device:
+    """One transcription device: memory capacity, slots and the models resident on it"""
+
+    def __init__(self, name: str, kind: str, index: int = 0, memory_mb: int = 0, slots: int = 1,
+                 score: int = 0, preferred: bool = False, reserved: bool = False):
+        self.name = name
+        self.kind = kind
+        self.index = index
+        self.memory_mb = memory_mb
+        self.slots = slots
+        self.score = score
+        self.preferred = preferred
+        self.reserved = reserved  # kept for Ollama; used only when named explicitly
+        self.active = 0
+        self.resident: Dict[str, int] = {}  # model -> MiB held while the model stays loaded
+        self.leases: Dict[str, int] = {}    # model -> running jobs
+        self.current_model = None
+
+    @property
+    def used_mb(self) -> int:
+        return sum(self.resident.values())
+
+    @property
+    def free_mb(self) -> int:
+        return self.memory_mb - self.used_mb
+
+    def _idle_other_mb(self, model: str) -> int:
+        # Loading a different model replaces the idle one (see whisper_engine.get_transcription_worker)
+        return sum(mb for name, mb in self.resident.items() if name != model and not self.leases.get(name))
+
+    def could_ever_fit(self, need_mb: int, slots: int = 1) -> bool:
+        return need_mb <= self.memory_mb and slots <= self.slots
+
+    def can_admit(self, model: str, need_mb: int, slots: int = 1) -> bool:
+        if self.active + slots > self.slots:
+            return False
+        extra = 0 if model in self.resident else need_mb
+        return self.used_mb - self._idle_other_mb(model) + extra <= self.memory_mb
+
+    def admit(self, model: str, need_mb: int, slots: int = 1):
+        for name in [name for name in self.resident if name != model and not self.leases.get(name)]:
+            del self.resident[name]
+        self.resident.setdefault(model, need_mb)
+        self.leases[model] = self.leases.get(model, 0) + 1
+        self.active += slots
+        self.current_model = model
+
+    def release(self, model: str, slots: int = 1):
+        self.active = max(0, self.active - slots)
+        self.leases[model] = max(0, self.leases.get(model, 0) - 1)
+        # A model that was replaced while it was still running unloads once its last job ends
+        for name in [name for name in self.resident if name != self.current_model and not self.leases.get(name)]:
+            del self.resident[name]
+
+    @property
+    def gpu_id(self) -> str:
+        """Value of the whisper_gpu_id setting that selects this device"""
+        return 'cpu' if self.kind == 'cpu' else str(self.index)
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'index': self.index,
+            'memory_mb': self.memory_mb,
+            'used_mb': self.used_mb,
+            'slots': self.slots,
+            'active': self.active,
+            'resident': dict(self.resident),
+            'preferred': self.preferred,
+            'reserved': self.reserved
+        }
+
+class Placement:
+    """A device held by one job; release it through DeviceScheduler.release"""
+
+    def __init__(self, device: Device, model: str, need_mb: int, slots: int, waited: float):
+        self.device = device
+        self.model = model
+        self.need_mb = need_mb
+        self.slots = slots
+        self.waited = waited
+
+def model_memory_mb(model: str, settings: Optional[Dict] = None) -> int:
+    """Memory a Whisper model needs ('medium.en', 'large-v3', 'distil-large-v3' ...)"""
+    if settings:
+        try:
+            override = int(settings.get('whisper_model_memory_mb', 0) or 0)
+        except (TypeError, ValueError):
+            override = 0
+        if override > 0:
+            return override
+    name = (model or '').lower().split('/')[-1]
+    name = name.replace('distil-', '').replace('.en', '')
+    for size, memory in WHISPER_MODEL_MEMORY_MB.items():
+        if name.startswith(size) or f'-{size}' in name:
+            return memory
+    return DEFAULT_MODEL_MEMORY_MB
+
+class DeviceScheduler:
+    """Admits transcription jobs onto devices with enough free memory and a free slot"""
+
+    def __init__(self, devices: Iterable[Device]):
+        self.devices = list(devices)
+        self.condition = threading.Condition()
+
+    def _candidates(self, allowed: Optional[List[str]], cpu_fallback: bool) -> List[Device]:
+        if allowed is None:
+            devices = [device for device in self.devices if not device.reserved]
+        else:
+            devices = [device for device in self.devices if device.name in allowed]
+        if cpu_fallback:
+            devices += [device for device in self.devices if device.kind == 'cpu' and device not in devices]
+        return devices
+
+    def _pick(self, devices: List[Device], model: str, need_mb: int, exclusive: bool) -> Optional[Device]:
+        def admits(device):
+            return device.can_admit(model, need_mb, device.slots if exclusive else 1)
+
+        gpus = [device for device in devices if device.kind != 'cpu' and admits(device)]
+        if gpus:
+            # Warm model first, then the device gpu_manager recommends, then the emptiest and fastest
+            return min(gpus, key=lambda device: (model not in device.resident, not device.preferred,
+                                                 -device.free_mb, -device.score, device.index))
+        for device in devices:
+            if device.kind == 'cpu' and admits(device):
+                return device
+        return None
+
+    def acquire(self, model: str, need_mb: Optional[int] = None, allowed: Optional[List[str]] = None,
+                cpu_fallback: bool = True, exclusive: bool = False,
+                timeout: Optional[float] = None, cancel_event: Optional[threading.Event] = None) -> Placement:
+        """Block until a device can take the model; raises DeviceUnavailable
+
+        allowed limits the devices by name ('cuda:0', 'cpu'); cpu_fallback adds
+        the CPU to them. exclusive takes every slot of the device (a job that
+        runs its own process pool). Setting cancel_event gives up the wait.
+        """
+        need_mb = need_mb if need_mb is not None else model_memory_mb(model)
+        devices = self._candidates(allowed, cpu_fallback)
+        if not any(device.could_ever_fit(need_mb, device.slots if exclusive else 1) for device in devices):
+            raise DeviceUnavailable(f"Whisper model {model} ({need_mb} MiB) does not fit on any device")
+
+        started = time.time()
+        deadline = started + timeout if timeout is not None else None
+        with self.condition:
+            while True:
+                device = self._pick(devices, model, need_mb, exclusive)
+                if device is not None:
+                    slots = device.slots if exclusive else 1
+                    device.admit(model, need_mb, slots)
+                    return Placement(device, model, need_mb, slots, time.time() - started)
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise DeviceUnavailable(f"No device freed up for Whisper model {model} within {timeout}s")
+                if cancel_event is not None:
+                    if cancel_event.is_set():
+                        raise DeviceUnavailable("Cancelled while waiting for a device")
+                    # Wake up now and then to notice the cancellation
+                    remaining = min(remaining, 1.0) if remaining is not None else 1.0
+                self.condition.wait(remaining)
+
+    def release(self, placement: Placement):
+        with self.condition:
+            placement.device.release(placement.model, placement.slots)
+            self.condition.notify_all()
+
+    @contextmanager
+    def reserve(self, model: str, **kwargs):
+        """Hold a device for the duration of a with block; yields the Placement"""
+        placement = self.acquire(model, **kwargs)
+        try:
+            yield placement
+        finally:
+            self.release(placement)
+
+    def status(self) -> List[Dict]:
+        with self.condition:
+            return [device.to_dict() for device in self.devices]
+
+def _int_setting(settings: Dict, key: str, default: int) -> int:
+    try:
+        return int(settings.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+def cpu_memory_mb() -> int:
+    try:
+        import psutil
+        return max(0, psutil.virtual_memory().available // (1024 * 1024) - CPU_HEADROOM_MB)
+    except Exception:
+        return 8192
+
+def devices_from_gpu_manager(manager, settings: Dict) -> List[Device]:
+    """Devices from gpu_manager data: one per GPU with known memory, plus the CPU
+
+    Memory already in use when the devices are built (Ollama, other programs)
+    is not counted as capacity. The GPU gpu_manager recommends for Whisper is
+    preferred; a GPU it gives to Ollama alone is reserved.
+    """
+    allocation = manager.get_recommended_allocation() if manager.gpus else {}
+    whisper_gpu = allocation.get('whisper')
+    ollama_gpu = allocation.get('ollama')
+    headroom = _int_setting(settings, 'gpu_memory_headroom_mb', DEFAULT_GPU_HEADROOM_MB)
+    gpu_slots = max(1, _int_setting(settings, 'whisper_gpu_slots', 1))
+
+    devices = []
+    for gpu in manager.gpus:
+        total = gpu.get('memory_total') or 0
+        if total <= 0:
+            # Detected without a driver (lspci); CUDA cannot use it
+            continue
+        free = gpu.get('memory_free')
+        capacity = (free if free is not None else total - (gpu.get('memory_used') or 0)) - headroom
+        devices.append(Device(f"cuda:{gpu['id']}", 'cuda', gpu['id'], max(0, capacity), gpu_slots,
+                              gpu.get('performance_score', 0), preferred=str(gpu['id']) == whisper_gpu,
+                              reserved=str(gpu['id']) == ollama_gpu and ollama_gpu != whisper_gpu))
+
+    devices.append(Device('cpu', 'cpu', 0, cpu_memory_mb(), max(1, _int_setting(settings, 'whisper_cpu_slots', 1)),
+                          preferred=whisper_gpu == 'cpu'))
+    return devices
+
+_scheduler: Optional[DeviceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_device_scheduler(settings: Dict) -> DeviceScheduler:
+    """The process-wide scheduler, built from gpu_manager on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from gpu_manager import gpu_manager
+            _scheduler = DeviceScheduler(devices_from_gpu_manager(gpu_manager, settings))
+            logger.info("Transcription devices: " + ', '.join(
+                f"{device.name} ({device.memory_mb} MiB, {device.slots} slots)" for device in _scheduler.devices))
+        return _scheduler
+
+def set_device_scheduler(scheduler: Optional[DeviceScheduler]):
+    """Replace the process-wide scheduler (None rebuilds it from gpu_manager on next use)"""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+def allowed_devices(settings: Dict) -> Optional[List[str]]:
+    """Device names the whisper_gpu_id setting allows (None: any)"""
+    gpu_id = str(settings.get('whisper_gpu_id', 'auto') or 'auto')
+    if gpu_id == 'auto':
+        return None
+    if gpu_id == 'cpu':
+        return ['cpu']
+    try:
+        return [f"cuda:{int(gpu_id)}"]
+    except ValueError:
+        return None
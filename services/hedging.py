@@ -0,0 +1,126 @@
+"""
+Hedged Requests for AI Translator
+الطلبات الاحتياطية لتقليل زمن الانتظار
+
+When a translation chunk runs longer than a latency percentile learned from
+recent chunks, a duplicate request is started (the pool routes it to another
+server when there is one); the first successful answer wins and the other
+request is cancelled.
+"""
+
+import logging
+import queue
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class LatencyTracker:
+    """Recent per-token chunk latencies and the hedge delay derived from them
+
+    Latency is tracked per input token because chunk sizes vary; the hedge
+    delay for a chunk is the chosen percentile scaled to its token count.
+    """
+
+    def __init__(self, percentile: float = 95, window: int = 200, min_samples: int = 20,
+                 min_delay: float = 5.0):
+        self.percentile = min(99.9, max(50.0, float(percentile)))
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.fired = 0
+        self.won = 0
+        self.lock = threading.Lock()
+
+    def record(self, tokens: int, seconds: float):
+        """Record a successful chunk"""
+        if tokens > 0:
+            with self.lock:
+                self.samples.append(seconds / tokens)
+
+    def hedge_delay(self, tokens: int) -> Optional[float]:
+        """Seconds to wait before hedging a chunk of this size, or None while history is too short"""
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        rank = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[rank] * max(tokens, 1))
+
+    def note_hedge(self, won: bool):
+        with self.lock:
+            self.fired += 1
+            if won:
+                self.won += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'samples': len(self.samples), 'hedges_fired': self.fired, 'hedges_won': self.won}
+
+def run_hedged(attempt: Callable, delay: Optional[float]):
+    """Run attempt(cancel_event, name) and hedge it with a duplicate after delay seconds
+
+    name is 'primary' or 'hedge', so an attempt can keep its side effects apart.
+
+    Returns (result, hedged, hedge_won). The first successful attempt wins and
+    the cancel events of the others are set. A primary that fails before the
+    delay is not hedged; its error is raised.
+    """
+    results = queue.Queue()
+    cancel_events = []
+
+    def launch(name):
+        cancel_event = threading.Event()
+        cancel_events.append(cancel_event)
+
+        def target():
+            try:
+                results.put((name, True, attempt(cancel_event, name)))
+            except Exception as e:
+                results.put((name, False, e))
+
+        threading.Thread(target=target, name=f"hedge-{name}", daemon=True).start()
+
+    launch('primary')
+    hedged = False
+    pending = 1
+    error = None
+    try:
+        while pending:
+            try:
+                name, ok, value = results.get(timeout=None if hedged or delay is None else delay)
+            except queue.Empty:
+                logger.info(f"Chunk still running after {delay:.1f}s, sending a hedged request")
+                launch('hedge')
+                hedged = True
+                pending += 1
+                continue
+
+            pending -= 1
+            if ok:
+                return value, hedged, hedged and name == 'hedge'
+            error = value
+            if not hedged:
+                raise error
+        raise error
+    finally:
+        for cancel_event in cancel_events:
+            cancel_event.set()
+
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+def get_latency_tracker(settings: Dict) -> LatencyTracker:
+    """Process-wide tracker per model"""
+    model = settings.get('ollama_model', 'llama3')
+    try:
+        percentile = float(settings.get('translation_hedge_percentile', 95))
+    except (TypeError, ValueError):
+        percentile = 95
+    with _trackers_lock:
+        tracker = _trackers.get(model)
+        if tracker is None or tracker.percentile != percentile:
+            tracker = LatencyTracker(percentile)
+            _trackers[model] = tracker
+        return tracker
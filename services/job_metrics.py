@@ -0,0 +1,187 @@
+"""
+Job Metrics for AI Translator
+قياسات أداء مهام الترجمة
+
+Turns a finished FileJob into a report (wall time per stage, Whisper real-time
+factor, Ollama token counters per chunk, cache hit rates), stores it on
+TranslationJob/TranslationHistory and aggregates stored reports so it is
+visible where time goes across many jobs.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from models import MediaFile, TranslationHistory, TranslationJob
+
+logger = logging.getLogger(__name__)
+
+def _ratio(part, whole) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
+
+def build_job_report(job) -> Dict:
+    """Plain-dict report of a finished FileJob"""
+    metrics = dict(job.metrics)
+    duration = None
+    try:
+        duration = float((job.media_info.get('format') or {}).get('duration') or 0) or None
+    except (TypeError, ValueError):
+        pass
+
+    if getattr(job, 'cancelled', None):
+        status = 'paused' if job.cancelled == 'pause' else 'cancelled'
+    elif 'translate' not in job.stage_times and job.success:
+        status = 'skipped'
+    else:
+        status = 'completed' if job.success else 'failed'
+
+    # Streamed audio is decoded inside the transcribe stage, so its time is part of the factor
+    transcribe_seconds = job.stage_times.get('transcribe')
+    if job.source_kind == 'whisper' and duration and transcribe_seconds:
+        metrics['whisper_rtf'] = round(transcribe_seconds / duration, 4)
+
+    lines = metrics.get('lines', 0)
+    metrics['memory_hit_rate'] = _ratio(metrics.get('memory_hits', 0), lines)
+    prompt_tokens = metrics.get('prompt_eval_tokens', 0) + metrics.get('prompt_cached_tokens', 0)
+    metrics['prompt_cache_hit_rate'] = _ratio(metrics.get('prompt_cached_tokens', 0), prompt_tokens)
+    if metrics.get('eval_seconds'):
+        metrics['eval_tokens_per_second'] = round(metrics.get('eval_tokens', 0) / metrics['eval_seconds'], 2)
+
+    return {
+        'video_path': getattr(job, 'library_path', job.video_path),
+        'status': status,
+        'error': job.error,
+        'source_kind': job.source_kind,
+        'audio_language': getattr(job, 'audio_language', None),
+        'audio_duration': duration,
+        'processing_time': round(time.time() - job.started_at, 3),
+        'stage_times': {name: round(seconds, 3) for name, seconds in job.stage_times.items()},
+        'metrics': {key: round(value, 4) if isinstance(value, float) else value for key, value in metrics.items()},
+        'chunks': list(job.chunk_metrics),
+        # As the library sees it; the size is read where this job wrote the file
+        'subtitle_path': f"{os.path.splitext(getattr(job, 'library_path', job.video_path))[0]}.ar.srt",
+        'subtitle_size': os.path.getsize(job.arabic_srt_path) if os.path.exists(job.arabic_srt_path) else None,
+        'lines': lines
+    }
+
+def save_job_report(session, report: Dict, settings: Dict, job_id: Optional[int] = None,
+                    owner: Optional[str] = None) -> Optional[int]:
+    """Store a report on TranslationJob (the queue row job_id, or a new row) and add TranslationHistory on success
+
+    On a queue row only the metrics, model and timing columns are written, and
+    only while owner still holds its lease; status, progress and the error are
+    left to job_queue.finish_job. Returns the TranslationJob id, or None when
+    the lease was lost or there is no queue row and the video is not in the
+    library.
+    """
+    media = session.query(MediaFile.id).filter_by(path=report['video_path']).first()
+    now = datetime.utcnow()
+    if job_id:
+        query = session.query(TranslationJob).filter(TranslationJob.id == job_id)
+        if owner:
+            query = query.filter(TranslationJob.lease_owner == owner)
+        job = query.first()
+        if job is None:
+            logger.warning(f"Job {job_id} is no longer held by {owner}; its report is not saved")
+            return None
+    else:
+        if media is None:
+            return None
+        job = TranslationJob(media_file_id=media.id, task_type='translate_file', created_at=now)
+        session.add(job)
+        job.status = report['status']
+        job.progress = 100.0
+        job.error_message = report['error']
+        job.completed_at = now
+
+    job.whisper_model = settings.get('whisper_model') if report['source_kind'] == 'whisper' else None
+    job.ollama_model = settings.get('ollama_model')
+    job.audio_duration = report['audio_duration']
+    job.processing_time = report['processing_time']
+    job.metrics = json.dumps({key: report[key] for key in ('source_kind', 'audio_language', 'stage_times',
+                                                          'metrics', 'chunks')}, ensure_ascii=False)
+
+    if report['status'] == 'completed' and media is not None:
+        session.add(TranslationHistory(
+            media_file_id=media.id,
+            subtitle_path=report['subtitle_path'],
+            file_size=report['subtitle_size'],
+            duration=report['audio_duration'],
+            lines_count=report['lines'],
+            processing_time=report['processing_time'],
+            whisper_model_used=job.whisper_model,
+            ollama_model_used=job.ollama_model,
+            created_at=now
+        ))
+
+    session.flush()
+    return job.id
+
+def load_job_metrics(job: TranslationJob) -> Dict:
+    if not job.metrics:
+        return {}
+    try:
+        return json.loads(job.metrics)
+    except ValueError:
+        return {}
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))], 3)
+
+def summarize_jobs(jobs: Iterable[TranslationJob]) -> Dict:
+    """Aggregate stored reports: time per stage (total, mean, p95, share), RTF, cache and token rates"""
+    stage_values: Dict[str, List[float]] = {}
+    totals = {'jobs': 0, 'completed': 0, 'failed': 0, 'skipped': 0, 'cancelled': 0, 'paused': 0,
+              'audio_seconds': 0.0}
+    counters = {key: 0.0 for key in ('lines', 'memory_hits', 'prompt_eval_tokens', 'prompt_cached_tokens',
+                                     'eval_tokens', 'eval_seconds', 'chunks', 'chunks_failed', 'hedges_fired')}
+    rtfs = []
+    chunk_seconds = []
+
+    for job in jobs:
+        data = load_job_metrics(job)
+        totals['jobs'] += 1
+        if job.status in totals:
+            totals[job.status] += 1
+        totals['audio_seconds'] += job.audio_duration or 0
+        for name, seconds in (data.get('stage_times') or {}).items():
+            stage_values.setdefault(name, []).append(seconds)
+        metrics = data.get('metrics') or {}
+        for key in counters:
+            counters[key] += metrics.get(key) or 0
+        if metrics.get('whisper_rtf') is not None:
+            rtfs.append(metrics['whisper_rtf'])
+        chunk_seconds.extend(chunk['seconds'] for chunk in data.get('chunks') or [] if 'seconds' in chunk)
+
+    all_stage_seconds = sum(sum(values) for values in stage_values.values())
+    stages = {
+        name: {
+            'jobs': len(values),
+            'total_seconds': round(sum(values), 3),
+            'mean_seconds': round(sum(values) / len(values), 3),
+            'p95_seconds': _percentile(values, 95),
+            'share': _ratio(sum(values), all_stage_seconds)
+        }
+        for name, values in stage_values.items()
+    }
+
+    prompt_tokens = counters['prompt_eval_tokens'] + counters['prompt_cached_tokens']
+    return dict(
+        totals,
+        stages=stages,
+        whisper_rtf={'mean': round(sum(rtfs) / len(rtfs), 4) if rtfs else None, 'p95': _percentile(rtfs, 95)},
+        chunk_seconds={'count': len(chunk_seconds), 'p50': _percentile(chunk_seconds, 50),
+                       'p95': _percentile(chunk_seconds, 95)},
+        memory_hit_rate=_ratio(counters['memory_hits'], counters['lines']),
+        prompt_cache_hit_rate=_ratio(counters['prompt_cached_tokens'], prompt_tokens),
+        eval_tokens_per_second=round(counters['eval_tokens'] / counters['eval_seconds'], 2)
+        if counters['eval_seconds'] else None,
+        chunk_failure_rate=_ratio(counters['chunks_failed'], counters['chunks']),
+        hedges_fired=int(counters['hedges_fired'])
+    )
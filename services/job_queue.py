@@ -0,0 +1,392 @@
+"""
+Job Queue for AI Translator
+قائمة انتظار المهام في قاعدة البيانات
+
+Background work is stored as rows of translation_jobs. A worker claims a row
+with a conditional UPDATE (only one claimer can move it out of 'pending') and
+holds it under a lease it keeps renewing; a worker that dies stops renewing,
+so its jobs return to the queue once the lease expires.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from models import MediaFile, TranslationJob
+
+logger = logging.getLogger(__name__)
+
+# Task type -> task class; each class has its own worker slots, so a library
+# sync never waits for translations (and the other way around)
+TASK_CLASSES = {
+    'translate_file': 'translate',
+    'batch_translate': 'scan',
+    'scan_translation_status': 'scan',
+    'corrections': 'scan',
+    'export_translation_memory': 'scan',
+    'import_translation_memory': 'scan',
+    'sync_library': 'sync',
+    'probe_media': 'sync',
+}
+
+# Task names used by the web app that differ from the queue task types
+TASK_ALIASES = {
+    'single_file_translate': 'translate_file',
+}
+
+ACTIVE_STATUSES = ('pending', 'processing')
+# A paused job keeps its row (and its checkpoints) until it is resumed
+QUEUED_STATUSES = ACTIVE_STATUSES + ('paused',)
+# What cancel, pause and resume do to a job that is not running
+CONTROL_TRANSITIONS = {
+    'cancel': {'pending': 'cancelled', 'paused': 'cancelled'},
+    'pause': {'pending': 'paused'},
+    'resume': {'paused': 'pending'},
+}
+# Status a running job ends in when its worker honours a control request
+CONTROL_STATUSES = {'cancel': 'cancelled', 'pause': 'paused'}
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+# Pending rows examined per claim; losing a race on one moves on to the next
+CLAIM_CANDIDATES = 5
+
+def normalize_task_type(task_name: str) -> str:
+    """Queue task type for a task name ('sync_library_task' -> 'sync_library')"""
+    name = task_name[:-len('_task')] if task_name.endswith('_task') else task_name
+    name = TASK_ALIASES.get(name, name)
+    if name not in TASK_CLASSES:
+        raise ValueError(f"Unknown task: {task_name}")
+    return name
+
+def task_types_for(task_class: str) -> List[str]:
+    return [task_type for task_type, cls in TASK_CLASSES.items() if cls == task_class]
+
+def job_payload(job: TranslationJob) -> Dict:
+    if not job.payload:
+        return {}
+    try:
+        return json.loads(job.payload)
+    except ValueError:
+        return {}
+
+def enqueue_task(session, task_name: str, args: Optional[List] = None, priority: int = 0) -> Tuple[TranslationJob, bool]:
+    """Add a task to the queue; returns (job, created)
+
+    A task identical to one that is already pending or running is not added
+    twice; the existing job is returned instead (a pending one is raised to
+    the new priority when that is higher, a paused one is resumed).
+    """
+    task_type = normalize_task_type(task_name)
+    args = [str(arg) for arg in (args or [])]
+    payload = json.dumps({'args': args}, ensure_ascii=False)
+
+    media_file_id = None
+    if task_type == 'translate_file':
+        if not args:
+            raise ValueError("translate_file needs a video path")
+        media = session.query(MediaFile.id).filter_by(path=args[0]).first()
+        media_file_id = media.id if media else None
+
+    existing = session.query(TranslationJob).filter(
+        TranslationJob.task_type == task_type,
+        TranslationJob.payload == payload,
+        TranslationJob.status.in_(QUEUED_STATUSES)
+    ).first()
+    if existing:
+        if existing.status == 'paused':
+            existing.status = 'pending'
+            existing.updated_at = datetime.utcnow()
+        if existing.status == 'pending' and priority > (existing.priority or 0):
+            existing.priority = priority
+        session.commit()
+        return existing, False
+
+    now = datetime.utcnow()
+    job = TranslationJob(
+        task_type=task_type,
+        media_file_id=media_file_id,
+        payload=payload,
+        priority=priority,
+        status='pending',
+        progress=0.0,
+        attempts=0,
+        created_at=now,
+        updated_at=now
+    )
+    session.add(job)
+    session.commit()
+    return job, True
+
+def enqueue_files(session, paths: Iterable[str], priority: int = 0) -> int:
+    """Queue translate_file jobs for paths that are not queued yet; returns the number added
+
+    Paused jobs of the given paths are resumed instead of added again.
+    """
+    paths = list(paths)
+    if not paths:
+        return 0
+
+    active = set()
+    now = datetime.utcnow()
+    wanted = set(paths)
+    for job in session.query(TranslationJob).filter(
+        TranslationJob.task_type == 'translate_file',
+        TranslationJob.status.in_(QUEUED_STATUSES)
+    ):
+        path = job_payload(job).get('args', [None])[0]
+        active.add(path)
+        if job.status == 'paused' and path in wanted:
+            job.status = 'pending'
+            job.updated_at = now
+    media_ids = {row.path: row.id for row in session.query(MediaFile.id, MediaFile.path).filter(MediaFile.path.in_(paths))}
+
+    added = 0
+    for path in paths:
+        if path in active:
+            continue
+        session.add(TranslationJob(
+            task_type='translate_file',
+            media_file_id=media_ids.get(path),
+            payload=json.dumps({'args': [path]}, ensure_ascii=False),
+            priority=priority,
+            status='pending',
+            progress=0.0,
+            attempts=0,
+            created_at=now,
+            updated_at=now
+        ))
+        added += 1
+    session.commit()
+    return added
+
+def claim_next(session, task_types: List[str], owner: str, lease_seconds: int = DEFAULT_LEASE_SECONDS,
+               policy=None) -> Optional[TranslationJob]:
+    """Atomically take the next pending job of the given types, or None
+
+    policy (services.scheduling) decides the order; without one, the highest
+    priority and then the oldest job comes first.
+    """
+    if policy is not None:
+        from services.scheduling import pending_candidates
+        candidate_ids = [c.id for c in pending_candidates(session, task_types, policy, CLAIM_CANDIDATES)]
+    else:
+        candidate_ids = [row[0] for row in session.query(TranslationJob.id).filter(
+            TranslationJob.status == 'pending',
+            TranslationJob.task_type.in_(task_types)
+        ).order_by(TranslationJob.priority.desc(), TranslationJob.created_at, TranslationJob.id)
+            .limit(CLAIM_CANDIDATES)]
+
+    for job_id in candidate_ids:
+        now = datetime.utcnow()
+        # Compare-and-set: only the worker that sees the row still pending moves it
+        claimed = session.query(TranslationJob).filter(
+            TranslationJob.id == job_id,
+            TranslationJob.status == 'pending'
+        ).update({
+            'status': 'processing',
+            'lease_owner': owner,
+            'worker': owner,
+            'control': None,
+            'lease_expires_at': now + timedelta(seconds=lease_seconds),
+            'attempts': func.coalesce(TranslationJob.attempts, 0) + 1,
+            'started_at': now,
+            'updated_at': now
+        }, synchronize_session=False)
+        session.commit()
+        if claimed:
+            return session.get(TranslationJob, job_id)
+    return None
+
+def renew_leases(session, owner: str, job_ids: Iterable[int], lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[int]:
+    """Extend the leases this owner still holds; returns the ids that were renewed"""
+    renewed = []
+    expires = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    for job_id in job_ids:
+        updated = session.query(TranslationJob).filter(
+            TranslationJob.id == job_id,
+            TranslationJob.lease_owner == owner,
+            TranslationJob.status == 'processing'
+        ).update({'lease_expires_at': expires}, synchronize_session=False)
+        if updated:
+            renewed.append(job_id)
+    session.commit()
+    return renewed
+
+def set_priority(session, job_id: int, priority: int) -> bool:
+    """Change the priority of a pending job"""
+    updated = session.query(TranslationJob).filter(
+        TranslationJob.id == job_id,
+        TranslationJob.status == 'pending'
+    ).update({'priority': priority, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    session.commit()
+    return bool(updated)
+
+def request_control(session, job_id: int, action: str) -> Optional[str]:
+    """Cancel, pause or resume one job; returns its new status, or None when the action does not apply
+
+    Pending and paused jobs change right away. A running translate_file job
+    only gets the request in its control column: its worker stops the job at
+    the next stage or chunk boundary and finishes it as paused or cancelled
+    (the returned status stays 'processing' until then). Other running tasks
+    cannot be interrupted.
+    """
+    if action not in CONTROL_TRANSITIONS:
+        raise ValueError(f"Unknown job action: {action}")
+    job = session.get(TranslationJob, job_id)
+    if job is None:
+        return None
+
+    now = datetime.utcnow()
+    status = CONTROL_TRANSITIONS[action].get(job.status)
+    if status:
+        values = {'status': status, 'updated_at': now}
+        if status == 'cancelled':
+            values['completed_at'] = now
+        if status == 'pending':
+            values['error_message'] = None
+        updated = session.query(TranslationJob).filter(
+            TranslationJob.id == job_id,
+            TranslationJob.status == job.status
+        ).update(values, synchronize_session=False)
+        session.commit()
+        return status if updated else None
+
+    if action in CONTROL_STATUSES and job.status == 'processing' and job.task_type == 'translate_file':
+        updated = session.query(TranslationJob).filter(
+            TranslationJob.id == job_id,
+            TranslationJob.status == 'processing'
+        ).update({'control': action, 'updated_at': now}, synchronize_session=False)
+        session.commit()
+        return 'processing' if updated else None
+    return None
+
+def pending_controls(session, owner: str, job_ids: Iterable[int]) -> Dict[int, str]:
+    """Cancel or pause requests for running jobs this owner holds"""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return {}
+    return {
+        job_id: control
+        for job_id, control in session.query(TranslationJob.id, TranslationJob.control).filter(
+            TranslationJob.id.in_(job_ids),
+            TranslationJob.lease_owner == owner,
+            TranslationJob.control.isnot(None)
+        )
+    }
+
+def pause_queue(session) -> Dict[str, int]:
+    """Pause every queued translation: pending ones now, running ones at their next boundary
+
+    Library sync and scan tasks are left alone.
+    """
+    now = datetime.utcnow()
+    paused = session.query(TranslationJob).filter(
+        TranslationJob.task_type == 'translate_file',
+        TranslationJob.status == 'pending'
+    ).update({'status': 'paused', 'updated_at': now}, synchronize_session=False)
+    pausing = session.query(TranslationJob).filter(
+        TranslationJob.task_type == 'translate_file',
+        TranslationJob.status == 'processing'
+    ).update({'control': 'pause', 'updated_at': now}, synchronize_session=False)
+    session.commit()
+    return {'paused': paused, 'pausing': pausing}
+
+def update_progress(session, job_id: int, owner: str, progress: float):
+    session.query(TranslationJob).filter(
+        TranslationJob.id == job_id,
+        TranslationJob.lease_owner == owner
+    ).update({'progress': progress, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    session.commit()
+
+def finish_job(session, job_id: int, owner: str, status: str, error: Optional[str] = None) -> bool:
+    """Record the outcome and drop the lease; False when the lease had already been lost
+
+    A paused job does not use up an attempt and is not completed.
+    """
+    now = datetime.utcnow()
+    values = {
+        'status': status,
+        'control': None,
+        'lease_owner': None,
+        'lease_expires_at': None,
+        'completed_at': now,
+        'updated_at': now
+    }
+    if error is not None:
+        values['error_message'] = error
+    if status == 'completed':
+        values['progress'] = 100.0
+    if status == 'paused':
+        values['completed_at'] = None
+        values['attempts'] = func.coalesce(TranslationJob.attempts, 1) - 1
+    updated = session.query(TranslationJob).filter(
+        TranslationJob.id == job_id,
+        TranslationJob.lease_owner == owner
+    ).update(values, synchronize_session=False)
+    session.commit()
+    return bool(updated)
+
+def release_job(session, job_id: int, owner: str) -> bool:
+    """Put a claimed job back in the queue without counting the attempt (worker shutdown)"""
+    updated = session.query(TranslationJob).filter(
+        TranslationJob.id == job_id,
+        TranslationJob.lease_owner == owner,
+        TranslationJob.status == 'processing'
+    ).update({
+        'status': 'pending',
+        'lease_owner': None,
+        'lease_expires_at': None,
+        'attempts': func.coalesce(TranslationJob.attempts, 1) - 1,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    session.commit()
+    return bool(updated)
+
+def recover_expired(session, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Dict[str, int]:
+    """Requeue jobs whose lease expired (their worker died); fail those out of attempts
+
+    A job that was asked to pause or cancel ends that way instead.
+    """
+    now = datetime.utcnow()
+    stats = {'requeued': 0, 'failed': 0}
+    expired = session.query(TranslationJob.id, TranslationJob.attempts, TranslationJob.lease_owner,
+                            TranslationJob.control).filter(
+        TranslationJob.status == 'processing',
+        TranslationJob.lease_expires_at < now
+    ).all()
+
+    for job_id, attempts, owner, control in expired:
+        if control in CONTROL_STATUSES:
+            values = {'status': CONTROL_STATUSES[control], 'control': None}
+        elif (attempts or 0) >= max_attempts:
+            values = {'status': 'failed', 'error_message': f"Worker lease expired after {attempts} attempts"}
+        else:
+            values = {'status': 'pending'}
+        values.update({'lease_owner': None, 'lease_expires_at': None, 'updated_at': now})
+        # Same condition again: the owner may have renewed since the select
+        updated = session.query(TranslationJob).filter(
+            TranslationJob.id == job_id,
+            TranslationJob.status == 'processing',
+            TranslationJob.lease_expires_at < now
+        ).update(values, synchronize_session=False)
+        if updated:
+            key = 'requeued' if values['status'] == 'pending' else values['status']
+            stats[key] = stats.get(key, 0) + 1
+            logger.warning(f"Lease of job {job_id} held by {owner} expired; {values['status']}")
+    session.commit()
+    return stats
+
+def queue_status(session) -> Dict:
+    """Job counts per task class and status"""
+    counts = {}
+    rows = session.query(TranslationJob.task_type, TranslationJob.status, func.count(TranslationJob.id)) \
+        .filter(TranslationJob.task_type.isnot(None)) \
+        .group_by(TranslationJob.task_type, TranslationJob.status).all()
+    for task_type, status, count in rows:
+        task_class = TASK_CLASSES.get(task_type, 'other')
+        counts.setdefault(task_class, {})
+        counts[task_class][status] = counts[task_class].get(status, 0) + count
+    return counts
@@ -0,0 +1,216 @@
+"""
+Media Probing for AI Translator
+فحص ملفات الوسائط بأداة ffprobe
+
+Runs ffprobe across the library on a bounded process pool and fills the
+duration/codec/resolution/size columns of MediaFile in bulk. Results are cached
+by (device, inode, size, mtime) so an unchanged file is never probed twice.
+"""
+
+import json
+import logging
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from models import MediaFile, MediaProbeCache
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_BATCH_SIZE = 500
+WRITE_BATCH_SIZE = 200
+PROBE_TIMEOUT = 120
+
+def file_key(path: str) -> Optional[tuple]:
+    """(cache key, size) for a file, or None when it cannot be stat'ed"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}", stat.st_size
+
+def summarize_probe(info: Dict) -> Dict:
+    """Reduce ffprobe JSON to the MediaFile columns plus a compact stream list"""
+    streams = info.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not (s.get('disposition') or {}).get('attached_pic')), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+    duration = (info.get('format') or {}).get('duration')
+    if duration is None and video:
+        duration = video.get('duration')
+    try:
+        duration = int(round(float(duration)))
+    except (TypeError, ValueError):
+        duration = None
+
+    resolution = None
+    if video and video.get('width') and video.get('height'):
+        resolution = f"{video['width']}x{video['height']}"
+
+    summary = []
+    for stream in streams:
+        if stream.get('codec_type') not in ('audio', 'subtitle'):
+            continue
+        disposition = stream.get('disposition') or {}
+        tags = stream.get('tags') or {}
+        summary.append({
+            'index': stream.get('index'),
+            'type': stream.get('codec_type'),
+            'codec': stream.get('codec_name'),
+            'language': tags.get('language'),
+            'title': tags.get('title'),
+            'channels': stream.get('channels'),
+            'default': bool(disposition.get('default')),
+            'forced': bool(disposition.get('forced'))
+        })
+
+    return {
+        'duration': duration,
+        'video_codec': video.get('codec_name') if video else None,
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'resolution': resolution,
+        'streams': summary
+    }
+
+def probe_file(path: str) -> Dict:
+    """ffprobe one file; runs inside the pool processes"""
+    cmd = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+        if result.returncode != 0:
+            return {'error': result.stderr.strip()[:500] or f"ffprobe exited with {result.returncode}"}
+        return summarize_probe(json.loads(result.stdout or '{}'))
+    except subprocess.TimeoutExpired:
+        return {'error': f"ffprobe timed out after {PROBE_TIMEOUT}s"}
+    except (OSError, ValueError) as e:
+        return {'error': str(e)}
+
+def default_process_count() -> int:
+    # ffprobe is mostly I/O bound; more processes than this only thrash the disks
+    return max(1, min(8, os.cpu_count() or 1))
+
+def _load_cache(session, keys: List[str]) -> Dict[str, MediaProbeCache]:
+    cached = {}
+    for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        batch = keys[start:start + LOOKUP_BATCH_SIZE]
+        for entry in session.query(MediaProbeCache).filter(MediaProbeCache.file_key.in_(batch)):
+            cached[entry.file_key] = entry
+    return cached
+
+def _columns(result: Dict, size: int) -> Dict:
+    return {
+        'duration': result.get('duration'),
+        'video_codec': result.get('video_codec'),
+        'audio_codec': result.get('audio_codec'),
+        'resolution': result.get('resolution'),
+        'file_size': size
+    }
+
+def probe_media_library(session, paths: Optional[Iterable[str]] = None, processes: Optional[int] = None,
+                        on_progress: Optional[Callable] = None, local_path: Optional[Callable] = None) -> Dict:
+    """Fill MediaFile probe columns for the library (or only the given paths)
+
+    Cache hits are applied without running ffprobe. on_progress(done, total)
+    is called as probes complete. local_path maps a library path to where this
+    host mounts it (worker hosts, see utils.path_mapping). Returns counters
+    for logging.
+    """
+    local_path = local_path or (lambda path: path)
+    query = session.query(MediaFile.id, MediaFile.path, MediaFile.duration, MediaFile.video_codec,
+                          MediaFile.audio_codec, MediaFile.resolution, MediaFile.file_size)
+    if paths is not None:
+        paths = list(paths)
+        if not paths:
+            return {'files': 0, 'cached': 0, 'probed': 0, 'failed': 0, 'updated': 0, 'missing': 0}
+        query = query.filter(MediaFile.path.in_(paths))
+    rows = query.all()
+
+    stats = {'files': len(rows), 'cached': 0, 'probed': 0, 'failed': 0, 'updated': 0, 'missing': 0}
+    keyed = []
+    for row in rows:
+        identity = file_key(local_path(row.path))
+        if identity is None:
+            stats['missing'] += 1
+            continue
+        keyed.append((row, identity[0], identity[1]))
+
+    cache = _load_cache(session, [key for _, key, _ in keyed])
+    updates = []
+
+    def queue_update(row, columns):
+        current = {name: getattr(row, name) for name in columns}
+        if current != columns:
+            updates.append(dict(columns, id=row.id, updated_at=datetime.utcnow()))
+
+    def flush(new_entries):
+        if new_entries:
+            session.bulk_insert_mappings(MediaProbeCache, new_entries)
+        if updates:
+            session.bulk_update_mappings(MediaFile, updates)
+            stats['updated'] += len(updates)
+            updates.clear()
+        session.commit()
+
+    to_probe = []
+    for row, key, size in keyed:
+        entry = cache.get(key)
+        if entry is None:
+            to_probe.append((row, key, size))
+        elif not entry.error:
+            stats['cached'] += 1
+            queue_update(row, _columns({c: getattr(entry, c) for c in ('duration', 'video_codec', 'audio_codec',
+                                                                       'resolution')}, size))
+        else:
+            # A file that failed before is not retried until it changes
+            stats['cached'] += 1
+    flush([])
+
+    if to_probe:
+        processes = max(1, min(processes or default_process_count(), len(to_probe)))
+        logger.info(f"Probing {len(to_probe)} media files with {processes} processes")
+        new_entries = []
+        seen_keys = set()
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = pool.map(probe_file, [local_path(row.path) for row, _, _ in to_probe], chunksize=4)
+            for done, ((row, key, size), result) in enumerate(zip(to_probe, results), 1):
+                if 'error' in result:
+                    stats['failed'] += 1
+                else:
+                    stats['probed'] += 1
+                    queue_update(row, _columns(result, size))
+                # Hard links share an inode, so the same key can appear twice
+                if key not in seen_keys:
+                    seen_keys.add(key)
+                    new_entries.append(dict(
+                        _columns(result, size),
+                        file_key=key,
+                        path=row.path,
+                        streams=json.dumps(result.get('streams', []), ensure_ascii=False),
+                        error=result.get('error'),
+                        probed_at=datetime.utcnow()
+                    ))
+                if len(new_entries) >= WRITE_BATCH_SIZE:
+                    flush(new_entries)
+                    new_entries = []
+                if on_progress:
+                    on_progress(done, len(to_probe))
+        flush(new_entries)
+
+    logger.info(f"Media probe finished: {stats}")
+    return stats
+
+def get_cached_streams(session, path: str) -> Optional[List[Dict]]:
+    """Audio/subtitle stream summary for a file from the probe cache, if it is current"""
+    identity = file_key(path)
+    if identity is None:
+        return None
+    entry = session.query(MediaProbeCache).filter_by(file_key=identity[0]).first()
+    if entry is None or entry.error or not entry.streams:
+        return None
+    try:
+        return json.loads(entry.streams)
+    except ValueError:
+        return None
@@ -0,0 +1,532 @@
+"""
+Ollama Client for AI Translator
+عميل Ollama للترجمان الآلي
+
+One pooled, keep-alive HTTP session per Ollama server, explicit model
+keep_alive so the model stays resident between files, a warm-up call before
+batches, and a short-lived cache of /api/tags for the model check endpoints.
+OllamaPool spreads translation requests over several servers.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLLAMA_URL = 'http://localhost:11434'
+DEFAULT_KEEP_ALIVE = '30m'
+
+class OllamaError(Exception):
+    """Raised when an Ollama request fails or returns an unexpected payload
+
+    partial holds any text a streaming request produced before it failed.
+    """
+
+    def __init__(self, message, partial=''):
+        super().__init__(message)
+        self.partial = partial
+
+class OllamaCancelled(OllamaError):
+    """Raised when a streaming request is abandoned by its caller"""
+
+def split_ollama_urls(value: Optional[str]) -> List[str]:
+    """ollama_api_url may list several servers separated by commas or newlines"""
+    return [url.strip() for url in re.split(r'[,\n]', value or '') if url.strip()]
+
+def normalize_base_url(url: Optional[str]) -> str:
+    """Accept either a server URL or an endpoint URL (…/api/generate) and return the server URL
+
+    When given a list of servers, the first one is used.
+    """
+    urls = split_ollama_urls(url)
+    url = (urls[0] if urls else DEFAULT_OLLAMA_URL).rstrip('/')
+    for suffix in ('/api/generate', '/api/chat', '/api/tags', '/api'):
+        if url.endswith(suffix):
+            url = url[:-len(suffix)]
+            break
+    return url or DEFAULT_OLLAMA_URL
+
+def resolve_ollama_url(settings: Dict) -> str:
+    """Server URL from settings (ollama_api_url takes precedence over ollama_url)"""
+    return normalize_base_url(settings.get('ollama_api_url') or settings.get('ollama_url'))
+
+def resolve_ollama_urls(settings: Dict) -> List[str]:
+    """Every configured server URL, de-duplicated and in configured order"""
+    urls = []
+    for url in split_ollama_urls(settings.get('ollama_api_url') or settings.get('ollama_url')):
+        url = normalize_base_url(url)
+        if url not in urls:
+            urls.append(url)
+    return urls or [DEFAULT_OLLAMA_URL]
+
+class OllamaClient:
+    """Thread-safe client for a single Ollama server"""
+
+    def __init__(self, base_url: str = DEFAULT_OLLAMA_URL, keep_alive=DEFAULT_KEEP_ALIVE,
+                 pool_size: int = 16, tags_ttl: float = 30.0):
+        self.base_url = normalize_base_url(base_url)
+        self.keep_alive = keep_alive
+        self.tags_ttl = tags_ttl
+        self._tags_cache = None
+        self._tags_cached_at = 0.0
+        self._tags_lock = threading.Lock()
+        self._warm_models = set()
+        self._context_lengths = {}
+        self._loaded_cache = set()
+        self._loaded_cached_at = 0.0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def generate(self, model: str, prompt: str, options: Optional[Dict] = None,
+                 timeout: float = 300, cancel_event: Optional[threading.Event] = None, **extra) -> Dict:
+        """Non-streaming /api/generate; returns the full JSON result
+
+        With a cancel_event the reply is read as a stream internally, so
+        setting the event closes the connection and stops the generation.
+        """
+        if cancel_event is not None:
+            return self.generate_stream(model, prompt, options, inactivity_timeout=timeout,
+                                        cancel_event=cancel_event, **extra)
+        payload = {
+            'model': model,
+            'prompt': prompt,
+            'stream': False,
+            'keep_alive': self.keep_alive,
+        }
+        if options:
+            payload['options'] = options
+        payload.update(extra)
+
+        try:
+            response = self.session.post(self._url('/api/generate'), json=payload, timeout=timeout)
+            response.raise_for_status()
+            result = response.json()
+        except requests.exceptions.Timeout:
+            raise OllamaError("Ollama API request timed out")
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"Ollama API request failed: {str(e)}")
+        except ValueError as e:
+            raise OllamaError(f"Invalid JSON from Ollama: {str(e)}")
+
+        if 'response' not in result:
+            raise OllamaError("No response field in Ollama API result")
+        self._warm_models.add(model)
+        return result
+
+    def chat(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+             timeout: float = 300, cancel_event: Optional[threading.Event] = None, **extra) -> Dict:
+        """Non-streaming /api/chat; the reply text is also returned under 'response'
+
+        Keeping the system message identical across requests lets Ollama reuse
+        the already evaluated prompt prefix from its KV cache. A cancel_event
+        works as for generate().
+        """
+        if cancel_event is not None:
+            result = self.chat_stream(model, messages, options, inactivity_timeout=timeout,
+                                      cancel_event=cancel_event, **extra)
+            result['message'] = {'role': 'assistant', 'content': result['response']}
+            return result
+        payload = {
+            'model': model,
+            'messages': messages,
+            'stream': False,
+            'keep_alive': self.keep_alive,
+        }
+        if options:
+            payload['options'] = options
+        payload.update(extra)
+
+        try:
+            response = self.session.post(self._url('/api/chat'), json=payload, timeout=timeout)
+            response.raise_for_status()
+            result = response.json()
+        except requests.exceptions.Timeout:
+            raise OllamaError("Ollama API request timed out")
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"Ollama API request failed: {str(e)}")
+        except ValueError as e:
+            raise OllamaError(f"Invalid JSON from Ollama: {str(e)}")
+
+        if 'message' not in result:
+            raise OllamaError("No message field in Ollama API result")
+        result['response'] = result['message'].get('content', '')
+        self._warm_models.add(model)
+        return result
+
+    def generate_stream(self, model: str, prompt: str, options: Optional[Dict] = None, **kwargs) -> Dict:
+        """Streaming /api/generate (see _stream for timeouts, on_token and cancel_event)"""
+        return self._stream('/api/generate', {'model': model, 'prompt': prompt}, options,
+                            lambda data: data.get('response', ''), **kwargs)
+
+    def chat_stream(self, model: str, messages: List[Dict], options: Optional[Dict] = None, **kwargs) -> Dict:
+        """Streaming /api/chat (see _stream for timeouts, on_token and cancel_event)"""
+        return self._stream('/api/chat', {'model': model, 'messages': messages}, options,
+                            lambda data: (data.get('message') or {}).get('content', ''), **kwargs)
+
+    def _stream(self, path: str, payload: Dict, options: Optional[Dict], extract_token,
+                inactivity_timeout: float = 120, connect_timeout: float = 10,
+                on_token=None, cancel_event: Optional[threading.Event] = None, **extra) -> Dict:
+        """Read one of Ollama's NDJSON token streams
+
+        The request only times out when no bytes arrive for inactivity_timeout
+        seconds, so slow but productive generations are never cut off. on_token
+        is called with each text fragment as it arrives. Setting cancel_event
+        closes the connection, which makes Ollama stop generating. Returns the
+        final stream object (with timing counters) and the full text in 'response'.
+        """
+        payload = dict(payload, stream=True, keep_alive=self.keep_alive)
+        if options:
+            payload['options'] = options
+        payload.update(extra)
+
+        pieces = []
+        try:
+            # requests applies the read timeout between received chunks, not to the whole body
+            with self.session.post(self._url(path), json=payload, stream=True,
+                                   timeout=(connect_timeout, inactivity_timeout)) as response:
+                response.raise_for_status()
+                finished = threading.Event()
+                if cancel_event is not None:
+                    self._close_on_cancel(response, cancel_event, finished)
+                try:
+                    final = self._read_stream(response, pieces, extract_token, on_token, cancel_event)
+                finally:
+                    finished.set()
+        except OllamaError:
+            raise
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            if cancel_event is not None and cancel_event.is_set():
+                raise OllamaCancelled("Ollama request cancelled", ''.join(pieces))
+            if pieces:
+                raise OllamaError(f"Ollama stream stalled for {inactivity_timeout}s", ''.join(pieces))
+            raise OllamaError(f"Ollama API request failed: {str(e)}")
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"Ollama API request failed: {str(e)}", ''.join(pieces))
+        except ValueError as e:
+            raise OllamaError(f"Invalid JSON in Ollama stream: {str(e)}", ''.join(pieces))
+        except Exception:
+            # Closing the response from the cancel watcher can surface as assorted socket errors
+            if cancel_event is not None and cancel_event.is_set():
+                raise OllamaCancelled("Ollama request cancelled", ''.join(pieces))
+            raise
+
+        self._warm_models.add(payload['model'])
+        final['response'] = ''.join(pieces)
+        return final
+
+    @staticmethod
+    def _read_stream(response, pieces: List[str], extract_token, on_token, cancel_event) -> Dict:
+        for line in response.iter_lines():
+            if cancel_event is not None and cancel_event.is_set():
+                raise OllamaCancelled("Ollama request cancelled", ''.join(pieces))
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get('error'):
+                raise OllamaError(f"Ollama error: {data['error']}", ''.join(pieces))
+            token = extract_token(data)
+            if token:
+                pieces.append(token)
+                if on_token:
+                    on_token(token)
+            if data.get('done'):
+                return data
+        return {}
+
+    @staticmethod
+    def _close_on_cancel(response, cancel_event: threading.Event, finished: threading.Event):
+        """Close the response from a watcher thread so a blocked read returns promptly"""
+        def watch():
+            while not finished.is_set():
+                if cancel_event.wait(0.5):
+                    if not finished.is_set():
+                        response.close()
+                    return
+
+        threading.Thread(target=watch, name="ollama-cancel-watch", daemon=True).start()
+
+    def warm_up(self, model: str, timeout: float = 600) -> bool:
+        """Load the model and pin it with keep_alive (an empty prompt only loads weights)"""
+        started = time.time()
+        try:
+            response = self.session.post(self._url('/api/generate'), json={
+                'model': model,
+                'keep_alive': self.keep_alive,
+            }, timeout=timeout)
+            response.raise_for_status()
+            self._warm_models.add(model)
+            logger.info(f"Ollama model {model} warmed up in {time.time() - started:.1f}s")
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Ollama warm-up for {model} failed: {e}")
+            return False
+
+    def warm_up_async(self, model: str) -> threading.Thread:
+        """Warm the model in the background so loading overlaps other work"""
+        thread = threading.Thread(target=self.warm_up, args=(model,), name=f"ollama-warmup-{model}", daemon=True)
+        thread.start()
+        return thread
+
+    def list_models(self, force: bool = False, timeout: float = 5) -> List[Dict]:
+        """Installed models from /api/tags, cached for tags_ttl seconds"""
+        with self._tags_lock:
+            if not force and self._tags_cache is not None and time.time() - self._tags_cached_at < self.tags_ttl:
+                return self._tags_cache
+
+            try:
+                response = self.session.get(self._url('/api/tags'), timeout=timeout)
+                response.raise_for_status()
+                models = response.json().get('models', [])
+            except requests.exceptions.RequestException as e:
+                raise OllamaError(f"Ollama not reachable: {str(e)}")
+            except ValueError as e:
+                raise OllamaError(f"Invalid JSON from Ollama: {str(e)}")
+
+            self._tags_cache = models
+            self._tags_cached_at = time.time()
+            return models
+
+    def model_context_length(self, model: str, timeout: float = 10) -> Optional[int]:
+        """Trained context window of a model from /api/show (cached per model)"""
+        if model in self._context_lengths:
+            return self._context_lengths[model]
+
+        try:
+            response = self.session.post(self._url('/api/show'), json={'model': model}, timeout=timeout)
+            response.raise_for_status()
+            info = response.json().get('model_info') or {}
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"Ollama /api/show failed: {str(e)}")
+        except ValueError as e:
+            raise OllamaError(f"Invalid JSON from Ollama: {str(e)}")
+
+        # Keys are prefixed with the architecture, e.g. "llama.context_length"
+        length = next((int(value) for key, value in info.items() if key.endswith('.context_length')), None)
+        self._context_lengths[model] = length
+        return length
+
+    def loaded_models(self, ttl: float = 15, timeout: float = 3) -> set:
+        """Names of models currently resident on the server (/api/ps, cached for ttl seconds)"""
+        if time.time() - self._loaded_cached_at < ttl:
+            return self._loaded_cache | self._warm_models
+
+        try:
+            response = self.session.get(self._url('/api/ps'), timeout=timeout)
+            response.raise_for_status()
+            loaded = {model.get('name') for model in response.json().get('models', [])}
+        except (requests.exceptions.RequestException, ValueError):
+            loaded = set()
+        self._loaded_cache = loaded
+        self._loaded_cached_at = time.time()
+        return loaded | self._warm_models
+
+    def invalidate_tags(self):
+        """Forget cached /api/tags (for example after pulling a model)"""
+        with self._tags_lock:
+            self._tags_cache = None
+
+    def is_available(self) -> bool:
+        try:
+            self.list_models()
+            return True
+        except OllamaError:
+            return False
+
+class PoolEndpoint:
+    """Dispatch bookkeeping for one server in an OllamaPool"""
+
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def status(self) -> Dict:
+        return {
+            'url': self.client.base_url,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+            'healthy': self.is_healthy(time.time())
+        }
+
+class OllamaPool:
+    """Spreads requests over several Ollama servers
+
+    Dispatch picks the endpoint with the fewest outstanding requests, counting
+    an endpoint that does not have the model loaded as LOAD_PENALTY requests
+    busier. Endpoints are ejected after FAILURE_THRESHOLD consecutive failures
+    for an exponentially growing period (passive health tracking); when every
+    endpoint is ejected, all of them are tried again.
+    """
+
+    LOAD_PENALTY = 2
+    FAILURE_THRESHOLD = 3
+    BASE_EJECTION = 30.0
+    MAX_EJECTION = 300.0
+
+    def __init__(self, clients: List[OllamaClient]):
+        self.endpoints = [PoolEndpoint(client) for client in clients]
+        self.lock = threading.Lock()
+
+    def _acquire(self, model: str, exclude=()) -> PoolEndpoint:
+        now = time.time()
+        candidates = [e for e in self.endpoints if e not in exclude] or list(self.endpoints)
+        healthy = [e for e in candidates if e.is_healthy(now)] or candidates
+        # /api/ps is cached per client, so this stays cheap on the dispatch path
+        loaded = {id(e): self._has_model(e.client, model) for e in healthy} if len(healthy) > 1 else {}
+        with self.lock:
+            endpoint = min(healthy, key=lambda e: (
+                e.outstanding + (0 if loaded.get(id(e), True) else self.LOAD_PENALTY),
+                e.consecutive_failures
+            ))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+        return endpoint
+
+    @staticmethod
+    def _has_model(client: OllamaClient, model: str) -> bool:
+        loaded = client.loaded_models()
+        # /api/ps reports tagged names ("llama3:latest") while settings often omit the tag
+        return model in loaded or (':' not in model and f"{model}:latest" in loaded)
+
+    def _release(self, endpoint: PoolEndpoint, success: bool):
+        with self.lock:
+            endpoint.outstanding -= 1
+            if success:
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = 0.0
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            excess = endpoint.consecutive_failures - self.FAILURE_THRESHOLD
+            if excess >= 0:
+                duration = min(self.MAX_EJECTION, self.BASE_EJECTION * (2 ** excess))
+                endpoint.ejected_until = time.time() + duration
+                logger.warning(f"Ejecting Ollama endpoint {endpoint.client.base_url} for {duration:.0f}s "
+                               f"after {endpoint.consecutive_failures} consecutive failures")
+
+    def _call(self, model: str, request, avoid: Optional[List[str]] = None):
+        """Run request(client) on the best endpoint, retrying once elsewhere if nothing was produced
+
+        avoid lists the URLs of servers already working on the same request (a
+        hedged duplicate goes elsewhere when it can); the URL used is added to it.
+        """
+        tried = []
+        busy = [e for e in self.endpoints if avoid and e.client.base_url in avoid]
+        while True:
+            endpoint = self._acquire(model, exclude=tried + busy)
+            tried.append(endpoint)
+            if avoid is not None:
+                avoid.append(endpoint.client.base_url)
+            try:
+                result = request(endpoint.client)
+            except OllamaCancelled:
+                # Abandoned by the caller; says nothing about the endpoint's health
+                self._release(endpoint, True)
+                raise
+            except OllamaError as e:
+                self._release(endpoint, False)
+                # Output already handed to the caller cannot be replayed on another server
+                if e.partial or len(tried) >= min(2, len(self.endpoints)):
+                    raise
+                logger.warning(f"Ollama endpoint {endpoint.client.base_url} failed ({e}), retrying on another")
+                continue
+            self._release(endpoint, True)
+            return result
+
+    def generate(self, model: str, prompt: str, options: Optional[Dict] = None,
+                 timeout: float = 300, avoid: Optional[List[str]] = None, **extra) -> Dict:
+        return self._call(model, lambda client: client.generate(model, prompt, options, timeout, **extra), avoid)
+
+    def generate_stream(self, model: str, prompt: str, options: Optional[Dict] = None,
+                        avoid: Optional[List[str]] = None, **kwargs) -> Dict:
+        return self._call(model, lambda client: client.generate_stream(model, prompt, options, **kwargs), avoid)
+
+    def chat(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+             timeout: float = 300, avoid: Optional[List[str]] = None, **extra) -> Dict:
+        return self._call(model, lambda client: client.chat(model, messages, options, timeout, **extra), avoid)
+
+    def chat_stream(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                    avoid: Optional[List[str]] = None, **kwargs) -> Dict:
+        return self._call(model, lambda client: client.chat_stream(model, messages, options, **kwargs), avoid)
+
+    def model_context_length(self, model: str) -> Optional[int]:
+        """Smallest context window reported by any reachable endpoint"""
+        lengths = []
+        for endpoint in self.endpoints:
+            try:
+                length = endpoint.client.model_context_length(model)
+            except OllamaError:
+                continue
+            if length:
+                lengths.append(length)
+        return min(lengths) if lengths else None
+
+    def warm_up_async(self, model: str) -> List[threading.Thread]:
+        """Load the model on every healthy endpoint"""
+        now = time.time()
+        return [e.client.warm_up_async(model) for e in self.endpoints if e.is_healthy(now)]
+
+    def status(self) -> List[Dict]:
+        with self.lock:
+            return [endpoint.status() for endpoint in self.endpoints]
+
+def parse_keep_alive(value) -> object:
+    """Ollama accepts durations ("30m") or seconds as a number (-1 keeps the model loaded)"""
+    value = str(value or DEFAULT_KEEP_ALIVE).strip()
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return value
+
+_clients: Dict[str, OllamaClient] = {}
+_clients_lock = threading.Lock()
+
+def get_ollama_client(url: Optional[str] = None, settings: Optional[Dict] = None) -> OllamaClient:
+    """Shared client per server URL so connections are pooled process-wide
+
+    A caller that passes ollama_keep_alive updates the shared client, so a
+    changed setting applies from the next request on.
+    """
+    settings = settings or {}
+    base_url = normalize_base_url(url) if url else resolve_ollama_url(settings)
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = OllamaClient(base_url, keep_alive=parse_keep_alive(settings.get('ollama_keep_alive')))
+            _clients[base_url] = client
+        elif settings.get('ollama_keep_alive'):
+            client.keep_alive = parse_keep_alive(settings['ollama_keep_alive'])
+        return client
+
+_pools: Dict[tuple, OllamaPool] = {}
+
+def get_ollama_pool(settings: Optional[Dict] = None) -> OllamaPool:
+    """Shared pool over every server listed in ollama_api_url"""
+    settings = settings or {}
+    urls = tuple(resolve_ollama_urls(settings))
+    # Also refreshes keep_alive on clients the pool already holds
+    clients = [get_ollama_client(url, settings) for url in urls]
+    with _clients_lock:
+        pool = _pools.get(urls)
+        if pool is None:
+            pool = _pools[urls] = OllamaPool(clients)
+    return pool
@@ -0,0 +1,215 @@
+"""
+Staged Processing Pipeline for AI Translator
+خط المعالجة متعدد المراحل للترجمان الآلي
+
+Each stage owns a bounded input queue and a pool of worker threads, so while
+one file is being translated the next file can already be extracted and
+transcribed. Full queues block the previous stage, which keeps temporary audio
+and memory use bounded.
+
+run() processes a fixed list of jobs; a long-running worker calls start() once
+and hands jobs over one at a time with submit().
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from services.cancellation import CancelToken, JobCancelled
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class PipelineJob:
+    """Base class for items flowing through a pipeline"""
+
+    def __init__(self):
+        self.done = False
+        self.success = False
+        self.error = None
+        self.current_stage = None
+        self.stage_times: Dict[str, float] = {}
+        # Counters and timings reported by stages (chunks, hedges, ...)
+        self.metrics: Dict[str, float] = {}
+        # Set to cancel or pause this job alone; 'cancel' or 'pause' once it stopped that way
+        self.cancel_token = CancelToken()
+        self.cancelled = None
+
+    def finish(self, success: bool = True):
+        """Stop the job after the current stage"""
+        self.done = True
+        self.success = success
+
+    def fail(self, error):
+        self.error = str(error)
+        self.finish(False)
+
+    def cancel(self, action: str = 'cancel'):
+        """Stop the job after a cancel or pause; work the stages checkpointed is kept"""
+        self.cancelled = action
+        self.error = 'Paused' if action == 'pause' else 'Cancelled'
+        self.finish(False)
+
+class PipelineStage:
+    """A named processing step with its own worker count and queue depth"""
+
+    def __init__(self, name: str, handler: Callable, workers: int = 1, queue_size: int = 2):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def status(self) -> Dict:
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'queued': self.queue.qsize(),
+            'active': self.active,
+            'processed': self.processed,
+            'failed': self.failed
+        }
+
+class PipelineEngine:
+    """Runs jobs through an ordered list of stages with per-stage concurrency"""
+
+    def __init__(self, stages: List[PipelineStage], on_finished: Optional[Callable] = None,
+                 on_stage: Optional[Callable] = None):
+        self.stages = stages
+        self.on_finished = on_finished
+        # on_stage(job, number, name) is called before each stage handles a job
+        self.on_stage = on_stage
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.total = 0
+        self.finished = 0
+        self.succeeded = 0
+        self.condition = threading.Condition()
+
+    def status(self) -> Dict:
+        return {
+            'total': self.total,
+            'finished': self.finished,
+            'succeeded': self.succeeded,
+            'stages': {stage.name: stage.status() for stage in self.stages}
+        }
+
+    def stop(self):
+        """Stop feeding new jobs; jobs already inside stages run to completion"""
+        self.stop_event.set()
+
+    def _complete(self, job: PipelineJob):
+        if self.on_finished:
+            try:
+                self.on_finished(job)
+            except Exception as e:
+                logger.error(f"Pipeline on_finished callback failed: {e}")
+        with self.condition:
+            self.finished += 1
+            if job.success:
+                self.succeeded += 1
+            self.condition.notify_all()
+
+    def _worker(self, index: int):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            job = stage.queue.get()
+            if job is _STOP:
+                break
+
+            if self.on_stage:
+                try:
+                    self.on_stage(job, index, stage.name)
+                except Exception as e:
+                    logger.error(f"Pipeline on_stage callback failed: {e}")
+            with stage.lock:
+                stage.active += 1
+            job.current_stage = stage.name
+            started = time.time()
+            try:
+                job.cancel_token.check()
+                stage.handler(job)
+            except JobCancelled as e:
+                job.cancel(e.action)
+            except Exception as e:
+                logger.error(f"Pipeline stage {stage.name} failed: {e}")
+                job.fail(e)
+            finally:
+                job.stage_times[stage.name] = job.stage_times.get(stage.name, 0.0) + time.time() - started
+                with stage.lock:
+                    stage.active -= 1
+                    stage.processed += 1
+                    if job.done and not job.success:
+                        stage.failed += 1
+
+            if job.done or next_stage is None:
+                if not job.done:
+                    job.finish(True)
+                self._complete(job)
+            else:
+                # Blocks when the next stage is saturated (back-pressure)
+                next_stage.queue.put(job)
+
+    def _feed(self, jobs: List[PipelineJob]):
+        for job in jobs:
+            if self.stop_event.is_set():
+                job.fail("Pipeline stopped")
+                self._complete(job)
+                continue
+            self.stages[0].queue.put(job)
+
+    def start(self):
+        """Start the worker threads of every stage"""
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(index,),
+                                          name=f"pipeline-{stage.name}-{n}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, job: PipelineJob):
+        """Hand one job to a started pipeline (blocks while the first stage is saturated)"""
+        with self.condition:
+            self.total += 1
+        self.stages[0].queue.put(job)
+
+    def shutdown(self, timeout: float = 5):
+        """Stop the worker threads once the jobs already queued have passed them"""
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                stage.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+
+    def run(self, jobs: Iterable[PipelineJob], on_progress: Optional[Callable] = None,
+            progress_interval: float = 2.0) -> List[PipelineJob]:
+        """Process all jobs and return them once every job has left the pipeline"""
+        jobs = list(jobs)
+        self.total = len(jobs)
+        self.start()
+
+        feeder = threading.Thread(target=self._feed, args=(jobs,), name="pipeline-feeder", daemon=True)
+        feeder.start()
+
+        while True:
+            with self.condition:
+                if self.finished >= self.total:
+                    break
+                self.condition.wait(timeout=progress_interval)
+            if on_progress:
+                on_progress(self)
+        if on_progress:
+            on_progress(self)
+
+        self.shutdown()
+        return jobs
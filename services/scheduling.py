@@ -0,0 +1,154 @@
+"""
+Queue Scheduling for AI Translator
+سياسات جدولة قائمة انتظار الترجمة
+
+Decides which pending job a worker claims next. Every policy orders by
+effective priority first (the job's priority plus one level for each
+queue_aging_hours it has waited, so low-priority work still finishes), then
+by its own rule: oldest queued, newest added to the library, or shortest
+duration. Single-file "translate now" requests are queued at
+FAST_LANE_PRIORITY and are claimed at the next file boundary.
+
+Claims order the pending rows in SQL (sql_order) and fetch only the first
+few; order() applies the same rules in Python to lists outside the queue.
+"""
+
+import calendar
+import logging
+from collections import namedtuple
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import Integer, case, cast, extract, func, or_
+
+from models import MediaFile, TranslationJob
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE_PRIORITY = 100
+DEFAULT_AGING_HOURS = 24.0
+
+Candidate = namedtuple('Candidate', 'id priority created_at media_added duration')
+
+class SchedulingPolicy:
+    """Orders pending jobs; the smallest sort key is claimed first"""
+
+    name = 'priority'
+
+    def __init__(self, aging_hours: float = DEFAULT_AGING_HOURS):
+        self.aging_hours = aging_hours
+
+    def effective_priority(self, candidate: Candidate, now: datetime) -> float:
+        priority = candidate.priority or 0
+        if priority >= FAST_LANE_PRIORITY or not self.aging_hours or not candidate.created_at:
+            return priority
+        waited_hours = (now - candidate.created_at).total_seconds() / 3600
+        return priority + int(waited_hours / self.aging_hours)
+
+    def tie_break(self, candidate: Candidate):
+        return 0
+
+    def sort_key(self, candidate: Candidate, now: datetime):
+        return (-self.effective_priority(candidate, now), self.tie_break(candidate),
+                candidate.created_at or now, candidate.id)
+
+    def order(self, candidates: Iterable[Candidate], now: Optional[datetime] = None) -> List[Candidate]:
+        now = now or datetime.utcnow()
+        return sorted(candidates, key=lambda candidate: self.sort_key(candidate, now))
+
+    def effective_priority_sql(self, now: datetime):
+        """effective_priority as a SQL expression over translation_jobs"""
+        priority = func.coalesce(TranslationJob.priority, 0)
+        if not self.aging_hours:
+            return priority
+        step = max(1, int(self.aging_hours * 3600))
+        # Whole seconds waited; EXTRACT(epoch) reads naive timestamps as UTC on SQLite, PostgreSQL and DuckDB
+        waited = calendar.timegm(now.utctimetuple()) - cast(extract('epoch', TranslationJob.created_at), Integer)
+        # Whole aging levels without dialect-specific floor division
+        levels = (waited - waited % step) / step
+        return case(
+            (or_(priority >= FAST_LANE_PRIORITY, TranslationJob.created_at.is_(None), waited < 0), priority),
+            else_=priority + levels
+        )
+
+    def tie_break_sql(self) -> List:
+        return []
+
+    def sql_order(self, now: datetime) -> List:
+        """ORDER BY clauses matching sort_key (needs MediaFile joined)"""
+        return [self.effective_priority_sql(now).desc(), *self.tie_break_sql(),
+                TranslationJob.created_at, TranslationJob.id]
+
+class NewestFirstPolicy(SchedulingPolicy):
+    """Files most recently added to the library first (tonight's episode before the back catalogue)"""
+
+    name = 'newest'
+
+    def tie_break(self, candidate: Candidate):
+        return -candidate.media_added.timestamp() if candidate.media_added else 0
+
+    def tie_break_sql(self) -> List:
+        return [case((MediaFile.created_at.is_(None), 1), else_=0), MediaFile.created_at.desc()]
+
+class ShortestFirstPolicy(SchedulingPolicy):
+    """Shortest files first, which minimises the average wait; unknown durations go last"""
+
+    name = 'shortest'
+
+    def tie_break(self, candidate: Candidate):
+        return candidate.duration if candidate.duration else float('inf')
+
+    def tie_break_sql(self) -> List:
+        unknown = or_(MediaFile.duration.is_(None), MediaFile.duration == 0)
+        return [case((unknown, 1), else_=0), case((unknown, 0), else_=MediaFile.duration)]
+
+POLICIES = {
+    SchedulingPolicy.name: SchedulingPolicy,
+    NewestFirstPolicy.name: NewestFirstPolicy,
+    ShortestFirstPolicy.name: ShortestFirstPolicy,
+}
+
+def get_policy(settings: Dict) -> SchedulingPolicy:
+    """Policy selected by the queue_policy and queue_aging_hours settings"""
+    name = settings.get('queue_policy', 'priority')
+    if name not in POLICIES:
+        logger.warning(f"Unknown queue policy {name}, using priority")
+        name = 'priority'
+    try:
+        aging_hours = float(settings.get('queue_aging_hours', DEFAULT_AGING_HOURS))
+    except (TypeError, ValueError):
+        aging_hours = DEFAULT_AGING_HOURS
+    return POLICIES[name](max(0.0, aging_hours))
+
+def pending_candidates(session, task_types: List[str], policy: SchedulingPolicy, limit: int,
+                       now: Optional[datetime] = None) -> List[Candidate]:
+    """The first limit pending jobs in policy order, sorted by the database"""
+    rows = session.query(TranslationJob.id, TranslationJob.priority, TranslationJob.created_at,
+                         MediaFile.created_at, MediaFile.duration) \
+        .outerjoin(MediaFile, MediaFile.id == TranslationJob.media_file_id) \
+        .filter(TranslationJob.status == 'pending', TranslationJob.task_type.in_(task_types)) \
+        .order_by(*policy.sql_order(now or datetime.utcnow())).limit(limit).all()
+    return [Candidate(*row) for row in rows]
+
+def order_paths(session, paths: List[str], policy: SchedulingPolicy) -> List[str]:
+    """Order library paths by a policy (for runs that do not go through the queue)"""
+    rows = {row.path: row for row in session.query(MediaFile.id, MediaFile.path, MediaFile.created_at,
+                                                  MediaFile.duration).filter(MediaFile.path.in_(paths))}
+    candidates = []
+    for number, path in enumerate(paths):
+        row = rows.get(path)
+        candidates.append(Candidate(number, 0, None, row.created_at if row else None, row.duration if row else None))
+    return [paths[candidate.id] for candidate in policy.order(candidates)]
+
+def ensure_durations(session, paths: List[str], processes: Optional[int] = None, local_path=None) -> int:
+    """Probe files whose duration is still unknown (shortest-first needs it); returns how many were missing
+
+    local_path maps library paths to this host's mounts (see probe_media_library).
+    """
+    missing = [row[0] for row in session.query(MediaFile.path)
+               .filter(MediaFile.path.in_(paths), MediaFile.duration.is_(None))]
+    if missing:
+        from services.media_probe import probe_media_library
+        logger.info(f"Probing {len(missing)} files with unknown duration for shortest-first scheduling")
+        probe_media_library(session, paths=missing, processes=processes, local_path=local_path)
+    return len(missing)
@@ -0,0 +1,202 @@
+"""
+Segmented Transcription for AI Translator
+التفريغ الصوتي المجزأ على عدة عمليات
+
+Long files are cut at quiet points into segments with a small overlap, each
+segment is recognised by its own process (every process keeps one CPU model
+loaded), and the cues are stitched back with offsets applied and duplicates
+from the overlaps removed. This lowers the real-time factor on CPU-only hosts
+where one Whisper process cannot use every core.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from utils.srt import SubtitleCue
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+DEFAULT_SEGMENT_SECONDS = 300
+DEFAULT_OVERLAP_SECONDS = 2.0
+# Cut points are searched this far either side of the nominal segment boundary
+CUT_SEARCH_SECONDS = 10
+
+# Engine loaded once per pool process by _init_process
+_process_engine = None
+
+def _init_process(engine_name: str, model: str, device_index: int, cpu_threads: int, pid_queue=None):
+    global _process_engine
+    from services.whisper_engine import ENGINES
+
+    if pid_queue is not None:
+        # Lets the parent terminate this process when the job is cancelled
+        pid_queue.put(os.getpid())
+
+    _process_engine = ENGINES[engine_name](model, 'cpu', device_index, cpu_threads=cpu_threads)
+    _process_engine.load()
+
+def _transcribe_segment(audio_path: str, start: int, end: int, language: str,
+                        use_vad: bool) -> Tuple[List[Tuple[int, int, str]], int, int]:
+    """Recognise samples [start, end) of the WAV; returns (absolute cues, kept samples, total samples)"""
+    import numpy as np
+    from utils.vad import load_wav_memmap, SpeechGate
+
+    samples = np.asarray(load_wav_memmap(audio_path)[start:end], dtype=np.float32) / 32768.0
+    kept = len(samples)
+    if use_vad:
+        gate = SpeechGate()
+        cues = gate.remap_cues(_process_engine.transcribe_stream(gate.filter([samples]), language))
+        kept = gate.kept_samples
+    else:
+        cues = _process_engine.transcribe_samples(samples, language)
+
+    offset_ms = start * 1000 // SAMPLE_RATE
+    return [(cue.start + offset_ms, cue.end + offset_ms, cue.text) for cue in cues], kept, len(samples)
+
+def plan_segments(samples, segment_seconds: float = DEFAULT_SEGMENT_SECONDS) -> List[Tuple[int, int]]:
+    """Split the audio into (start, end) core ranges cut at the quietest point near each boundary"""
+    import numpy as np
+    from utils.audio_stream import find_quiet_cut
+
+    total = len(samples)
+    segment = int(segment_seconds * SAMPLE_RATE)
+    search = CUT_SEARCH_SECONDS * SAMPLE_RATE
+
+    ranges = []
+    position = 0
+    while total - position > segment + search:
+        window_start = position + segment - search
+        window = np.asarray(samples[window_start:position + segment + search], dtype=np.float32)
+        cut = window_start + find_quiet_cut(window, 0)
+        ranges.append((position, cut))
+        position = cut
+    ranges.append((position, total))
+    return ranges
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+def stitch_segments(ranges: List[Tuple[int, int]], results: List[List[Tuple[int, int, str]]]) -> List[SubtitleCue]:
+    """Merge per-segment cues into one timeline
+
+    Each segment owns the cues whose midpoint lies in its core range, so a line
+    recognised twice in an overlap is kept once; identical neighbouring lines
+    that still touch are merged.
+    """
+    cues = []
+    for number, ((start, end), segment_cues) in enumerate(zip(ranges, results)):
+        core_start = start * 1000 // SAMPLE_RATE if number else float('-inf')
+        core_end = end * 1000 // SAMPLE_RATE if number < len(ranges) - 1 else float('inf')
+        for cue_start, cue_end, text in segment_cues:
+            if core_start <= (cue_start + cue_end) // 2 < core_end:
+                cues.append((cue_start, cue_end, text))
+
+    cues.sort(key=lambda cue: cue[0])
+    stitched = []
+    for cue_start, cue_end, text in cues:
+        if stitched:
+            previous = stitched[-1]
+            if _normalize(previous.text) == _normalize(text) and cue_start <= previous.end + 1000:
+                previous.end = max(previous.end, cue_end)
+                continue
+            # Overlap leftovers must not run into the next cue
+            cue_start = max(cue_start, previous.end)
+        if cue_end > cue_start:
+            stitched.append(SubtitleCue(len(stitched) + 1, cue_start, cue_end, text))
+    return stitched
+
+def resolve_process_count(settings: Dict) -> int:
+    value = str(settings.get('whisper_segment_processes', 'auto')).strip().lower()
+    if value in ('', 'auto'):
+        # Each process gets a handful of threads; CTranslate2 scales poorly beyond that per model
+        return max(1, (os.cpu_count() or 1) // 4)
+    try:
+        return max(1, int(value))
+    except ValueError:
+        return 1
+
+def should_segment(settings: Dict, duration_seconds: Optional[float]) -> bool:
+    """Whether a file should use segmented transcription (whisper_segmented: auto/true/false)"""
+    mode = str(settings.get('whisper_segmented', 'auto')).lower()
+    if mode in ('false', '0', 'no'):
+        return False
+    if settings.get('whisper_engine', 'auto') == 'cli' or resolve_process_count(settings) < 2:
+        return False
+    try:
+        segment_seconds = float(settings.get('whisper_segment_seconds', DEFAULT_SEGMENT_SECONDS))
+    except (TypeError, ValueError):
+        segment_seconds = DEFAULT_SEGMENT_SECONDS
+    if duration_seconds is not None and duration_seconds < 2 * segment_seconds:
+        return False
+    if mode in ('true', '1', 'yes'):
+        return True
+    # auto: only on CPU, where one model cannot use the whole machine
+    from services.whisper_engine import resolve_device
+    return resolve_device(settings.get('whisper_gpu_id', 'auto'))[0] == 'cpu'
+
+def _stop_pool(pool: ProcessPoolExecutor, pid_queue):
+    # Drop the queued segments and end the ones in progress (cancellation)
+    pool.shutdown(wait=False, cancel_futures=True)
+    while not pid_queue.empty():
+        try:
+            os.kill(pid_queue.get(), signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+def transcribe_segmented(audio_path: str, settings: Dict, language: str = 'en',
+                         cancel_token=None) -> Tuple[List[SubtitleCue], float]:
+    """Transcribe a 16 kHz mono WAV on a process pool; returns (cues, fraction skipped by VAD)
+
+    Setting cancel_token stops the pool and raises JobCancelled.
+    """
+    from utils.vad import load_wav_memmap
+
+    engine_name = settings.get('whisper_engine', 'faster_whisper')
+    if engine_name in ('auto', ''):
+        engine_name = 'faster_whisper'
+    processes = resolve_process_count(settings)
+    try:
+        segment_seconds = float(settings.get('whisper_segment_seconds', DEFAULT_SEGMENT_SECONDS))
+        overlap = int(float(settings.get('whisper_segment_overlap', DEFAULT_OVERLAP_SECONDS)) * SAMPLE_RATE)
+    except (TypeError, ValueError):
+        segment_seconds, overlap = DEFAULT_SEGMENT_SECONDS, int(DEFAULT_OVERLAP_SECONDS * SAMPLE_RATE)
+    use_vad = str(settings.get('whisper_vad', 'true')).lower() in ('true', '1', 'yes')
+
+    samples = load_wav_memmap(audio_path)
+    ranges = plan_segments(samples, segment_seconds)
+    total = len(samples)
+    processes = min(processes, len(ranges))
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    logger.info(f"Segmented transcription: {len(ranges)} segments on {processes} processes x {threads} threads")
+
+    # spawn: forking a process that already runs threads (and possibly CUDA) is unsafe
+    context = multiprocessing.get_context('spawn')
+    pid_queue = context.SimpleQueue()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_process,
+                             initargs=(engine_name, settings.get('whisper_model', 'medium.en'), 0, threads,
+                                       pid_queue)) as pool:
+        futures = [
+            pool.submit(_transcribe_segment, audio_path, max(0, start - overlap), min(total, end + overlap),
+                        language, use_vad)
+            for start, end in ranges
+        ]
+        if cancel_token:
+            cancel_token.on_cancel(partial(_stop_pool, pool, pid_queue))
+        try:
+            outputs = [future.result() for future in futures]
+        except Exception:
+            if cancel_token:
+                cancel_token.check()
+            raise
+
+    results = [output[0] for output in outputs]
+    kept = sum(output[1] for output in outputs)
+    read = sum(output[2] for output in outputs)
+    skipped = 1.0 - kept / read if read and use_vad else 0.0
+    return stitch_segments(ranges, results), skipped
@@ -0,0 +1,259 @@
+"""
+Translation Memory for AI Translator
+ذاكرة الترجمة للترجمان الآلي
+
+Stores previously translated subtitle lines keyed by normalized English text,
+model name and target language so repeated dialogue never reaches Ollama twice.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models import TranslationMemory as TranslationMemoryEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 200000
+LOOKUP_BATCH_SIZE = 500
+
+# Part of every key; bumped when normalization changes so entries keyed the old way stop matching
+MEMORY_KEY_VERSION = 2
+
+def normalize_source_text(text: str) -> str:
+    """Normalize an English line so trivial differences share one memory entry
+
+    Only Unicode forms and whitespace are normalized. Case is kept: "May" and
+    "may" or "US" and "us" need different translations.
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+def make_memory_key(text: str, model: str, target_language: str = 'ar') -> str:
+    """Content address of a line for a given model and target language"""
+    raw = f"v{MEMORY_KEY_VERSION}\x00{model}\x00{target_language}\x00{normalize_source_text(text)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class TranslationMemory:
+    """Lookup and fill the translation memory through a SQLAlchemy session"""
+
+    def __init__(self, session, model: str, target_language: str = 'ar',
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.session = session
+        self.model = model
+        self.target_language = target_language
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def lookup_many(self, texts: Iterable[str]) -> Dict[str, str]:
+        """Return {text: translation} for every text already in memory"""
+        keys = {}
+        for text in texts:
+            if normalize_source_text(text):
+                keys.setdefault(make_memory_key(text, self.model, self.target_language), []).append(text)
+
+        found = {}
+        hit_ids = []
+        key_list = list(keys)
+        for i in range(0, len(key_list), LOOKUP_BATCH_SIZE):
+            batch = key_list[i:i + LOOKUP_BATCH_SIZE]
+            rows = self.session.query(TranslationMemoryEntry).filter(
+                TranslationMemoryEntry.source_hash.in_(batch)
+            ).all()
+            for row in rows:
+                hit_ids.append(row.id)
+                for text in keys[row.source_hash]:
+                    found[text] = row.translated_text
+
+        total = sum(len(texts) for texts in keys.values())
+        hits = sum(len(keys[key]) for key in keys if keys[key][0] in found)
+        self.hits += hits
+        self.misses += total - hits
+
+        if hit_ids:
+            try:
+                self.session.query(TranslationMemoryEntry).filter(
+                    TranslationMemoryEntry.id.in_(hit_ids)
+                ).update({
+                    TranslationMemoryEntry.hit_count: TranslationMemoryEntry.hit_count + 1,
+                    TranslationMemoryEntry.last_used_at: datetime.utcnow()
+                }, synchronize_session=False)
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                logger.warning(f"Could not update translation memory hit counters: {e}")
+
+        return found
+
+    def store_many(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """Add (source, translation) pairs that are not in memory yet"""
+        entries = {}
+        for source, translation in pairs:
+            normalized = normalize_source_text(source)
+            if not normalized or not translation or not translation.strip():
+                continue
+            key = make_memory_key(source, self.model, self.target_language)
+            entries.setdefault(key, (normalized, translation.strip()))
+
+        if not entries:
+            return 0
+
+        existing = set()
+        key_list = list(entries)
+        for i in range(0, len(key_list), LOOKUP_BATCH_SIZE):
+            batch = key_list[i:i + LOOKUP_BATCH_SIZE]
+            existing.update(row[0] for row in self.session.query(TranslationMemoryEntry.source_hash).filter(
+                TranslationMemoryEntry.source_hash.in_(batch)
+            ).all())
+
+        added = 0
+        for key, (normalized, translation) in entries.items():
+            if key in existing:
+                continue
+            entry = TranslationMemoryEntry()
+            entry.source_hash = key
+            entry.source_text = normalized
+            entry.translated_text = translation
+            entry.model = self.model
+            entry.target_language = self.target_language
+            self.session.add(entry)
+            added += 1
+
+        try:
+            self.session.commit()
+        except IntegrityError:
+            # Another worker stored the same lines first; nothing is lost
+            self.session.rollback()
+            return 0
+
+        if added:
+            self.evict()
+        return added
+
+    def evict(self) -> int:
+        """Drop least recently used entries once the memory exceeds max_entries"""
+        if not self.max_entries or self.max_entries <= 0:
+            return 0
+
+        count = self.session.query(func.count(TranslationMemoryEntry.id)).scalar() or 0
+        if count <= self.max_entries:
+            return 0
+
+        # Evict a little extra so we do not run this on every store
+        excess = count - self.max_entries + max(1, self.max_entries // 20)
+        stale_ids = [row[0] for row in self.session.query(TranslationMemoryEntry.id).order_by(
+            TranslationMemoryEntry.last_used_at.asc()
+        ).limit(excess).all()]
+
+        if stale_ids:
+            self.session.query(TranslationMemoryEntry).filter(
+                TranslationMemoryEntry.id.in_(stale_ids)
+            ).delete(synchronize_session=False)
+            self.session.commit()
+            logger.info(f"Evicted {len(stale_ids)} translation memory entries")
+        return len(stale_ids)
+
+    def stats(self) -> Dict:
+        """Memory size plus hit/miss counters of this instance"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+def get_memory_summary(session) -> Dict:
+    """Size and lifetime hit totals of the whole translation memory"""
+    entries, total_hits = session.query(
+        func.count(TranslationMemoryEntry.id),
+        func.coalesce(func.sum(TranslationMemoryEntry.hit_count), 0)
+    ).one()
+    models = session.query(
+        TranslationMemoryEntry.model, func.count(TranslationMemoryEntry.id)
+    ).group_by(TranslationMemoryEntry.model).all()
+    return {
+        'entries': entries or 0,
+        'total_hits': int(total_hits or 0),
+        'models': {model: count for model, count in models}
+    }
+
+def export_entries(session, model: Optional[str] = None) -> List[Dict]:
+    """Export memory entries as plain dictionaries"""
+    query = session.query(TranslationMemoryEntry)
+    if model:
+        query = query.filter(TranslationMemoryEntry.model == model)
+    return [{
+        'source_text': entry.source_text,
+        'translated_text': entry.translated_text,
+        'model': entry.model,
+        'target_language': entry.target_language,
+        'hit_count': entry.hit_count or 0
+    } for entry in query.order_by(TranslationMemoryEntry.id).yield_per(1000)]
+
+def import_entries(session, entries: Iterable[Dict], overwrite: bool = False) -> Dict[str, int]:
+    """Import entries produced by export_entries, skipping or replacing duplicates"""
+    imported = updated = skipped = 0
+    pending = {}
+
+    def flush():
+        nonlocal imported, updated, skipped
+        existing = {entry.source_hash: entry for entry in session.query(TranslationMemoryEntry).filter(
+            TranslationMemoryEntry.source_hash.in_(list(pending))
+        ).all()}
+        for key, item in pending.items():
+            if key in existing:
+                if overwrite:
+                    existing[key].translated_text = item['translated_text']
+                    updated += 1
+                else:
+                    skipped += 1
+                continue
+            entry = TranslationMemoryEntry()
+            entry.source_hash = key
+            entry.source_text = normalize_source_text(item['source_text'])
+            entry.translated_text = item['translated_text']
+            entry.model = item['model']
+            entry.target_language = item.get('target_language') or 'ar'
+            entry.hit_count = int(item.get('hit_count') or 0)
+            session.add(entry)
+            imported += 1
+        session.commit()
+        pending.clear()
+
+    for item in entries:
+        if not item.get('source_text') or not item.get('translated_text') or not item.get('model'):
+            skipped += 1
+            continue
+        key = make_memory_key(item['source_text'], item['model'], item.get('target_language') or 'ar')
+        pending[key] = item
+        if len(pending) >= LOOKUP_BATCH_SIZE:
+            flush()
+    if pending:
+        flush()
+
+    return {'imported': imported, 'updated': updated, 'skipped': skipped}
+
+def export_to_file(session, path: str, model: Optional[str] = None) -> int:
+    """Write the memory to a JSON Lines file so it survives database resets"""
+    entries = export_entries(session, model)
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    return len(entries)
+
+def import_from_file(session, path: str, overwrite: bool = False) -> Dict[str, int]:
+    """Load a JSON Lines file written by export_to_file"""
+    def read_entries():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return import_entries(session, read_entries(), overwrite=overwrite)
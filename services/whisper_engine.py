@@ -0,0 +1,268 @@
+"""
+Whisper Transcription Engines for AI Translator
+محركات التفريغ الصوتي للترجمان الآلي
+
+A long-lived TranscriptionWorker keeps the configured Whisper model loaded and
+serves audio files from a local queue, so a batch pays the model load once
+instead of once per video.
+"""
+
+import logging
+import queue
+import threading
+import wave
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from utils.srt import SubtitleCue
+
+logger = logging.getLogger(__name__)
+
+class WhisperEngine:
+    """Base class for engines that turn 16 kHz mono audio into subtitle cues"""
+
+    name = 'base'
+
+    def __init__(self, model: str, device: str = 'auto', device_index: int = 0, cpu_threads: int = 0):
+        self.model_name = model
+        self.device = device
+        self.device_index = device_index
+        # 0 lets the backend decide; segmented transcription splits the cores between processes
+        self.cpu_threads = cpu_threads
+        self.loaded = False
+
+    def load(self):
+        """Load model weights; called once from the worker thread"""
+        self.loaded = True
+
+    def transcribe(self, audio_path: str, language: str = 'en') -> List[SubtitleCue]:
+        raise NotImplementedError
+
+    def transcribe_samples(self, samples, language: str = 'en') -> List[SubtitleCue]:
+        """Transcribe float32 16 kHz samples held in memory"""
+        raise NotImplementedError
+
+    def detect_language(self, samples) -> Tuple[Optional[str], float]:
+        """(language code, probability) spoken in float32 16 kHz samples"""
+        raise NotImplementedError
+
+    def transcribe_stream(self, blocks, language: str = 'en', window_seconds: int = 120) -> List[SubtitleCue]:
+        """Transcribe a PCM block stream window by window while it is still being decoded"""
+        from utils.audio_stream import iter_windows, SAMPLE_RATE
+
+        cues = []
+        for offset, samples in iter_windows(blocks, window_seconds):
+            offset_ms = int(offset * 1000 / SAMPLE_RATE)
+            for cue in self.transcribe_samples(samples, language):
+                cues.append(SubtitleCue(len(cues) + 1, cue.start + offset_ms, cue.end + offset_ms, cue.text))
+        return cues
+
+class FasterWhisperEngine(WhisperEngine):
+    """In-process faster-whisper (CTranslate2) engine"""
+
+    name = 'faster_whisper'
+
+    def __init__(self, model: str, device: str = 'auto', device_index: int = 0, cpu_threads: int = 0):
+        super().__init__(model, device, device_index, cpu_threads)
+        self.model = None
+
+    def load(self):
+        from faster_whisper import WhisperModel
+
+        compute_type = 'int8' if self.device == 'cpu' else 'default'
+        logger.info(f"Loading faster-whisper model {self.model_name} on {self.device}:{self.device_index}")
+        self.model = WhisperModel(
+            self.model_name,
+            device=self.device,
+            device_index=self.device_index,
+            compute_type=compute_type,
+            cpu_threads=self.cpu_threads
+        )
+        self.loaded = True
+
+    def transcribe(self, audio_path: str, language: str = 'en') -> List[SubtitleCue]:
+        return self._segments_to_cues(audio_path, language)
+
+    def transcribe_samples(self, samples, language: str = 'en') -> List[SubtitleCue]:
+        return self._segments_to_cues(samples, language)
+
+    def detect_language(self, samples) -> Tuple[Optional[str], float]:
+        # Segments are generated lazily, so only the language detection pass runs here
+        _segments, info = self.model.transcribe(samples, beam_size=1, without_timestamps=True)
+        return info.language, float(info.language_probability or 0.0)
+
+    def _segments_to_cues(self, audio, language):
+        segments, _info = self.model.transcribe(audio, language=language, beam_size=5)
+        cues = []
+        for segment in segments:
+            text = segment.text.strip()
+            if text:
+                cues.append(SubtitleCue(len(cues) + 1, int(segment.start * 1000), int(segment.end * 1000), text))
+        return cues
+
+class StubWhisperEngine(WhisperEngine):
+    """Deterministic engine for CPU-only machines and tests; emits one cue per window"""
+
+    name = 'stub'
+    window_ms = 5000
+
+    def transcribe(self, audio_path: str, language: str = 'en') -> List[SubtitleCue]:
+        with wave.open(audio_path, 'rb') as audio:
+            duration_ms = int(audio.getnframes() * 1000 / (audio.getframerate() or 16000))
+        return self._windows_to_cues(duration_ms)
+
+    def transcribe_samples(self, samples, language: str = 'en') -> List[SubtitleCue]:
+        return self._windows_to_cues(int(len(samples) * 1000 / 16000))
+
+    def detect_language(self, samples) -> Tuple[Optional[str], float]:
+        return 'en', 1.0
+
+    def _windows_to_cues(self, duration_ms):
+        cues = []
+        for start in range(0, duration_ms, self.window_ms):
+            end = min(start + self.window_ms, duration_ms)
+            cues.append(SubtitleCue(len(cues) + 1, start, end, f"Stub transcription segment {len(cues) + 1}"))
+        return cues
+
+ENGINES = {
+    FasterWhisperEngine.name: FasterWhisperEngine,
+    StubWhisperEngine.name: StubWhisperEngine,
+}
+
+def _auto_device():
+    # CTranslate2's 'auto' uses the first GPU when CUDA sees one, the CPU otherwise
+    try:
+        import ctranslate2
+        if ctranslate2.get_cuda_device_count() > 0:
+            return 'cuda', 0
+    except Exception:
+        pass
+    return 'cpu', 0
+
+def resolve_device(gpu_id: str):
+    """Map the whisper_gpu_id setting to (device, device_index)
+
+    'auto' resolves to the device the backend would pick, so a worker started
+    with 'auto' and one placed on that device by the scheduler are the same.
+    """
+    if gpu_id == 'cpu':
+        return 'cpu', 0
+    if gpu_id in (None, '', 'auto'):
+        return _auto_device()
+    try:
+        return 'cuda', int(gpu_id)
+    except ValueError:
+        logger.warning(f"Invalid GPU ID: {gpu_id}, using auto selection")
+        return _auto_device()
+
+class TranscriptionWorker:
+    """Background thread that owns one loaded engine and serves a request queue"""
+
+    def __init__(self, engine: WhisperEngine, max_pending: int = 8):
+        self.engine = engine
+        self.requests = queue.Queue(maxsize=max_pending)
+        self.load_error = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"whisper-{engine.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.engine.load()
+        except Exception as e:
+            self.load_error = e
+            logger.error(f"Failed to load Whisper engine {self.engine.name}: {e}")
+        finally:
+            self.ready.set()
+
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+            future, source, language = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self.load_error:
+                future.set_exception(self.load_error)
+                continue
+            try:
+                if isinstance(source, str):
+                    future.set_result(self.engine.transcribe(source, language))
+                else:
+                    future.set_result(self.engine.transcribe_stream(source, language))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, audio_path: str, language: str = 'en') -> Future:
+        """Queue an audio file; the future resolves to a list of SubtitleCue"""
+        future = Future()
+        self.requests.put((future, audio_path, language))
+        return future
+
+    def submit_stream(self, blocks, language: str = 'en') -> Future:
+        """Queue an iterable of PCM sample blocks (see utils.audio_stream.PcmStream)"""
+        future = Future()
+        self.requests.put((future, blocks, language))
+        return future
+
+    def is_alive(self) -> bool:
+        return self.thread.is_alive() and self.load_error is None
+
+    def stop(self):
+        self.requests.put(None)
+
+_workers: Dict[tuple, TranscriptionWorker] = {}
+_workers_lock = threading.Lock()
+
+def get_transcription_worker(settings: Dict, engine_name: Optional[str] = None) -> TranscriptionWorker:
+    """Return the warm worker for the configured engine/model/device, starting it on first use"""
+    engine_name = engine_name or settings.get('whisper_engine', 'faster_whisper')
+    if engine_name in ('auto', ''):
+        engine_name = FasterWhisperEngine.name
+    if engine_name not in ENGINES:
+        raise ValueError(f"Unknown Whisper engine: {engine_name}")
+
+    model = settings.get('whisper_model', 'medium.en')
+    device, device_index = resolve_device(settings.get('whisper_gpu_id', 'auto'))
+    key = (engine_name, model, device, device_index)
+
+    with _workers_lock:
+        worker = _workers.get(key)
+        if worker is None or not worker.is_alive():
+            # One model stays resident per device; a settings change replaces it. Requests
+            # already queued on the old worker still finish before it stops.
+            for old_key in [old_key for old_key in _workers if old_key[2:] == key[2:]]:
+                _workers.pop(old_key).stop()
+            worker = TranscriptionWorker(ENGINES[engine_name](model, device, device_index))
+            _workers[key] = worker
+        return worker
+
+def shutdown_transcription_workers():
+    with _workers_lock:
+        for key in list(_workers):
+            _workers.pop(key).stop()
+
+_language_id_engines: Dict[tuple, WhisperEngine] = {}
+_language_id_lock = threading.Lock()
+
+def detect_spoken_language(samples, settings: Dict) -> Tuple[Optional[str], float]:
+    """Identify the language of a short sample with a small multilingual model
+
+    English-only models (*.en) cannot tell languages apart, so language ID uses
+    its own model (audio_language_id_model), loaded once and kept in memory.
+    """
+    engine_name = settings.get('whisper_engine', 'faster_whisper')
+    if engine_name in ('auto', '', 'cli'):
+        engine_name = FasterWhisperEngine.name
+    model = settings.get('audio_language_id_model', 'tiny') or 'tiny'
+    device, device_index = resolve_device(settings.get('whisper_gpu_id', 'auto'))
+    key = (engine_name, model, device, device_index)
+
+    with _language_id_lock:
+        engine = _language_id_engines.get(key)
+        if engine is None:
+            _language_id_engines.clear()
+            engine = ENGINES[engine_name](model, device, device_index)
+            engine.load()
+            _language_id_engines[key] = engine
+        return engine.detect_language(samples)
@@ -0,0 +1,129 @@
+"""
+Worker Nodes for AI Translator
+سجل عمال المعالجة على الأجهزة المختلفة
+
+Every job worker (python job_worker.py, on this machine or another one that
+shares the library database) registers a worker_nodes row and refreshes it
+with a heartbeat that carries the jobs it is running. The dashboard reads the
+rows plus the jobs each worker finished to show throughput per worker.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from models import TranslationJob, WorkerNode
+
+logger = logging.getLogger(__name__)
+
+# Workers send a heartbeat this often, whatever their lease length
+HEARTBEAT_SECONDS = 60
+# A running worker whose heartbeat is older than this (three missed beats) is shown as offline
+DEFAULT_OFFLINE_SECONDS = 3 * HEARTBEAT_SECONDS
+# Stopped or offline workers are removed after this long
+PRUNE_AFTER_DAYS = 7
+
+def _load(value, default):
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        return default
+
+def register_worker(session, name: str, hostname: str, pid: int, slots: Dict[str, int], path_map) -> WorkerNode:
+    """Create or restart the row of a worker; counters start again from zero"""
+    now = datetime.utcnow()
+    node = session.query(WorkerNode).filter_by(name=name).first()
+    if node is None:
+        node = WorkerNode(name=name)
+        session.add(node)
+    node.hostname = hostname
+    node.pid = pid
+    node.status = 'running'
+    node.slots = json.dumps(slots)
+    node.path_map = json.dumps([list(pair) for pair in path_map], ensure_ascii=False)
+    node.current_jobs = json.dumps([])
+    node.jobs_completed = 0
+    node.jobs_failed = 0
+    node.started_at = now
+    node.last_heartbeat = now
+    session.commit()
+    return node
+
+def heartbeat(session, name: str, current_jobs: List[Dict], counts: Dict[str, int]) -> bool:
+    """Refresh the heartbeat with the running jobs and finished counters; False when the row is gone"""
+    updated = session.query(WorkerNode).filter_by(name=name).update({
+        'status': 'running',
+        'current_jobs': json.dumps(current_jobs, ensure_ascii=False, default=str),
+        'jobs_completed': counts.get('completed', 0),
+        'jobs_failed': counts.get('failed', 0),
+        'last_heartbeat': datetime.utcnow()
+    }, synchronize_session=False)
+    session.commit()
+    return bool(updated)
+
+def mark_stopped(session, name: str):
+    session.query(WorkerNode).filter_by(name=name).update({
+        'status': 'stopped',
+        'current_jobs': json.dumps([]),
+        'last_heartbeat': datetime.utcnow()
+    }, synchronize_session=False)
+    session.commit()
+
+def prune_workers(session, days: int = PRUNE_AFTER_DAYS) -> int:
+    """Drop rows of workers that have not reported for days"""
+    deleted = session.query(WorkerNode).filter(
+        WorkerNode.last_heartbeat < datetime.utcnow() - timedelta(days=days)
+    ).delete(synchronize_session=False)
+    session.commit()
+    return deleted
+
+def list_workers(session, offline_seconds: int = DEFAULT_OFFLINE_SECONDS, window_hours: float = 1.0,
+                 now: Optional[datetime] = None) -> List[Dict]:
+    """Workers with their state, current jobs and throughput over the last window_hours"""
+    now = now or datetime.utcnow()
+    since = now - timedelta(hours=window_hours)
+    finished = {
+        worker: (count, audio or 0.0)
+        for worker, count, audio in session.query(
+            TranslationJob.worker, func.count(TranslationJob.id), func.sum(TranslationJob.audio_duration)
+        ).filter(
+            TranslationJob.worker.isnot(None),
+            TranslationJob.status == 'completed',
+            TranslationJob.completed_at >= since
+        ).group_by(TranslationJob.worker)
+    }
+
+    workers = []
+    for node in session.query(WorkerNode).order_by(WorkerNode.hostname, WorkerNode.name):
+        status = node.status
+        seconds_since = (now - node.last_heartbeat).total_seconds() if node.last_heartbeat else None
+        if status == 'running' and (seconds_since is None or seconds_since > offline_seconds):
+            status = 'offline'
+        count, audio_seconds = finished.get(node.name, (0, 0.0))
+        workers.append({
+            'name': node.name,
+            'hostname': node.hostname,
+            'pid': node.pid,
+            'status': status,
+            'slots': _load(node.slots, {}),
+            'path_map': _load(node.path_map, []),
+            'current_jobs': _load(node.current_jobs, []) if status == 'running' else [],
+            'jobs_completed': node.jobs_completed or 0,
+            'jobs_failed': node.jobs_failed or 0,
+            'started_at': node.started_at.isoformat() if node.started_at else None,
+            'last_heartbeat': node.last_heartbeat.isoformat() if node.last_heartbeat else None,
+            'seconds_since_heartbeat': round(seconds_since, 1) if seconds_since is not None else None,
+            'throughput': {
+                'window_hours': window_hours,
+                'jobs': count,
+                'jobs_per_hour': round(count / window_hours, 2),
+                # Hours of audio translated per wall-clock hour
+                'audio_hours_per_hour': round(audio_seconds / 3600 / window_hours, 3)
+            }
+        })
+    return workers
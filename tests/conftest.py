@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a fresh SQLite library database with every table created"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from models import db
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}", connect_args={'timeout': 30})
+    db.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def session(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
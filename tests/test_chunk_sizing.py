@@ -0,0 +1,48 @@
+from collections import deque
+
+from services.chunk_sizing import MIN_CHUNK_TOKENS, ChunkSizer, cue_tokens
+from utils.srt import SubtitleCue
+
+def test_budget_fits_the_context():
+    sizer = ChunkSizer(8192)
+    assert MIN_CHUNK_TOKENS <= sizer.target_tokens < sizer.max_tokens < 8192 // 2
+
+def test_grows_additively_while_chunks_are_fast():
+    sizer = ChunkSizer(8192, target_seconds=60)
+    start = sizer.target_tokens
+    sizer.record(sizer.target_tokens, 5.0, complete=True)
+    assert sizer.target_tokens == start + sizer.step
+    for _ in range(100):
+        sizer.record(sizer.target_tokens, 5.0, complete=True)
+    assert sizer.target_tokens == sizer.max_tokens
+
+def test_small_chunks_do_not_grow_the_budget():
+    sizer = ChunkSizer(8192)
+    start = sizer.target_tokens
+    sizer.record(10, 1.0, complete=True)
+    assert sizer.target_tokens == start
+
+def test_halves_on_incomplete_output():
+    sizer = ChunkSizer(8192)
+    start = sizer.target_tokens
+    sizer.record(start, 5.0, complete=False)
+    assert sizer.target_tokens == start // 2
+    for _ in range(20):
+        sizer.record(start, 5.0, complete=False)
+    assert sizer.target_tokens == sizer.min_tokens
+    assert sizer.stats()['failures'] == 21
+
+def test_slow_chunk_resizes_to_the_measured_rate():
+    sizer = ChunkSizer(8192, target_seconds=10)
+    sizer.record(1000, 40.0, complete=True)
+    assert sizer.target_tokens == 250
+
+def test_take_respects_the_budget():
+    sizer = ChunkSizer(2048)
+    cues = deque(SubtitleCue(n, n * 1000, n * 1000 + 900, "A line of dialogue here") for n in range(200))
+    chunk = sizer.take(cues)
+    assert sum(cue_tokens(cue) for cue in chunk) <= sizer.target_tokens
+    assert len(chunk) + len(cues) == 200
+    # A single cue larger than the budget is still taken alone
+    huge = deque([SubtitleCue(1, 0, 1000, "word " * 5000)])
+    assert len(sizer.take(huge)) == 1
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from services.device_scheduler import Device, DeviceScheduler, DeviceUnavailable, model_memory_mb
+
+def make_scheduler(gpu_memory=(8000,), cpu_memory=16000):
+    devices = [Device(f"cuda:{n}", 'cuda', n, memory) for n, memory in enumerate(gpu_memory)]
+    devices.append(Device('cpu', 'cpu', 0, cpu_memory))
+    return DeviceScheduler(devices)
+
+def test_model_memory_by_size():
+    assert model_memory_mb('medium.en') == 5000
+    assert model_memory_mb('distil-large-v3') == 10000
+    assert model_memory_mb('tiny', {'whisper_model_memory_mb': '1234'}) == 1234
+
+def test_admits_on_gpu_and_counts_the_model():
+    scheduler = make_scheduler()
+    placement = scheduler.acquire('medium.en', 5000)
+    assert placement.device.name == 'cuda:0'
+    assert placement.device.resident == {'medium.en': 5000}
+    assert placement.device.active == 1
+
+def test_spills_to_cpu_when_gpus_are_busy():
+    scheduler = make_scheduler(gpu_memory=(8000, 8000))
+    names = [scheduler.acquire('medium.en', 5000).device.name for _ in range(3)]
+    assert names == ['cuda:0', 'cuda:1', 'cpu']
+
+def test_release_frees_the_slot_but_keeps_the_model_warm():
+    scheduler = make_scheduler()
+    first = scheduler.acquire('medium.en', 5000)
+    assert scheduler.acquire('medium.en', 5000).device.name == 'cpu'
+    scheduler.release(first)
+    assert first.device.active == 0
+    assert first.device.resident == {'medium.en': 5000}
+    assert scheduler.acquire('medium.en', 5000).device.name == 'cuda:0'
+
+def test_model_too_large_for_gpu_runs_on_cpu():
+    scheduler = make_scheduler(gpu_memory=(4000,))
+    assert scheduler.acquire('large-v3', 10000).device.name == 'cpu'
+
+def test_model_that_fits_nowhere_is_rejected():
+    scheduler = make_scheduler(gpu_memory=(4000,), cpu_memory=4000)
+    with pytest.raises(DeviceUnavailable):
+        scheduler.acquire('large-v3', 10000)
+
+def test_wait_times_out_when_every_device_is_busy():
+    scheduler = make_scheduler()
+    scheduler.acquire('medium.en', 5000, allowed=['cuda:0'], cpu_fallback=False)
+    with pytest.raises(DeviceUnavailable):
+        scheduler.acquire('medium.en', 5000, allowed=['cuda:0'], cpu_fallback=False, timeout=0.1)
+
+def test_waiting_job_gets_the_released_device():
+    scheduler = make_scheduler()
+    held = scheduler.acquire('medium.en', 5000, allowed=['cuda:0'], cpu_fallback=False)
+    placed = []
+    waiter = threading.Thread(target=lambda: placed.append(
+        scheduler.acquire('medium.en', 5000, allowed=['cuda:0'], cpu_fallback=False, timeout=5)))
+    waiter.start()
+    scheduler.release(held)
+    waiter.join()
+    assert placed[0].device.name == 'cuda:0'
+
+def test_reserve_releases_on_exit():
+    scheduler = make_scheduler()
+    with scheduler.reserve('medium.en', need_mb=5000) as placement:
+        assert placement.device.active == 1
+    assert placement.device.active == 0
@@ -0,0 +1,52 @@
+import threading
+import time
+
+from services.hedging import LatencyTracker, run_hedged
+from services.ollama_client import OllamaPool
+
+def test_no_hedge_delay_until_enough_history():
+    tracker = LatencyTracker(min_samples=3, min_delay=0.0)
+    assert tracker.hedge_delay(100) is None
+    for seconds in (1.0, 2.0, 3.0):
+        tracker.record(100, seconds)
+    assert tracker.hedge_delay(100) == 3.0
+
+def test_fast_primary_is_not_hedged():
+    names = []
+    result = run_hedged(lambda cancel_event, name: names.append(name) or 'done', delay=5)
+    assert result == ('done', False, False)
+    assert names == ['primary']
+
+def test_hedge_wins_and_the_primary_is_cancelled():
+    cancelled = threading.Event()
+
+    def attempt(cancel_event, name):
+        if name == 'primary':
+            if cancel_event.wait(5):
+                cancelled.set()
+            return 'primary'
+        return 'hedge'
+
+    assert run_hedged(attempt, delay=0.05) == ('hedge', True, True)
+    assert cancelled.wait(1)
+
+class FakeClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def loaded_models(self):
+        return {'llama3:latest'}
+
+def test_hedged_request_avoids_the_busy_server():
+    pool = OllamaPool([FakeClient('http://a'), FakeClient('http://b')])
+    servers = []
+    used = []
+
+    def request(client):
+        used.append(client.base_url)
+        time.sleep(0.01)
+
+    pool._call('llama3', request, avoid=servers)
+    pool._call('llama3', request, avoid=servers)
+    assert used[0] != used[1]
+    assert sorted(servers) == ['http://a', 'http://b']
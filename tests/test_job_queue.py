@@ -0,0 +1,104 @@
+import threading
+from datetime import datetime, timedelta
+
+from models import TranslationJob
+from services import job_queue
+
+def queue_files(session, count):
+    job_queue.enqueue_files(session, [f"/library/video{n}.mkv" for n in range(count)])
+    return [job.id for job in session.query(TranslationJob).order_by(TranslationJob.id)]
+
+def expire(session, job_id):
+    session.query(TranslationJob).filter_by(id=job_id).update(
+        {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    session.commit()
+
+def test_claim_takes_oldest_pending_job(session):
+    ids = queue_files(session, 2)
+    job = job_queue.claim_next(session, ['translate_file'], 'worker-a')
+    assert job.id == ids[0]
+    assert job.status == 'processing'
+    assert job.lease_owner == 'worker-a'
+    assert job.attempts == 1
+    assert job.lease_expires_at > datetime.utcnow()
+
+def test_claimed_job_is_not_claimed_again(session):
+    queue_files(session, 1)
+    assert job_queue.claim_next(session, ['translate_file'], 'worker-a') is not None
+    assert job_queue.claim_next(session, ['translate_file'], 'worker-b') is None
+
+def test_concurrent_claims_take_each_job_once(session_factory):
+    with session_factory() as session:
+        ids = queue_files(session, 20)
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(owner):
+        with session_factory() as session:
+            while True:
+                job = job_queue.claim_next(session, ['translate_file'], owner)
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job.id)
+
+    threads = [threading.Thread(target=worker, args=(f"worker-{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == ids
+
+def test_claim_only_serves_requested_task_types(session):
+    job_queue.enqueue_task(session, 'sync_library')
+    assert job_queue.claim_next(session, ['translate_file'], 'worker-a') is None
+    assert job_queue.claim_next(session, job_queue.task_types_for('sync'), 'worker-a').task_type == 'sync_library'
+
+def test_expired_lease_is_requeued(session):
+    ids = queue_files(session, 1)
+    job_queue.claim_next(session, ['translate_file'], 'worker-a')
+    expire(session, ids[0])
+
+    assert job_queue.recover_expired(session) == {'requeued': 1, 'failed': 0}
+    job = session.get(TranslationJob, ids[0])
+    session.refresh(job)
+    assert (job.status, job.lease_owner) == ('pending', None)
+    # The worker that lost the lease can no longer record an outcome
+    assert not job_queue.finish_job(session, ids[0], 'worker-a', 'completed')
+
+def test_live_lease_is_left_alone(session):
+    queue_files(session, 1)
+    job = job_queue.claim_next(session, ['translate_file'], 'worker-a')
+    assert job_queue.recover_expired(session) == {'requeued': 0, 'failed': 0}
+    assert job_queue.renew_leases(session, 'worker-a', [job.id]) == [job.id]
+    assert job_queue.renew_leases(session, 'worker-b', [job.id]) == []
+
+def test_expired_lease_fails_after_max_attempts(session):
+    ids = queue_files(session, 1)
+    for _ in range(2):
+        job_queue.claim_next(session, ['translate_file'], 'worker-a')
+        expire(session, ids[0])
+        job_queue.recover_expired(session, max_attempts=2)
+    job = session.get(TranslationJob, ids[0])
+    session.refresh(job)
+    assert job.status == 'failed'
+    assert job.attempts == 2
+
+def test_expired_lease_honours_pause_request(session):
+    ids = queue_files(session, 1)
+    job_queue.claim_next(session, ['translate_file'], 'worker-a')
+    assert job_queue.request_control(session, ids[0], 'pause') == 'processing'
+    expire(session, ids[0])
+
+    assert job_queue.recover_expired(session)['paused'] == 1
+    job = session.get(TranslationJob, ids[0])
+    session.refresh(job)
+    assert (job.status, job.control) == ('paused', None)
+
+def test_finish_paused_job_keeps_its_attempt(session):
+    ids = queue_files(session, 1)
+    job_queue.claim_next(session, ['translate_file'], 'worker-a')
+    assert job_queue.finish_job(session, ids[0], 'worker-a', 'paused')
+    job = session.get(TranslationJob, ids[0])
+    session.refresh(job)
+    assert (job.status, job.attempts, job.completed_at) == ('paused', 0, None)
@@ -0,0 +1,11 @@
+from job_worker import JobWorker
+
+def test_local_worker_serves_every_task_class():
+    worker = JobWorker(settings={}, owner='local', path_map=[])
+    assert worker.slots == {'translate': 2, 'sync': 1, 'scan': 1}
+
+def test_worker_with_path_map_only_translates():
+    settings = {'worker_sync_slots': '2', 'worker_scan_slots': '1'}
+    worker = JobWorker(settings=settings, owner='remote', path_map=[('/mnt/media', '/srv/media')],
+                       slots={'scan': 1, 'translate': 3})
+    assert worker.slots == {'translate': 3, 'sync': 0, 'scan': 0}
@@ -0,0 +1,20 @@
+from services.ollama_client import get_ollama_client, get_ollama_pool, parse_keep_alive
+
+def test_parse_keep_alive():
+    assert parse_keep_alive('-1') == -1
+    assert parse_keep_alive('300') == 300
+    assert parse_keep_alive('1h') == '1h'
+    assert parse_keep_alive(None) == '30m'
+
+def test_keep_alive_follows_the_latest_settings():
+    url = 'http://keep-alive-test:11434'
+    client = get_ollama_client(url)
+    assert client.keep_alive == '30m'
+    pool = get_ollama_pool({'ollama_api_url': url, 'ollama_keep_alive': '-1'})
+    assert pool.endpoints[0].client is client
+    assert client.keep_alive == -1
+    # Callers without settings leave it alone
+    get_ollama_client(url)
+    assert client.keep_alive == -1
+    get_ollama_client(url, {'ollama_keep_alive': '5m'})
+    assert client.keep_alive == '5m'
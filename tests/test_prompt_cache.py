@@ -0,0 +1,54 @@
+from process_video import TRANSLATION_SYSTEM_PROMPT, PromptCacheMeter, build_translation_prompt
+from services.chunk_sizing import estimate_tokens
+
+RATIO = 1.3  # the model's tokenizer produces 30% more tokens than estimate_tokens
+SYSTEM_TOKENS = estimate_tokens(TRANSLATION_SYSTEM_PROMPT)
+BATCH = "1: Hello there.\n2: See you tomorrow."
+
+def evaluated_tokens(text, cached):
+    prompt = estimate_tokens(build_translation_prompt(text))
+    return round(RATIO * (prompt if cached else prompt + SYSTEM_TOKENS))
+
+class FakeClient:
+    """Ollama with a warm prompt cache: only a new system prompt is evaluated in full"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, model, messages, options=None, timeout=None):
+        self.calls += 1
+        system = messages[0]['content']
+        prompt = estimate_tokens(messages[1]['content'])
+        cached = system == TRANSLATION_SYSTEM_PROMPT
+        return {'response': '', 'prompt_eval_count': round(RATIO * (prompt + (0 if cached else estimate_tokens(system))))}
+
+def test_nothing_is_reported_before_calibration():
+    meter = PromptCacheMeter()
+    usage = {'prompt_eval_count': evaluated_tokens(BATCH, cached=True), 'prompt_eval_duration': 10 ** 9}
+    assert meter.measure('llama3', usage, BATCH) == (0, 0.0)
+
+def test_calibration_is_not_fooled_by_a_warm_cache():
+    meter = PromptCacheMeter()
+    client = FakeClient()
+    meter.calibrate(client, 'llama3')
+    meter.calibrate(client, 'llama3')
+    assert client.calls == 1
+    assert abs(meter.ratios['llama3'] - RATIO) < 0.05
+
+    hit = {'prompt_eval_count': evaluated_tokens(BATCH, cached=True), 'prompt_eval_duration': 10 ** 9}
+    cached, saved = meter.measure('llama3', hit, BATCH)
+    assert abs(cached - RATIO * SYSTEM_TOKENS) <= 5
+    assert saved > 0
+    miss = {'prompt_eval_count': evaluated_tokens(BATCH, cached=False), 'prompt_eval_duration': 10 ** 9}
+    assert meter.measure('llama3', miss, BATCH) == (0, 0.0)
+
+def test_failed_calibration_is_retried():
+    class DownClient:
+        def chat(self, *args, **kwargs):
+            raise ConnectionError("refused")
+
+    meter = PromptCacheMeter()
+    meter.calibrate(DownClient(), 'llama3')
+    assert 'llama3' not in meter.ratios
+    meter.calibrate(FakeClient(), 'llama3')
+    assert 'llama3' in meter.ratios
@@ -0,0 +1,39 @@
+from services.segmented_transcription import stitch_segments
+
+RATE = 16000
+
+def test_overlap_line_is_kept_once():
+    # Core ranges 0-30s and 30-60s; both segments recognised the line near the cut,
+    # and the segment whose core holds its midpoint keeps it
+    ranges = [(0, 30 * RATE), (30 * RATE, 60 * RATE)]
+    results = [
+        [(1000, 5000, "First line"), (29000, 31000, "Across the cut")],
+        [(29100, 31200, "Across the cut."), (40000, 42000, "Second segment")],
+    ]
+    cues = stitch_segments(ranges, results)
+    assert [(cue.index, cue.text) for cue in cues] == [
+        (1, "First line"), (2, "Across the cut."), (3, "Second segment")]
+
+def test_identical_touching_lines_are_merged():
+    ranges = [(0, 30 * RATE), (30 * RATE, 60 * RATE)]
+    results = [[(28000, 29900, "Hello")], [(30100, 32000, "hello")]]
+    cues = stitch_segments(ranges, results)
+    assert [(cue.start, cue.end) for cue in cues] == [(28000, 32000)]
+
+def test_overlapping_cues_do_not_run_into_each_other():
+    ranges = [(0, 60 * RATE)]
+    results = [[(1000, 4000, "One"), (3000, 6000, "Two")]]
+    cues = stitch_segments(ranges, results)
+    assert [(cue.start, cue.end) for cue in cues] == [(1000, 4000), (4000, 6000)]
+
+def test_auto_segments_long_files_on_a_cpu_only_host(monkeypatch):
+    from services import whisper_engine
+    from services.segmented_transcription import should_segment
+
+    settings = {'whisper_segment_processes': '4', 'whisper_segment_seconds': '300'}
+    monkeypatch.setattr(whisper_engine, '_auto_device', lambda: ('cpu', 0))
+    assert should_segment(settings, 3600)
+    assert not should_segment(settings, 300)
+    monkeypatch.setattr(whisper_engine, '_auto_device', lambda: ('cuda', 0))
+    assert not should_segment(settings, 3600)
+    assert should_segment(dict(settings, whisper_gpu_id='cpu'), 3600)
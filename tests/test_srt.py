@@ -0,0 +1,32 @@
+from utils.srt import SubtitleCue, apply_text_batch, build_text_batch, compose_srt, parse_srt
+
+SAMPLE = (
+    "﻿1\r\n00:00:01,000 --> 00:00:02,500\r\nHello there.\r\n\r\n"
+    "2\r\n00:00:03,000 --> 00:00:04,000\r\nTwo\r\nlines\r\n\r\n"
+    "not a cue\r\n\r\n"
+    "00:00:05.5 --> 00:00:06,000\r\nNo index\r\n"
+)
+
+def test_parse_srt():
+    cues = parse_srt(SAMPLE)
+    assert [(cue.index, cue.start, cue.end, cue.text) for cue in cues] == [
+        (1, 1000, 2500, "Hello there."),
+        (2, 3000, 4000, "Two\nlines"),
+        (3, 5500, 6000, "No index"),
+    ]
+
+def test_compose_round_trip():
+    cues = parse_srt(SAMPLE)
+    assert [(cue.start, cue.end, cue.text) for cue in parse_srt(compose_srt(cues))] == \
+        [(cue.start, cue.end, cue.text) for cue in cues]
+
+def test_apply_text_batch_keeps_source_for_missing_lines():
+    cues = [SubtitleCue(1, 0, 1000, "One"), SubtitleCue(2, 1000, 2000, "Two"), SubtitleCue(3, 2000, 3000, "Three")]
+    response = "Here is the translation:\n1: واحد\n3: ثلاثة <br> سطر\n4: extra"
+    translated = apply_text_batch(cues, response)
+    assert [cue.text for cue in translated] == ["واحد", "Two", "ثلاثة\nسطر"]
+    assert [(cue.start, cue.end) for cue in translated] == [(cue.start, cue.end) for cue in cues]
+
+def test_text_batch_round_trip_keeps_line_breaks():
+    cues = [SubtitleCue(1, 0, 1000, "Two\nlines")]
+    assert apply_text_batch(cues, build_text_batch(cues))[0].text == "Two\nlines"
@@ -0,0 +1,41 @@
+import pytest
+
+import process_video
+from services.cancellation import CancelToken
+from services.device_scheduler import Device, DeviceScheduler, DeviceUnavailable, set_device_scheduler
+
+class Job:
+    def __init__(self, segmented=False, **settings):
+        self.settings = dict({'whisper_model': 'medium.en', 'whisper_device_scheduler': 'true',
+                              'whisper_segment_processes': '4'}, **settings)
+        self.segmented = segmented
+        self.cancel_token = CancelToken()
+        self.metrics = {}
+
+@pytest.fixture
+def devices():
+    devices = [Device('cuda:0', 'cuda', 0, 8000), Device('cpu', 'cpu', 0, 12000)]
+    set_device_scheduler(DeviceScheduler(devices))
+    yield devices
+    set_device_scheduler(None)
+
+def test_job_runs_on_the_placed_device(devices):
+    job = Job()
+    with process_video.transcription_device(job) as settings:
+        assert settings['whisper_gpu_id'] == '0'
+        assert devices[0].active == 1
+    assert devices[0].active == 0
+    assert job.metrics['transcribe_device'] == 'cuda:0'
+
+def test_segmented_pool_that_does_not_fit_runs_unsegmented(devices):
+    # 4 processes x 5000 MiB does not fit in 12000 MiB of RAM
+    job = Job(segmented=True)
+    with process_video.transcription_device(job) as settings:
+        assert not job.segmented
+        assert settings['whisper_gpu_id'] == '0'
+
+def test_model_that_fits_nowhere_fails(devices):
+    job = Job(whisper_model_memory_mb='20000')
+    with pytest.raises(DeviceUnavailable):
+        with process_video.transcription_device(job):
+            pass
@@ -0,0 +1,11 @@
+from services.translation_memory import TranslationMemory, make_memory_key, normalize_source_text
+
+def test_normalization_keeps_case():
+    assert normalize_source_text("  We leave\tin\n May. ") == "We leave in May."
+    assert normalize_source_text("ﬁne") == "fine"
+    assert make_memory_key("US", "llama3") != make_memory_key("us", "llama3")
+
+def test_lines_differing_in_case_keep_their_own_translation(session):
+    memory = TranslationMemory(session, 'llama3')
+    memory.store_many([("May", "مايو"), ("may", "قد")])
+    assert memory.lookup_many(["May", "may", "May  ", "MAY"]) == {"May": "مايو", "may": "قد", "May  ": "مايو"}
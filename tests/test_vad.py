@@ -0,0 +1,43 @@
+import numpy as np
+
+from utils.audio_stream import SAMPLE_RATE
+from utils.srt import SubtitleCue
+from utils.vad import SpeechGate
+
+def tone(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+def gated_speech():
+    # Speech at 10-12s and 30-33s of a 40s file
+    audio = np.concatenate([silence(10), tone(2), silence(18), tone(3), silence(7)])
+    gate = SpeechGate(window_seconds=60)
+    kept = np.concatenate(list(gate.filter([audio])))
+    return gate, kept
+
+def test_silence_is_dropped():
+    gate, kept = gated_speech()
+    assert len(gate.input_starts) == 2
+    # 5s of speech plus padding and the joining gap
+    assert len(kept) < 7 * SAMPLE_RATE
+    assert gate.skipped_fraction > 0.8
+
+def test_cues_map_back_to_the_original_timeline():
+    gate, _kept = gated_speech()
+    second_start = gate.output_starts[1] * 1000 // SAMPLE_RATE
+    cues = gate.remap_cues([SubtitleCue(1, 300, 1500, "first"),
+                            SubtitleCue(2, second_start + 500, second_start + 2000, "second")])
+    assert abs(cues[0].start - 10100) <= 50 and abs(cues[0].end - 11300) <= 50
+    assert abs(cues[1].start - 30300) <= 50 and abs(cues[1].end - 31800) <= 50
+
+def test_cue_across_a_gap_is_kept_to_its_main_region():
+    gate, _kept = gated_speech()
+    first_end = (gate.output_starts[0] + gate.lengths[0]) * 1000 // SAMPLE_RATE
+    second_start = gate.output_starts[1] * 1000 // SAMPLE_RATE
+    cue = gate.remap_cues([SubtitleCue(1, first_end - 200, second_start + 1500, "mostly second")])[0]
+    # Clipped to the second region instead of spanning the 18s of silence
+    assert cue.start >= 29500
+    assert cue.end - cue.start <= 1600
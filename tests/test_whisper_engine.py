@@ -0,0 +1,47 @@
+import wave
+
+import pytest
+
+from services import whisper_engine
+from services.whisper_engine import StubWhisperEngine, get_transcription_worker, shutdown_transcription_workers
+
+def write_silence(path, seconds):
+    with wave.open(str(path), 'wb') as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(16000)
+        audio.writeframes(b'\x00\x00' * 16000 * seconds)
+
+@pytest.fixture(autouse=True)
+def no_workers():
+    shutdown_transcription_workers()
+    yield
+    shutdown_transcription_workers()
+
+def test_stub_engine_emits_one_cue_per_window(tmp_path):
+    write_silence(tmp_path / 'audio.wav', 12)
+    cues = StubWhisperEngine('tiny', 'cpu').transcribe(str(tmp_path / 'audio.wav'))
+    assert [(cue.start, cue.end) for cue in cues] == [(0, 5000), (5000, 10000), (10000, 12000)]
+
+def test_worker_transcribes_with_the_stub_engine(tmp_path):
+    write_silence(tmp_path / 'audio.wav', 7)
+    worker = get_transcription_worker({'whisper_engine': 'stub', 'whisper_gpu_id': 'cpu'})
+    cues = worker.submit(str(tmp_path / 'audio.wav')).result(timeout=10)
+    assert len(cues) == 2
+    assert worker.engine.loaded
+
+def test_worker_is_reused_for_the_same_device():
+    settings = {'whisper_engine': 'stub', 'whisper_model': 'tiny', 'whisper_gpu_id': 'cpu'}
+    worker = get_transcription_worker(settings)
+    assert get_transcription_worker(dict(settings)) is worker
+    # A different model replaces the one loaded on that device
+    other = get_transcription_worker(dict(settings, whisper_model='base'))
+    assert other is not worker
+    assert list(whisper_engine._workers) == [('stub', 'base', 'cpu', 0)]
+
+def test_auto_resolves_to_a_concrete_device(monkeypatch):
+    monkeypatch.setattr(whisper_engine, '_auto_device', lambda: ('cuda', 0))
+    assert whisper_engine.resolve_device('auto') == ('cuda', 0)
+    assert whisper_engine.resolve_device('') == ('cuda', 0)
+    assert whisper_engine.resolve_device('1') == ('cuda', 1)
+    assert whisper_engine.resolve_device('cpu') == ('cpu', 0)
@@ -712,6 +712,78 @@ TRANSLATIONS = {
         'ar': 'جاري تحميل السجل...',
         'en': 'Loading log...'
     },
+    'job_workers': {
+        'ar': 'عمال المعالجة',
+        'en': 'Job Workers'
+    },
+    'worker': {
+        'ar': 'العامل',
+        'en': 'Worker'
+    },
+    'current_job': {
+        'ar': 'المهمة الحالية',
+        'en': 'Current Job'
+    },
+    'throughput': {
+        'ar': 'الإنتاجية',
+        'en': 'Throughput'
+    },
+    'jobs_per_hour': {
+        'ar': 'مهمة/ساعة',
+        'en': 'jobs/hour'
+    },
+    'no_workers': {
+        'ar': 'لا يوجد عمال مسجلون',
+        'en': 'No workers registered'
+    },
+    'idle': {
+        'ar': 'خامل',
+        'en': 'Idle'
+    },
+    'worker_running': {
+        'ar': 'يعمل',
+        'en': 'Running'
+    },
+    'worker_offline': {
+        'ar': 'غير متصل',
+        'en': 'Offline'
+    },
+    'worker_stopped': {
+        'ar': 'متوقف',
+        'en': 'Stopped'
+    },
+    'pause_job': {
+        'ar': 'إيقاف مؤقت',
+        'en': 'Pause'
+    },
+    'cancel_job': {
+        'ar': 'إلغاء',
+        'en': 'Cancel'
+    },
+    'job_cancel_requested': {
+        'ar': 'ستتوقف المهمة عند نهاية المرحلة أو الجزء الحالي',
+        'en': 'The job stops at the end of its current stage or chunk'
+    },
+    'job_paused': {
+        'ar': 'تم إيقاف المهمة مؤقتاً',
+        'en': 'Job paused'
+    },
+    'job_cancelled': {
+        'ar': 'تم إلغاء المهمة',
+        'en': 'Job cancelled'
+    },
+    'job_resumed': {
+        'ar': 'أعيدت المهمة إلى قائمة الانتظار',
+        'en': 'Job returned to the queue'
+    },
+    'job_control_not_applicable': {
+        'ar': 'لا يمكن تنفيذ هذا الإجراء على المهمة في حالتها الحالية',
+        'en': 'This action does not apply to the job in its current state'
+    },
+    'translations_paused': {
+        'ar': 'تم إيقاف الترجمات مؤقتاً',
+        'en': 'Translations paused'
+    },
     'loading_logs': {
         'ar': 'جاري تحميل السجلات...',
         'en': 'Loading logs...'
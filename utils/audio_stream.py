@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+وحدة بث الصوت من ffmpeg مباشرة إلى التفريغ الصوتي
+Stream 16 kHz PCM from ffmpeg straight into transcription without a temp WAV
+"""
+
+import queue
+import subprocess
+import threading
+from collections import deque
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+
+class PcmStream:
+    """Runs ffmpeg with PCM on stdout and buffers decoded blocks in a bounded queue
+
+    The reader thread blocks once max_blocks are waiting, which in turn stalls
+    ffmpeg, so memory stays bounded while extraction runs ahead of recognition.
+    """
+
+    def __init__(self, video_path, block_seconds=10, max_blocks=12, input_args=None):
+        self.video_path = video_path
+        self.block_bytes = int(block_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+        self.blocks = queue.Queue(maxsize=max_blocks)
+        self.stderr_tail = deque(maxlen=20)
+        self.samples_read = 0
+        self.closed = False
+
+        cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', video_path]
+        cmd += list(input_args or [])
+        cmd += [
+            '-vn',  # No video
+            '-acodec', 'pcm_s16le',  # PCM 16-bit little-endian
+            '-ar', str(SAMPLE_RATE),  # 16 kHz sample rate for Whisper
+            '-ac', '1',  # Mono
+            '-f', 's16le',
+            'pipe:1'
+        ]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        self.reader = threading.Thread(target=self._read_stdout, name="ffmpeg-pcm-reader", daemon=True)
+        self.reader.start()
+        threading.Thread(target=self._read_stderr, name="ffmpeg-pcm-stderr", daemon=True).start()
+
+    def _read_stdout(self):
+        try:
+            while not self.closed:
+                data = self.process.stdout.read(self.block_bytes)
+                if not data:
+                    break
+                usable = len(data) - (len(data) % BYTES_PER_SAMPLE)
+                if usable:
+                    self.blocks.put(np.frombuffer(data[:usable], dtype=np.int16))
+        finally:
+            self.blocks.put(None)
+
+    def _read_stderr(self):
+        for line in self.process.stderr:
+            self.stderr_tail.append(line.decode('utf-8', 'replace').rstrip())
+
+    def __iter__(self):
+        """Yield float32 sample blocks in [-1, 1]; raises if ffmpeg fails"""
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            self.samples_read += len(block)
+            yield block.astype(np.float32) / 32768.0
+
+        returncode = self.process.wait()
+        if returncode != 0 and not self.closed:
+            raise Exception(f"ffmpeg error: {' '.join(self.stderr_tail)}")
+
+    @property
+    def seconds_read(self):
+        return self.samples_read / SAMPLE_RATE
+
+    def close(self):
+        """Stop ffmpeg early (for example when transcription fails)"""
+        self.closed = True
+        if self.process.poll() is None:
+            self.process.kill()
+        # Unblock the reader if it is waiting on a full queue
+        try:
+            while True:
+                self.blocks.get_nowait()
+        except queue.Empty:
+            pass
+
+def find_quiet_cut(samples, search_start, frame=SAMPLE_RATE // 10):
+    """Index of the quietest frame at or after search_start, to avoid cutting words"""
+    best_index = len(samples)
+    best_energy = None
+    for start in range(search_start, len(samples) - frame + 1, frame):
+        energy = float(np.mean(np.square(samples[start:start + frame])))
+        if best_energy is None or energy < best_energy:
+            best_energy = energy
+            best_index = start + frame // 2
+    return best_index
+
+def iter_windows(blocks, window_seconds=120, search_seconds=5):
+    """Regroup sample blocks into ~window_seconds windows cut at quiet points
+
+    Yields (offset_samples, samples) so callers can shift timestamps back to the
+    position of the window inside the full audio.
+    """
+    window = int(window_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+    pending = []
+    pending_size = 0
+    offset = 0
+
+    for block in blocks:
+        pending.append(block)
+        pending_size += len(block)
+        if pending_size < window:
+            continue
+
+        samples = np.concatenate(pending)
+        cut = find_quiet_cut(samples[:window], max(0, window - search))
+        yield offset, samples[:cut]
+        offset += cut
+        pending = [samples[cut:]]
+        pending_size = len(pending[0])
+
+    if pending_size:
+        yield offset, np.concatenate(pending)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+وحدة اختيار المسار الصوتي وتحديد لغته قبل التفريغ الصوتي
+Pick the English audio track of multi-audio releases by language tag and,
+when tags are missing, identify the spoken language from short samples
+"""
+
+import subprocess
+
+import numpy as np
+
+from utils.audio_stream import SAMPLE_RATE
+from utils.vad import detect_speech_regions
+
+ENGLISH_TAGS = {'en', 'eng', 'english'}
+ARABIC_TAGS = {'ar', 'ara', 'arabic'}
+UNKNOWN_TAGS = {'', 'und', 'unk', 'mis', 'zxx'}
+
+# Track titles that mark secondary audio rather than the main dialogue
+SECONDARY_TITLE_WORDS = ('commentary', 'description', 'descriptive', 'narrat')
+
+# Sample positions as fractions of the duration; the start is often music or logos
+SAMPLE_POSITIONS = (0.3, 0.6)
+MIN_SPEECH_SECONDS = 5
+
+def normalize_language(tag):
+    """Two-letter code for English/Arabic tags, the lower-cased tag otherwise ('' when unknown)"""
+    tag = str(tag or '').strip().lower()
+    if tag in ENGLISH_TAGS:
+        return 'en'
+    if tag in ARABIC_TAGS:
+        return 'ar'
+    return '' if tag in UNKNOWN_TAGS else tag
+
+def audio_streams(media_info):
+    """Audio streams from an ffprobe -show_streams result"""
+    return [s for s in (media_info or {}).get('streams', []) if s.get('codec_type') == 'audio']
+
+def _is_secondary(stream):
+    disposition = stream.get('disposition') or {}
+    if disposition.get('comment') or disposition.get('visual_impaired'):
+        return True
+    title = str((stream.get('tags') or {}).get('title', '')).lower()
+    return any(word in title for word in SECONDARY_TITLE_WORDS)
+
+def _rank(stream):
+    disposition = stream.get('disposition') or {}
+    return (_is_secondary(stream), not disposition.get('default'), -int(stream.get('channels') or 0),
+            stream.get('index', 0))
+
+def pick_audio_stream(media_info):
+    """Choose the audio stream to transcribe; returns (stream, language)
+
+    An English-tagged main track wins. Otherwise an untagged track is returned
+    with language None (it needs language identification). When every track is
+    tagged with another language, the best of them is returned with its tag,
+    Arabic first. (None, None) when the file has no audio.
+    """
+    streams = audio_streams(media_info)
+    if not streams:
+        return None, None
+
+    english = [s for s in streams if normalize_language((s.get('tags') or {}).get('language')) == 'en']
+    if english:
+        return min(english, key=_rank), 'en'
+
+    untagged = [s for s in streams if not normalize_language((s.get('tags') or {}).get('language'))]
+    if untagged:
+        return min(untagged, key=_rank), None
+
+    arabic = [s for s in streams if normalize_language((s.get('tags') or {}).get('language')) == 'ar']
+    stream = min(arabic or streams, key=_rank)
+    return stream, normalize_language((stream.get('tags') or {}).get('language'))
+
+def audio_map_args(stream):
+    """ffmpeg output options selecting the stream (empty for the default stream)"""
+    if stream is None or stream.get('index') is None:
+        return []
+    return ['-map', f"0:{stream['index']}"]
+
+def read_audio_sample(video_path, stream, start_seconds, seconds, timeout=120):
+    """Decode a short stretch of one audio stream to float32 16 kHz mono samples"""
+    cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-ss', f"{max(0.0, start_seconds):.2f}", '-t', str(seconds),
+           '-i', video_path]
+    cmd += audio_map_args(stream)
+    cmd += ['-vn', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-f', 's16le', 'pipe:1']
+    result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg error: {result.stderr.decode('utf-8', 'replace').strip()}")
+    usable = len(result.stdout) - len(result.stdout) % 2
+    return np.frombuffer(result.stdout[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+
+def speech_only(samples):
+    """Concatenate the speech regions of a sample (None when there is too little speech)"""
+    regions = detect_speech_regions(samples)
+    if sum(end - start for start, end in regions) < MIN_SPEECH_SECONDS * SAMPLE_RATE:
+        return None
+    return np.concatenate([samples[start:end] for start, end in regions])
+
+def identify_language(video_path, stream, duration, detect, sample_seconds=30):
+    """Identify the spoken language of a stream from a few short samples
+
+    detect(samples) -> (language, probability) runs the language-ID model.
+    Probabilities are summed per language over the samples that contain
+    speech; returns (language, confidence) or (None, 0.0) when nothing could
+    be heard.
+    """
+    duration = float(duration or 0)
+    if duration <= 0:
+        positions = [0.0]
+    else:
+        positions = [max(0.0, min(duration - sample_seconds, duration * p)) for p in SAMPLE_POSITIONS]
+
+    scores = {}
+    heard = 0
+    for start in positions:
+        speech = speech_only(read_audio_sample(video_path, stream, start, sample_seconds))
+        if speech is None:
+            continue
+        language, probability = detect(speech)
+        if language:
+            heard += 1
+            scores[language] = scores.get(language, 0.0) + probability
+
+    if not scores:
+        return None, 0.0
+    language = max(scores, key=scores.get)
+    return normalize_language(language) or language, scores[language] / heard
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+تحويل مسارات المكتبة إلى نقاط التثبيت المحلية لكل جهاز
+Per-host path mapping between library paths and local mount points
+
+The library database stores every path as the main server sees it. A worker
+on another machine mounts the same shares elsewhere, so it maps library
+prefixes to its own mount points before touching files (the way map_path
+maps Sonarr/Radarr paths); everything written back to the database keeps
+the library path.
+"""
+
+import json
+import os
+from typing import Iterable, List, Tuple, Union
+
+PathMap = List[Tuple[str, str]]
+
+def _normalize_prefix(prefix: str) -> str:
+    return prefix.rstrip('/\\') or prefix
+
+def parse_path_map(value: Union[str, Iterable, None]) -> PathMap:
+    """Read mappings from 'LIBRARY=LOCAL;LIBRARY=LOCAL', a JSON list of pairs, or a list of 'LIBRARY=LOCAL'"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            value = json.loads(value)
+        else:
+            value = [item for item in value.split(';') if item.strip()]
+
+    mappings = []
+    for item in value:
+        if isinstance(item, str):
+            if '=' not in item:
+                raise ValueError(f"Invalid path mapping '{item}', expected LIBRARY=LOCAL")
+            item = item.split('=', 1)
+        library_prefix, local_prefix = (part.strip() for part in item)
+        mappings.append((_normalize_prefix(library_prefix), _normalize_prefix(local_prefix)))
+    return mappings
+
+def _swap_prefix(path: str, pairs: PathMap) -> str:
+    # Longest prefix first, and only at a directory boundary (/mnt/tv must not match /mnt/tv2)
+    for source, target in sorted(pairs, key=lambda pair: len(pair[0]), reverse=True):
+        if path == source or path.startswith(source + '/') or path.startswith(source + '\\'):
+            return target + path[len(source):]
+    return path
+
+def to_local_path(library_path: str, mappings: PathMap) -> str:
+    """Path on this host for a library path (unchanged when no mapping applies)"""
+    return _swap_prefix(library_path, mappings)
+
+def path_map_from_env() -> PathMap:
+    """Mappings from the WORKER_PATH_MAP environment variable"""
+    return parse_path_map(os.environ.get('WORKER_PATH_MAP'))
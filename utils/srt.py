@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+وحدة قراءة وكتابة ملفات الترجمة SRT
+SRT subtitle parsing and writing
+"""
+
+import os
+import re
+import socket
+import threading
+
+TIMESTAMP_PATTERN = re.compile(r'(\d{1,2}):(\d{2}):(\d{2})[,.](\d{1,3})')
+TIMING_LINE_PATTERN = re.compile(
+    r'^\s*(\d{1,2}:\d{2}:\d{2}[,.]\d{1,3})\s*-->\s*(\d{1,2}:\d{2}:\d{2}[,.]\d{1,3})'
+)
+BATCH_LINE_PATTERN = re.compile(r'^\s*\[?(\d+)\]?\s*[:.)\-]\s?(.*)$')
+
+# Marker used to keep multi-line cues on a single batch line
+LINE_BREAK_MARKER = '<br>'
+
+class SubtitleCue:
+    """A single subtitle cue with its timing in milliseconds"""
+
+    __slots__ = ('index', 'start', 'end', 'text')
+
+    def __init__(self, index, start, end, text):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def copy(self, text=None):
+        return SubtitleCue(self.index, self.start, self.end, self.text if text is None else text)
+
+    def __repr__(self):
+        return f"SubtitleCue({self.index}, {format_timestamp(self.start)}, {format_timestamp(self.end)}, {self.text!r})"
+
+def parse_timestamp(value):
+    """Convert an SRT timestamp (00:01:02,345) to milliseconds"""
+    match = TIMESTAMP_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid SRT timestamp: {value}")
+    hours, minutes, seconds, millis = match.groups()
+    millis = int(millis.ljust(3, '0'))
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + millis
+
+def format_timestamp(millis):
+    """Convert milliseconds to an SRT timestamp (00:01:02,345)"""
+    millis = max(0, int(round(millis)))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    seconds, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+def parse_srt(content):
+    """Parse SRT content into a list of cues, skipping malformed blocks"""
+    cues = []
+    content = content.replace('\r\n', '\n').replace('\r', '\n').lstrip('\ufeff')
+
+    for block in re.split(r'\n\s*\n', content.strip()):
+        lines = block.split('\n')
+        # The timing line is normally second, but tolerate a missing index line
+        timing_at = next((i for i, line in enumerate(lines[:2]) if TIMING_LINE_PATTERN.match(line)), None)
+        if timing_at is None:
+            continue
+
+        start, end = TIMING_LINE_PATTERN.match(lines[timing_at]).groups()
+        text = '\n'.join(line.rstrip() for line in lines[timing_at + 1:]).strip()
+        cues.append(SubtitleCue(len(cues) + 1, parse_timestamp(start), parse_timestamp(end), text))
+
+    return cues
+
+def compose_srt(cues):
+    """Render cues back to SRT content, renumbering them sequentially"""
+    blocks = []
+    for number, cue in enumerate(cues, 1):
+        blocks.append(f"{number}\n{format_timestamp(cue.start)} --> {format_timestamp(cue.end)}\n{cue.text}")
+    return '\n\n'.join(blocks) + '\n' if blocks else ''
+
+def read_srt_file(srt_path):
+    """Read an SRT file trying the common subtitle encodings"""
+    for encoding in ['utf-8', 'latin1', 'cp1252', 'iso-8859-1']:
+        try:
+            with open(srt_path, 'r', encoding=encoding) as f:
+                return f.read()
+        except UnicodeDecodeError:
+            continue
+    raise Exception("Could not decode SRT file with any common encoding")
+
+def build_text_batch(cues):
+    """Encode cue texts as compact numbered lines (timings never leave this process)"""
+    return '\n'.join(
+        f"{number}: {cue.text.replace(chr(10), f' {LINE_BREAK_MARKER} ')}"
+        for number, cue in enumerate(cues, 1)
+    )
+
+def parse_text_batch(response, expected_count):
+    """Decode numbered lines from a model response into {number: text}"""
+    texts = {}
+
+    # Anything that is not a numbered line (preambles, notes) is ignored
+    for line in response.replace('\r\n', '\n').split('\n'):
+        parsed = parse_batch_line(line, expected_count)
+        if parsed:
+            texts.setdefault(parsed[0], parsed[1])
+
+    return texts
+
+def parse_batch_line(line, expected_count):
+    """Decode a single numbered response line into (number, text), or None"""
+    match = BATCH_LINE_PATTERN.match(line)
+    if not match or not 1 <= int(match.group(1)) <= expected_count:
+        return None
+    text = re.sub(rf'\s*{re.escape(LINE_BREAK_MARKER)}\s*', '\n', match.group(2), flags=re.IGNORECASE).strip()
+    return (int(match.group(1)), text) if text else None
+
+class BatchLineAssembler:
+    """Collects streamed text fragments and reports each numbered line once it is complete"""
+
+    def __init__(self, expected_count, on_line):
+        self.expected_count = expected_count
+        self.on_line = on_line
+        self.buffer = ''
+        self.seen = set()
+
+    def feed(self, fragment):
+        self.buffer += fragment
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            self._emit(line)
+
+    def close(self):
+        """Flush the last line (the model may end without a trailing newline)"""
+        if self.buffer:
+            self._emit(self.buffer)
+            self.buffer = ''
+
+    def _emit(self, line):
+        parsed = parse_batch_line(line, self.expected_count)
+        if parsed and parsed[0] not in self.seen:
+            self.seen.add(parsed[0])
+            self.on_line(*parsed)
+
+def partial_path_for(target_path):
+    """<target>.<host>.<pid>.partial: workers sharing the storage never write the same temporary file"""
+    return f"{target_path}.{socket.gethostname()}.{os.getpid()}.partial"
+
+class PartialSubtitleWriter:
+    """Appends translated cues, in order, to a .partial file and renames it to the target at the end
+
+    Cues may be resolved in any order (streamed lines, memory hits, failed
+    chunks); each contiguous prefix is flushed as soon as it is complete.
+    """
+
+    def __init__(self, target_path, cues):
+        self.target_path = target_path
+        self.partial_path = partial_path_for(target_path)
+        self.cues = list(cues)
+        self.texts = {}
+        self.next_position = 0
+        self.lock = threading.Lock()
+        self.file = open(self.partial_path, 'w', encoding='utf-8')
+
+    def resolve(self, cue_index, text):
+        """Record the final text of a cue (first value wins)"""
+        with self.lock:
+            if self.file is None or cue_index in self.texts:
+                return
+            self.texts[cue_index] = text
+            self._flush_ready()
+
+    def _flush_ready(self):
+        written = False
+        while self.next_position < len(self.cues) and self.cues[self.next_position].index in self.texts:
+            cue = self.cues[self.next_position]
+            self.next_position += 1
+            separator = '\n' if self.next_position > 1 else ''
+            self.file.write(f"{separator}{self.next_position}\n{format_timestamp(cue.start)} --> "
+                            f"{format_timestamp(cue.end)}\n{self.texts[cue.index]}\n")
+            written = True
+        if written:
+            self.file.flush()
+
+    def finalize(self):
+        """Resolve any remaining cue with its source text and atomically publish the file"""
+        with self.lock:
+            for cue in self.cues:
+                self.texts.setdefault(cue.index, cue.text)
+            self._flush_ready()
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+        os.replace(self.partial_path, self.target_path)
+
+    def abort(self):
+        """Discard the partial file"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+def apply_text_batch(cues, response):
+    """Rebuild cues from a batch response, keeping the source text for missing lines"""
+    texts = parse_text_batch(response, len(cues))
+    return [cue.copy(texts.get(number, cue.text)) for number, cue in enumerate(cues, 1)]
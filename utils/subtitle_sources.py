@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+وحدة اكتشاف مصادر الترجمة الموجودة مسبقاً
+Find existing English subtitle text (sidecar files or embedded tracks) so
+Whisper can be skipped, and detect files that already carry Arabic subtitles
+"""
+
+import glob
+import os
+import subprocess
+
+ENGLISH_TAGS = {'en', 'eng', 'english'}
+ARABIC_TAGS = {'ar', 'ara', 'arabic'}
+
+# Subtitle codecs ffmpeg can convert to SRT; image based tracks (PGS, VobSub) need OCR
+TEXT_SUBTITLE_CODECS = {'subrip', 'srt', 'ass', 'ssa', 'mov_text', 'webvtt', 'text'}
+
+# Sidecar qualifiers after the language tag that are still full English transcripts
+FULL_SIDECAR_FLAGS = {'', 'sdh', 'hi', 'cc'}
+
+def _stream_language(stream):
+    return str((stream.get('tags') or {}).get('language', '')).lower()
+
+def subtitle_streams(media_info):
+    """Subtitle streams from an ffprobe -show_streams result"""
+    return [s for s in (media_info or {}).get('streams', []) if s.get('codec_type') == 'subtitle']
+
+def has_embedded_arabic(media_info):
+    """True when any embedded subtitle track (text or image) is tagged Arabic"""
+    return any(_stream_language(s) in ARABIC_TAGS for s in subtitle_streams(media_info))
+
+def pick_english_text_stream(media_info):
+    """Best embedded English text subtitle stream, or None
+
+    Forced tracks only cover foreign-language dialogue, so they are skipped;
+    among the rest, default tracks come first, then the longest (by frames).
+    """
+    candidates = []
+    for stream in subtitle_streams(media_info):
+        if _stream_language(stream) not in ENGLISH_TAGS:
+            continue
+        if stream.get('codec_name') not in TEXT_SUBTITLE_CODECS:
+            continue
+        disposition = stream.get('disposition') or {}
+        if disposition.get('forced'):
+            continue
+        frames = int((stream.get('tags') or {}).get('NUMBER_OF_FRAMES', 0) or 0)
+        candidates.append((not disposition.get('default'), -frames, stream.get('index', 0), stream))
+    if not candidates:
+        return None
+    return min(candidates, key=lambda c: c[:3])[3]
+
+def find_english_sidecar(video_path):
+    """English SRT next to the video (movie.en.srt, movie.eng.sdh.srt, ...), or None
+
+    Untagged movie.srt files are not considered; elsewhere in the app they are
+    treated as Arabic subtitles.
+    """
+    base = os.path.splitext(video_path)[0]
+    found = []
+    for path in glob.glob(f"{glob.escape(base)}.*.srt"):
+        parts = os.path.basename(path)[len(os.path.basename(base)) + 1:-len('.srt')].lower().split('.')
+        if parts[0] not in ENGLISH_TAGS:
+            continue
+        flag = parts[1] if len(parts) > 1 else ''
+        if flag in FULL_SIDECAR_FLAGS and os.path.getsize(path) > 0:
+            # Plain English before SDH/HI variants
+            found.append((flag != '', path))
+    return min(found)[1] if found else None
+
+def extract_subtitle_stream(video_path, stream_index, output_path, timeout=300):
+    """Convert one embedded text subtitle stream to SRT; returns True on success"""
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', video_path,
+        '-map', f'0:{stream_index}',
+        '-c:s', 'srt',
+        output_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0 and os.path.exists(output_path) and os.path.getsize(output_path) > 0
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+وحدة كشف النشاط الصوتي لتخطي الصمت قبل التفريغ الصوتي
+Energy-based voice activity detection: drop silence (credits, pauses) before
+Whisper and map the recognised timestamps back onto the original audio
+"""
+
+import bisect
+import wave
+
+import numpy as np
+
+from utils.audio_stream import SAMPLE_RATE
+from utils.srt import SubtitleCue
+
+FRAME_MS = 30
+# Frames above the adaptive threshold count as speech; the threshold follows
+# each window's noise floor but stays between these absolute levels (dBFS)
+MIN_THRESHOLD_DB = -55.0
+MAX_THRESHOLD_DB = -38.0
+NOISE_MARGIN_DB = 10.0
+
+def load_wav_memmap(path):
+    """Memory-map the samples of a 16-bit mono PCM WAV file (no copy into RAM)"""
+    with wave.open(path, 'rb') as audio:
+        if audio.getsampwidth() != 2 or audio.getnchannels() != 1:
+            raise ValueError("Expected 16-bit mono PCM")
+        frames = audio.getnframes()
+
+    # Walk the RIFF chunks to find where the sample data starts
+    with open(path, 'rb') as f:
+        f.seek(12)
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("WAV file has no data chunk")
+            chunk_id, size = header[:4], int.from_bytes(header[4:], 'little')
+            if chunk_id == b'data':
+                offset = f.tell()
+                break
+            f.seek(size + (size & 1), 1)
+
+    return np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(frames,))
+
+def iter_memmap_blocks(samples, block_seconds=60):
+    """Yield float32 blocks from an int16 memmap, reading one block at a time"""
+    block = int(block_seconds * SAMPLE_RATE)
+    for start in range(0, len(samples), block):
+        yield np.asarray(samples[start:start + block], dtype=np.float32) / 32768.0
+
+def detect_speech_regions(samples, min_speech_ms=250, min_silence_ms=600, pad_ms=200):
+    """Return [(start, end)] sample ranges that contain speech
+
+    Frame energies are compared against a threshold derived from the 10th
+    percentile (the noise floor) of this audio. Short gaps are bridged and
+    regions padded so word edges are not clipped. Loud music is kept.
+    """
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    count = len(samples) // frame
+    if count == 0:
+        return [(0, len(samples))] if len(samples) else []
+
+    raw = np.asarray(samples[:count * frame])
+    frames = raw.reshape(count, frame).astype(np.float32)
+    if np.issubdtype(raw.dtype, np.integer):
+        frames /= 32768.0
+    energy_db = 10 * np.log10(np.mean(np.square(frames), axis=1) + 1e-10)
+
+    threshold = np.percentile(energy_db, 10) + NOISE_MARGIN_DB
+    threshold = min(MAX_THRESHOLD_DB, max(MIN_THRESHOLD_DB, threshold))
+    voiced = energy_db > threshold
+
+    # Run boundaries of the voiced mask
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = list(zip(edges[::2], edges[1::2]))
+
+    min_speech = max(1, min_speech_ms // FRAME_MS)
+    min_silence = max(1, min_silence_ms // FRAME_MS)
+    pad = pad_ms // FRAME_MS
+
+    merged = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    regions = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start = max(0, start - pad) * frame
+        end = min(count, end + pad) * frame
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+
+    # Keep the trailing partial frame with the last region if it touches it
+    if regions and regions[-1][1] == count * frame:
+        regions[-1] = (regions[-1][0], len(samples))
+    return regions
+
+class SpeechGate:
+    """Filters a stream of sample blocks down to speech and remembers where each piece came from
+
+    Blocks are analysed per window_seconds window; kept regions are joined with
+    gap_ms of silence so Whisper still sees a pause between them.
+    """
+
+    def __init__(self, window_seconds=60, gap_ms=300):
+        self.window = int(window_seconds * SAMPLE_RATE)
+        self.gap = np.zeros(SAMPLE_RATE * gap_ms // 1000, dtype=np.float32)
+        self.total_samples = 0
+        self.kept_samples = 0
+        # Parallel lists: output position -> input position for each kept region
+        self.output_starts = []
+        self.input_starts = []
+        self.lengths = []
+        self._output_position = 0
+
+    def _gate(self, samples, offset):
+        pieces = []
+        for start, end in detect_speech_regions(samples):
+            if self._output_position:
+                pieces.append(self.gap)
+                self._output_position += len(self.gap)
+            self.output_starts.append(self._output_position)
+            self.input_starts.append(offset + start)
+            self.lengths.append(end - start)
+            pieces.append(samples[start:end])
+            self._output_position += end - start
+            self.kept_samples += end - start
+        return np.concatenate(pieces) if pieces else None
+
+    def filter(self, blocks):
+        """Yield float32 speech-only blocks from float32 input blocks"""
+        pending = []
+        pending_size = 0
+        offset = 0
+        for block in blocks:
+            pending.append(block)
+            pending_size += len(block)
+            self.total_samples += len(block)
+            if pending_size < self.window:
+                continue
+            samples = np.concatenate(pending)
+            kept = self._gate(samples, offset)
+            offset += len(samples)
+            pending, pending_size = [], 0
+            if kept is not None:
+                yield kept
+
+        if pending_size:
+            kept = self._gate(np.concatenate(pending), offset)
+            if kept is not None:
+                yield kept
+
+    def _region_index(self, ms):
+        position = ms * SAMPLE_RATE // 1000
+        return max(0, bisect.bisect_right(self.output_starts, position) - 1)
+
+    def _region_bounds_ms(self, index):
+        """(output_start, output_end) of a kept region on the speech-only timeline"""
+        start = self.output_starts[index]
+        return start * 1000 // SAMPLE_RATE, (start + self.lengths[index]) * 1000 // SAMPLE_RATE
+
+    def remap_ms(self, ms):
+        """Map a timestamp on the speech-only timeline back to the original audio"""
+        if not self.output_starts:
+            return ms
+        position = ms * SAMPLE_RATE // 1000
+        index = self._region_index(ms)
+        # Positions inside a joining gap clamp to the end of the previous region
+        inside = min(position - self.output_starts[index], self.lengths[index])
+        return int((self.input_starts[index] + max(0, inside)) * 1000 // SAMPLE_RATE)
+
+    def remap_cues(self, cues):
+        """Remap cue timings; a cue spanning two regions is kept to the region holding most of it"""
+        remapped = []
+        for cue in cues:
+            start, end = cue.start, cue.end
+            if self.output_starts:
+                first, last = self._region_index(start), self._region_index(end)
+                if first != last:
+                    first_end = self._region_bounds_ms(first)[1]
+                    last_start = self._region_bounds_ms(last)[0]
+                    if first_end - start >= end - last_start:
+                        end = first_end
+                    else:
+                        start = last_start
+            start = self.remap_ms(start)
+            remapped.append(SubtitleCue(cue.index, start, max(start, self.remap_ms(end)), cue.text))
+        return remapped
+
+    @property
+    def skipped_fraction(self):
+        if not self.total_samples:
+            return 0.0
+        return 1.0 - self.kept_samples / self.total_samples
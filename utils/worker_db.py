@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+طبقة قاعدة بيانات خفيفة لعمليات المعالجة في الخلفية
+Lightweight database access for worker processes
+
+Workers only need the settings table and a few status updates, so this module
+talks to the database with a plain SQLAlchemy engine instead of importing the
+Flask app (every blueprint, gpu_manager, system_monitor, ...).
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_URL = "duckdb:///library_bcce0f55.db"
+
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+def get_database_url():
+    """Same database the web app uses (DATABASE_URL or the bundled DuckDB file)"""
+    return os.environ.get("DATABASE_URL") or DEFAULT_DATABASE_URL
+
+def get_engine():
+    global _engine, _session_factory
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(get_database_url(), pool_recycle=300, pool_pre_ping=True)
+            _session_factory = sessionmaker(bind=_engine)
+        return _engine
+
+@contextmanager
+def session_scope():
+    """ORM session bound to the worker engine; commits on success"""
+    get_engine()
+    session = _session_factory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+class SettingsSnapshot:
+    """Settings table cached in memory, reloaded only when its version stamp changes
+
+    The version stamp is the row count plus the newest updated_at, checked at
+    most once every check_interval seconds.
+    """
+
+    def __init__(self, check_interval=30):
+        self.check_interval = check_interval
+        self.values = {}
+        self.version = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def _read_version(self, connection):
+        row = connection.execute(text("SELECT COUNT(*), MAX(updated_at) FROM settings")).fetchone()
+        return (row[0], str(row[1]))
+
+    def _reload(self, connection, version):
+        rows = connection.execute(text("SELECT key, value FROM settings")).fetchall()
+        self.values = {row[0]: row[1] for row in rows}
+        self.version = version
+        logger.debug(f"Loaded settings snapshot version {version}")
+
+    def get(self, force=False):
+        """Return a copy of the current settings, refreshing if they changed"""
+        with self.lock:
+            now = time.time()
+            if force or self.version is None or now - self.checked_at >= self.check_interval:
+                with get_engine().connect() as connection:
+                    version = self._read_version(connection)
+                    if force or version != self.version:
+                        self._reload(connection, version)
+                self.checked_at = now
+            return dict(self.values)
+
+_settings_snapshot = SettingsSnapshot()
+
+def get_worker_settings(force=False):
+    """Settings snapshot shared by everything running in this worker process"""
+    return _settings_snapshot.get(force=force)
+
+def update_media_translation_status(video_path, translated=True):
+    """Set translated/has_subtitles for a media file; returns False when no row matched"""
+    now = datetime.utcnow()
+    params = {'translated': translated, 'now': now, 'path': video_path}
+    completed_clause = ", translation_completed_at = :now" if translated else ""
+    
+    with get_engine().begin() as connection:
+        result = connection.execute(text(
+            "UPDATE media_files SET translated = :translated, has_subtitles = :translated, "
+            f"updated_at = :now{completed_clause} WHERE path = :path"
+        ), params)
+        return result.rowcount > 0
+
+def mark_media_has_subtitles(video_path):
+    """Mark a media file as covered by an Arabic subtitle it already carries (no translation time)"""
+    with get_engine().begin() as connection:
+        result = connection.execute(text(
+            "UPDATE media_files SET translated = :flag, has_subtitles = :flag, updated_at = :now WHERE path = :path"
+        ), {'flag': True, 'now': datetime.utcnow(), 'path': video_path})
+        return result.rowcount > 0
+
+def get_media_audio_language(video_path):
+    """Audio language stored by an earlier language-ID probe, or None"""
+    with get_engine().connect() as connection:
+        row = connection.execute(text(
+            "SELECT audio_language FROM media_files WHERE path = :path"
+        ), {'path': video_path}).fetchone()
+        return row[0] if row else None
+
+def set_media_audio_language(video_path, language):
+    with get_engine().begin() as connection:
+        result = connection.execute(text(
+            "UPDATE media_files SET audio_language = :language, updated_at = :now WHERE path = :path"
+        ), {'language': language, 'now': datetime.utcnow(), 'path': video_path})
+        return result.rowcount > 0